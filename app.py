@@ -37,6 +37,8 @@ class ThaliaApp:
         self.user_manager = None
         self.process_user_input = None
         self.rag_response = None
+        self.process_user_input_async = None
+        self.rag_response_async = None
         self.show_auth_interface = False  # Control whether to show auth interface
         self.show_privacy_disclaimer = True  # Control whether to show privacy disclaimer
         self.privacy_consent_given = False   # Track user's privacy consent
@@ -98,8 +100,9 @@ class ThaliaApp:
         # Import main router
         print("🔧 Importing main router...")
         try:
-            from main_flow_router import process_user_input
+            from main_flow_router import process_user_input, process_user_input_async
             self.process_user_input = process_user_input
+            self.process_user_input_async = process_user_input_async
             self.main_router_available = True
             print("✅ Main router loaded successfully")
         except ImportError as e:
@@ -109,8 +112,9 @@ class ThaliaApp:
             # Try RAG fallback option
             print("🔧 Attempting to import RAG system...")
             try:
-                from backend.RAG.rag_pipeline import get_chatbot_response as rag_response
+                from backend.RAG.rag_pipeline import aget_chatbot_response, get_chatbot_response as rag_response
                 self.rag_response = rag_response
+                self.rag_response_async = aget_chatbot_response
                 self.rag_available = True
                 print("✅ RAG system available as fallback")
             except ImportError as e1:
@@ -138,7 +142,9 @@ class ThaliaApp:
             main_router_available=self.main_router_available,
             rag_available=self.rag_available,
             process_user_input=self.process_user_input,
-            rag_response=self.rag_response
+            rag_response=self.rag_response,
+            process_user_input_async=self.process_user_input_async,
+            rag_response_async=self.rag_response_async
         )
         
         # Create UI component manager
@@ -384,24 +390,29 @@ class ThaliaApp:
             
             # Chat events with session
             main_components["msg"].submit(
-                fn=self.response_handler.custom_chat_function,
+                fn=self.response_handler.acustom_chat_function,
                 inputs=[main_components["msg"], main_components["chatbot"], session_id],
                 outputs=[main_components["msg"], main_components["chatbot"]]
             )
             main_components["submit_btn"].click(
-                fn=self.response_handler.custom_chat_function,
+                fn=self.response_handler.acustom_chat_function,
                 inputs=[main_components["msg"], main_components["chatbot"], session_id],
                 outputs=[main_components["msg"], main_components["chatbot"]]
             )
         else:
             # Original chat events without session (guest mode)
+            # A named async generator (not a lambda) so Gradio streams its updates
+            async def guest_chat(msg, hist):
+                async for update in self.response_handler.acustom_chat_function(msg, hist, "guest_session"):
+                    yield update
+
             main_components["msg"].submit(
-                fn=lambda msg, hist: self.response_handler.custom_chat_function(msg, hist, "guest_session"),
+                fn=guest_chat,
                 inputs=[main_components["msg"], main_components["chatbot"]],
                 outputs=[main_components["msg"], main_components["chatbot"]]
             )
             main_components["submit_btn"].click(
-                fn=lambda msg, hist: self.response_handler.custom_chat_function(msg, hist, "guest_session"),
+                fn=guest_chat,
                 inputs=[main_components["msg"], main_components["chatbot"]],
                 outputs=[main_components["msg"], main_components["chatbot"]]
             )
@@ -426,7 +437,8 @@ class ThaliaApp:
             if self.user_manager:
                 try:
                     stats = self.user_manager.get_user_stats()
-                    print(f"📊 Platform statistics: {stats['total_users']} total users, {stats['active_sessions']} active sessions")
+                    print(f"📊 Platform statistics: {stats['total_users']} total users, {stats['active_sessions']} active sessions, "
+                          f"{stats.get('expired_sessions', 0)} expired awaiting cleanup")
                     print("💡 Tip: Use 'python view_users.py' for user management")
                 except Exception as e:
                     print(f"⚠️ Cannot get user statistics: {e}")
@@ -460,6 +472,9 @@ class ThaliaApp:
         # Create interface
         demo = self.create_interface()
         
+        # Async chat handlers run on the event loop, so many chats can wait on the LLM at once
+        demo.queue(default_concurrency_limit=APP_CONFIG["chat_concurrency"])
+
         # Launch interface
         demo.launch(
             share=APP_CONFIG["share"], 
@@ -0,0 +1,140 @@
+"""
+Answer Cache - Semantic cache of RAG answers
+
+A question whose embedding is within a cosine-similarity threshold of an
+earlier question in the same scope (flow + prompt template version) gets the
+earlier answer back without retrieval or generation. Entries expire after a
+TTL, the least recently used are evicted past max_entries, and the whole cache
+is dropped when the index it was answered from is rebuilt.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+import numpy as np
+
+ANSWER_CACHE_THRESHOLD = float(os.getenv("RAG_ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_SIZE = int(os.getenv("RAG_ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL = float(os.getenv("RAG_ANSWER_CACHE_TTL", "86400"))
+
+
+class _Entry:
+    __slots__ = ("question", "vector", "answer", "created_at")
+
+    def __init__(self, question: str, vector: np.ndarray, answer: str):
+        self.question = question
+        self.vector = vector
+        self.answer = answer
+        self.created_at = time.monotonic()
+
+
+class SemanticAnswerCache:
+    """Nearest-neighbour answer cache, one LRU bucket per scope."""
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD, max_entries: int = ANSWER_CACHE_SIZE,
+                 ttl_seconds: float = ANSWER_CACHE_TTL):
+        self.threshold = threshold
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.index_version: Optional[Any] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._scopes: Dict[Hashable, "OrderedDict[int, _Entry]"] = {}
+        self._matrices: Dict[Hashable, tuple] = {}
+        self._size = 0
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _unit(vector: List[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
+
+    def check_index_version(self, version: Any):
+        """Drop every entry if the index has been rebuilt since they were cached."""
+        with self._lock:
+            if version != self.index_version:
+                if self._size:
+                    self.invalidations += 1
+                self._clear_locked()
+                self.index_version = version
+
+    def invalidate(self):
+        with self._lock:
+            if self._size:
+                self.invalidations += 1
+            self._clear_locked()
+
+    def _clear_locked(self):
+        self._scopes.clear()
+        self._matrices.clear()
+        self._size = 0
+
+    def _matrix(self, scope: Hashable):
+        """Stacked unit vectors for a scope, rebuilt only after the scope changed."""
+        cached = self._matrices.get(scope)
+        if cached is None:
+            bucket = self._scopes.get(scope, {})
+            ids = list(bucket.keys())
+            matrix = np.stack([bucket[i].vector for i in ids]) if ids else None
+            cached = (ids, matrix)
+            self._matrices[scope] = cached
+        return cached
+
+    def lookup(self, scope: Hashable, vector: List[float]) -> Optional[str]:
+        query = self._unit(vector)
+        with self._lock:
+            ids, matrix = self._matrix(scope)
+            if matrix is not None:
+                scores = matrix @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    bucket = self._scopes[scope]
+                    entry = bucket[ids[best]]
+                    if not self.ttl_seconds or time.monotonic() - entry.created_at < self.ttl_seconds:
+                        bucket.move_to_end(ids[best])
+                        self.hits += 1
+                        return entry.answer
+                    self._remove_locked(scope, ids[best])
+            self.misses += 1
+            return None
+
+    def store(self, scope: Hashable, question: str, vector: List[float], answer: str):
+        if not answer:
+            return
+        with self._lock:
+            bucket = self._scopes.setdefault(scope, OrderedDict())
+            bucket[self._next_id] = _Entry(question, self._unit(vector), answer)
+            self._next_id += 1
+            self._size += 1
+            self._matrices.pop(scope, None)
+            while self._size > self.max_entries:
+                # Evict the least recently used entry of the largest scope
+                largest = max(self._scopes, key=lambda s: len(self._scopes[s]))
+                oldest = next(iter(self._scopes[largest]))
+                self._remove_locked(largest, oldest)
+                self.evictions += 1
+
+    def _remove_locked(self, scope: Hashable, entry_id: int):
+        bucket = self._scopes.get(scope)
+        if bucket and bucket.pop(entry_id, None) is not None:
+            self._size -= 1
+            self._matrices.pop(scope, None)
+            if not bucket:
+                del self._scopes[scope]
+
+    def get_stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,35 @@
+"""
+Offline index build for the RAG engine.
+
+Usage (from the repository root):
+    python -m backend.RAG.build_index            # MySQL pdf_documents
+    python -m backend.RAG.build_index --local    # PDFs in backend/RAG/RAG_Database
+
+Serving processes only open the index this command produces.
+"""
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or update the Thalia RAG index")
+    parser.add_argument("--local", action="store_true", help="Index local PDFs instead of the MySQL database")
+    args = parser.parse_args()
+
+    if args.local:
+        from backend.RAG.rag_local import engine
+    else:
+        from backend.RAG.rag_sql import engine
+
+    try:
+        engine.build_index()
+    except Exception as e:
+        print(f"❌ Index build failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+Embedding Cache - Persistent SQLite cache in front of the embedding model
+
+Vectors are stored as float32 blobs keyed by (model, sha256 of the text), so
+rebuilding an index or re-asking a question never pays for the same embedding
+twice. Document and query embeddings are cached under separate keys because
+the provider embeds them with different task types. When the cache grows past
+its size limit the least recently used rows are evicted.
+"""
+import array
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from backend.utils.lru_cache import TTLCache
+
+DEFAULT_CACHE_PATH = os.getenv("RAG_EMBED_CACHE_PATH", "./rag_cache/embeddings.sqlite3")
+DEFAULT_MAX_MB = int(os.getenv("RAG_EMBED_CACHE_MAX_MB", "512"))
+QUERY_CACHE_SIZE = int(os.getenv("RAG_QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_TTL = float(os.getenv("RAG_QUERY_CACHE_TTL", "3600"))
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s?!.]+$")
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def normalize_query(text: str) -> str:
+    """Case-fold, collapse whitespace and drop trailing ?!. so trivial variants share a key."""
+    text = _WHITESPACE.sub(" ", text.strip().lower())
+    return _TRAILING_PUNCTUATION.sub("", text) or text
+
+
+def _pack(vector: List[float]) -> bytes:
+    return array.array("f", vector).tobytes()
+
+
+def _unpack(blob: bytes) -> List[float]:
+    values = array.array("f")
+    values.frombytes(blob)
+    return values.tolist()
+
+
+class EmbeddingCache:
+    """SQLite-backed vector store for embeddings, with LRU eviction by total size."""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+
+    def get_many(self, model: str, keys: List[str]) -> Dict[str, List[float]]:
+        """Return cached vectors for the keys that are present."""
+        found: Dict[str, List[float]] = {}
+        if not keys:
+            return found
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                placeholders = ", ".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *batch],
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = _unpack(blob)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                    [(now, model, key) for key in found],
+                )
+                self._conn.commit()
+            self.hits += sum(1 for key in keys if key in found)
+            self.misses += sum(1 for key in keys if key not in found)
+        return found
+
+    def put_many(self, model: str, items: Dict[str, List[float]]):
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for key, vector in items.items():
+            blob = _pack(vector)
+            rows.append((model, key, blob, len(blob), now))
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, size, last_used) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+            self._total_bytes += sum(row[3] for row in rows)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Drop least recently used rows until the cache is back under 90% of its limit."""
+        target = int(self.max_bytes * 0.9)
+        # Re-sync with the table; INSERT OR REPLACE may have overcounted
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+        while self._total_bytes > target:
+            rows = self._conn.execute(
+                "SELECT model, text_hash, size FROM embeddings ORDER BY last_used LIMIT 1000"
+            ).fetchall()
+            if not rows:
+                break
+            victims = []
+            for model, key, size in rows:
+                victims.append((model, key))
+                self._total_bytes -= size
+                if self._total_bytes <= target:
+                    break
+            self._conn.executemany("DELETE FROM embeddings WHERE model = ? AND text_hash = ?", victims)
+            self.evictions += len(victims)
+        self._conn.commit()
+
+    def get_stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "size_bytes": self._total_bytes,
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embedding model so every vector is looked up in an EmbeddingCache first.
+
+    Only cache misses reach the wrapped model; index builds and query
+    embedding share the same cache file.
+    """
+
+    def __init__(self, embeddings, model: str, cache: Optional[EmbeddingCache] = None):
+        self.embeddings = embeddings
+        self.model = model
+        self.cache = cache or EmbeddingCache()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [text_key(text) for text in texts]
+        found = self.cache.get_many(self.model, keys)
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(self.model, computed)
+            found.update(computed)
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        model = self.model + ":query"
+        key = text_key(text)
+        found = self.cache.get_many(model, [key])
+        if key in found:
+            return found[key]
+        vector = self.embeddings.embed_query(text)
+        self.cache.put_many(model, {key: vector})
+        return vector
+
+    def get_stats(self) -> Dict[str, float]:
+        return self.cache.get_stats()
+
+
+class QueryCachedEmbeddings(Embeddings):
+    """
+    In-process LRU/TTL tier for query embeddings, in front of any embedding model.
+
+    Queries are normalized for the cache key only (the model still embeds the
+    text as asked), so repeated and near-identical questions skip the
+    embedding round trip. Wrap a
+    CachedEmbeddings to get the shared on-disk tier behind it.
+    """
+
+    def __init__(self, embeddings, cache: Optional[TTLCache] = None):
+        self.embeddings = embeddings
+        self.cache = cache or TTLCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        normalized = normalize_query(text)
+        vector = self.cache.get(normalized)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.set(normalized, vector)
+        return vector
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        stats = {"query_lru": self.cache.get_stats()}
+        if hasattr(self.embeddings, "get_stats"):
+            stats["disk"] = self.embeddings.get_stats()
+        return stats
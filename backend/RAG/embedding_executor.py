@@ -0,0 +1,175 @@
+"""
+Embedding Executor - Batched, concurrent, retrying embedding for index builds
+
+Chunks are embedded in fixed-size batches on a small thread pool. A failed
+batch is retried with exponential backoff and jitter (rate-limit errors are
+the common case); every finished batch is handed to a sink right away, so
+work already done is persisted even if a later batch gives up.
+"""
+import hashlib
+import os
+import random
+import struct
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+
+class EmbeddingBatchError(RuntimeError):
+    """A batch still failed after all retries."""
+
+
+class FakeEmbeddings:
+    """
+    Deterministic offline embedding provider with the LangChain Embeddings interface.
+
+    Vectors are derived from a hash of the text. `fail_times` makes the first
+    N calls raise, to exercise retry paths; `latency` simulates network time.
+    """
+
+    def __init__(self, size: int = 32, latency: float = 0.0, fail_times: int = 0):
+        self.size = size
+        self.latency = latency
+        self.fail_times = fail_times
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _vector(self, text: str) -> List[float]:
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        while len(digest) < self.size * 4:
+            digest += hashlib.sha256(digest).digest()
+        values = struct.unpack(f"<{self.size}I", digest[:self.size * 4])
+        return [v / 0xFFFFFFFF - 0.5 for v in values]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self._lock:
+            self.calls += 1
+            should_fail = self.calls <= self.fail_times
+        if self.latency:
+            time.sleep(self.latency)
+        if should_fail:
+            raise RuntimeError("429 Resource exhausted (fake)")
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class EmbeddingExecutor:
+    """
+    Embeds chunk texts in batches with bounded concurrency and retries.
+
+    Args:
+        embeddings: Any object with embed_documents(texts)
+        batch_size: Texts per request
+        max_concurrency: Requests in flight at once
+        max_retries: Retries per batch before giving up
+        base_delay / max_delay: Backoff bounds in seconds
+    """
+
+    def __init__(self, embeddings, batch_size: int = 32, max_concurrency: int = 4,
+                 max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 30.0):
+        self.embeddings = embeddings
+        self.batch_size = max(1, batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stats = {"chunks": 0, "batches": 0, "retries": 0, "seconds": 0.0}
+
+    @classmethod
+    def from_env(cls, embeddings) -> "EmbeddingExecutor":
+        return cls(
+            embeddings,
+            batch_size=int(os.getenv("RAG_EMBED_BATCH_SIZE", "32")),
+            max_concurrency=int(os.getenv("RAG_EMBED_CONCURRENCY", "4")),
+            max_retries=int(os.getenv("RAG_EMBED_MAX_RETRIES", "5")),
+        )
+
+    @property
+    def flush_size(self) -> int:
+        """How many chunks to hand over at once to keep every worker busy."""
+        return self.batch_size * self.max_concurrency
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        attempt = 0
+        while True:
+            try:
+                return self.embeddings.embed_documents(texts)
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    raise EmbeddingBatchError(f"Embedding batch failed after {attempt + 1} attempts: {e}") from e
+                delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+                delay *= 0.5 + random.random() / 2
+                attempt += 1
+                self.stats["retries"] += 1
+                print(f"⚠️ Embedding batch failed ({e}); retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+
+    def run(self, ids: Sequence[str], texts: Sequence[str], metadatas: Sequence[Dict[str, Any]],
+            sink: Callable[[List[str], List[str], List[Dict[str, Any]], List[List[float]]], None]) -> int:
+        """
+        Embed texts and pass each finished batch to sink(ids, texts, metadatas, vectors).
+
+        Batches may reach the sink out of order. If a batch exhausts its retries the
+        batches already sunk are kept and EmbeddingBatchError is raised.
+
+        Returns:
+            Number of chunks embedded
+        """
+        start = time.perf_counter()
+        batches = [
+            (list(ids[i:i + self.batch_size]), list(texts[i:i + self.batch_size]),
+             list(metadatas[i:i + self.batch_size]))
+            for i in range(0, len(ids), self.batch_size)
+        ]
+        done = 0
+        error: Optional[EmbeddingBatchError] = None
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            pending = {}
+            queue = iter(batches)
+            for batch in queue:
+                pending[pool.submit(self._embed_batch, batch[1])] = batch
+                if len(pending) >= self.max_concurrency:
+                    break
+            while pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    batch_ids, batch_texts, batch_metas = pending.pop(future)
+                    try:
+                        vectors = future.result()
+                    except EmbeddingBatchError as e:
+                        # Stop scheduling, but keep sinking batches already in flight
+                        error = error or e
+                        continue
+                    sink(batch_ids, batch_texts, batch_metas, vectors)
+                    done += len(batch_ids)
+                    self.stats["batches"] += 1
+                    following = next(queue, None) if error is None else None
+                    if following is not None:
+                        pending[pool.submit(self._embed_batch, following[1])] = following
+
+        elapsed = time.perf_counter() - start
+        self.stats["chunks"] += done
+        self.stats["seconds"] += elapsed
+        if error is not None:
+            raise error
+        return done
+
+    def get_stats(self) -> Dict[str, Any]:
+        seconds = self.stats["seconds"]
+        return {
+            **self.stats,
+            "chunks_per_second": self.stats["chunks"] / seconds if seconds > 0 else 0.0,
+        }
+
+
+def chroma_sink(collection) -> Callable[[List[str], List[str], List[Dict[str, Any]], List[List[float]]], None]:
+    """
+    Sink that upserts pre-computed embeddings into a chromadb Collection (the
+    one the LangChain Chroma store was opened on, see RagEngine._open_vectorstore).
+    """
+    def sink(ids, texts, metadatas, vectors):
+        collection.upsert(ids=ids, documents=texts, metadatas=metadatas, embeddings=vectors)
+    return sink
@@ -0,0 +1,259 @@
+"""
+Incremental ingestion for the RAG vector store.
+
+A manifest stored next to the Chroma index records, for every source document,
+a cheap fingerprint (file stat or database timestamps) and the ids of the
+chunks it produced. Each sync only re-reads documents whose
+fingerprint moved, only embeds chunks whose hash is new, and deletes the chunks
+of documents that disappeared from the source.
+
+Documents are streamed page by page and split incrementally, so peak memory is
+bounded by a page plus one batch of pending chunks, not by the corpus size.
+"""
+import hashlib
+import json
+import os
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+MANIFEST_FILENAME = "ingest_manifest.json"
+MANIFEST_VERSION = 2
+# Chroma collection holding the chunks (LangChain's default name, so existing indexes still open)
+CHROMA_COLLECTION = "langchain"
+ADD_BATCH_SIZE = 64
+
+
+def hash_text(text: str) -> str:
+    """Stable SHA-256 hex digest of text (chunk ids, template versions)."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class DocumentSource:
+    """
+    A corpus the ingestion engine can diff against the manifest.
+
+    Subclasses return a fingerprint per document without reading its content,
+    and stream the document's pages only when that fingerprint changed. Each
+    page is a Document with "source" and "page" metadata.
+    """
+
+    def fingerprints(self) -> Dict[str, str]:
+        raise NotImplementedError
+
+    def load_pages(self, source: str) -> Optional[Iterator["Document"]]:
+        raise NotImplementedError
+
+    def load_many(self, sources: List[str]) -> Iterator[Tuple[str, Optional[Iterator["Document"]]]]:
+        """Stream several documents; sources that can read in bulk override this."""
+        for source in sources:
+            yield source, self.load_pages(source)
+
+
+class IngestManifest:
+    """Per-document and per-chunk hashes for one vector store."""
+
+    def __init__(self, path: str, settings: Dict[str, Any]):
+        self.path = path
+        self.settings = settings
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self.exists = False
+
+    @classmethod
+    def load(cls, path: str, settings: Dict[str, Any]) -> "IngestManifest":
+        manifest = cls(path, settings)
+        if not os.path.exists(path):
+            return manifest
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"⚠️ Could not read ingest manifest {path}: {e}")
+            return manifest
+
+        manifest.exists = True
+        manifest.documents = data.get("documents", {})
+        # Settings recorded at build time; a mismatch means every stored chunk is stale
+        manifest.settings = data.get("settings") if data.get("version") == MANIFEST_VERSION else None
+        return manifest
+
+    def settings_match(self, settings: Dict[str, Any]) -> bool:
+        return self.settings == settings
+
+    def all_chunk_ids(self) -> List[str]:
+        return [chunk_id for entry in self.documents.values() for chunk_id in entry.get("chunks", [])]
+
+    def save(self):
+        """Write the manifest atomically so a crash never leaves it half-written."""
+        data = {
+            "version": MANIFEST_VERSION,
+            "settings": self.settings,
+            "documents": self.documents,
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self.exists = True
+
+
+def page_documents(source: str, pages: Iterable[Tuple[int, str]]) -> Iterator["Document"]:
+    """Wrap (page_number, text) pairs as page Documents, skipping blank pages."""
+    from langchain_core.documents import Document
+    for page_number, text in pages:
+        if text.strip():
+            yield Document(page_content=text, metadata={"source": source, "page": page_number})
+
+
+def chunk_id(source: str, chunk: "Document", seen: Dict[str, int]) -> str:
+    """
+    Derive a stable chunk id from the source name, page and chunk text.
+
+    Identical chunks inside one document get an occurrence suffix so ids stay unique.
+    """
+    page = chunk.metadata.get("page", "")
+    base = hash_text(f"{source}\x00{page}\x00{chunk.page_content}")[:32]
+    count = seen.get(base, 0)
+    seen[base] = count + 1
+    return base if count == 0 else f"{base}-{count}"
+
+
+def _add_chunks(vectorstore, pending: List[Tuple[str, "Document"]], executor=None, sink=None) -> int:
+    """
+    Embed and store pending chunks, skipping ids the store already holds.
+
+    Batches written by an interrupted run are already in the store, so the
+    store itself acts as the checkpoint a resumed build picks up from.
+    """
+    if not pending:
+        return 0
+    stored = set(vectorstore.get(ids=[new_id for new_id, _ in pending], include=[])["ids"])
+    pending = [(new_id, chunk) for new_id, chunk in pending if new_id not in stored]
+    if not pending:
+        return 0
+    if executor is None:
+        vectorstore.add_documents([chunk for _, chunk in pending], ids=[new_id for new_id, _ in pending])
+        return len(pending)
+    return executor.run(
+        [new_id for new_id, _ in pending],
+        [chunk.page_content for _, chunk in pending],
+        [chunk.metadata for _, chunk in pending],
+        sink,
+    )
+
+
+def sync_index(source: DocumentSource, vectorstore, text_splitter, persist_directory: str,
+               settings: Dict[str, Any], executor=None, sink=None) -> Dict[str, int]:
+    """
+    Bring the vector store in line with the source, touching only what changed.
+
+    Args:
+        source: Corpus to index
+        vectorstore: Chroma store opened on persist_directory
+        text_splitter: Splitter applied to new or changed documents
+        persist_directory: Directory holding the store and its manifest
+        settings: Embedding model and splitter settings; a change forces a rebuild
+        executor: Optional EmbeddingExecutor; without one the store embeds chunks itself
+        sink: Where the executor writes its vectors (see embedding_executor.chroma_sink)
+
+    Returns:
+        Counts of documents and chunks added, removed and left untouched
+    """
+    stats = {"documents_changed": 0, "documents_removed": 0, "documents_unchanged": 0,
+             "documents_failed": 0, "chunks_added": 0, "chunks_removed": 0}
+    os.makedirs(persist_directory, exist_ok=True)
+    manifest_path = os.path.join(persist_directory, MANIFEST_FILENAME)
+    manifest = IngestManifest.load(manifest_path, settings)
+
+    if not manifest.exists:
+        # A store built before the manifest existed has no usable ids; start clean
+        existing = vectorstore.get(include=[])["ids"]
+        if existing:
+            print(f"🧹 Clearing {len(existing)} untracked chunks from {persist_directory}")
+            vectorstore.delete(ids=existing)
+    elif not manifest.settings_match(settings):
+        stale = manifest.all_chunk_ids()
+        print(f"🔁 Index settings changed, dropping {len(stale)} chunks")
+        if stale:
+            vectorstore.delete(ids=stale)
+        stats["chunks_removed"] += len(stale)
+        manifest.documents = {}
+        manifest.settings = settings
+
+    current = source.fingerprints()
+
+    flush_size = executor.flush_size if executor is not None else ADD_BATCH_SIZE
+
+    removed = [name for name in manifest.documents if name not in current]
+    changed = [name for name, fingerprint in current.items()
+               if manifest.documents.get(name, {}).get("fingerprint") != fingerprint]
+    stats["documents_unchanged"] = len(current) - len(changed)
+
+    if not removed and not changed:
+        if not manifest.exists:
+            manifest.save()
+        return stats
+
+    for name in removed:
+        stale = manifest.documents.pop(name).get("chunks", [])
+        if stale:
+            vectorstore.delete(ids=stale)
+        stats["documents_removed"] += 1
+        stats["chunks_removed"] += len(stale)
+        print(f"🗑️ Removed {name} ({len(stale)} chunks)")
+
+    for name, pages in source.load_many(changed):
+        if pages is None:
+            continue
+
+        entry = manifest.documents.get(name)
+        old_ids = set(entry.get("chunks", [])) if entry else set()
+        seen: Dict[str, int] = {}
+        ids: List[str] = []
+        pending: List[Tuple[str, "Document"]] = []
+        added = 0
+
+        try:
+            # Pages are read lazily, so a corrupt file only fails here
+            for page in pages:
+                for chunk in text_splitter.split_documents([page]):
+                    new_id = chunk_id(name, chunk, seen)
+                    ids.append(new_id)
+                    if new_id not in old_ids:
+                        pending.append((new_id, chunk))
+                if len(pending) >= flush_size:
+                    added += _add_chunks(vectorstore, pending, executor, sink)
+                    pending = []
+        except Exception as e:
+            # Keep the old chunks and manifest entry; the document is retried next sync
+            print(f"⚠️ Skipping {name}: {e}")
+            partial = [chunk_id for chunk_id in ids if chunk_id not in old_ids]
+            if partial:
+                vectorstore.delete(ids=partial)
+            stats["documents_failed"] += 1
+            continue
+        added += _add_chunks(vectorstore, pending, executor, sink)
+
+        stale = list(old_ids - set(ids))
+        if stale:
+            vectorstore.delete(ids=stale)
+
+        manifest.documents[name] = {
+            "fingerprint": current[name],
+            "chunks": ids,
+        }
+        # Save after every document so an interrupted run resumes where it stopped
+        manifest.save()
+
+        if not added and not stale:
+            # Touched but identical text: nothing to embed or delete
+            stats["documents_unchanged"] += 1
+            continue
+        stats["documents_changed"] += 1
+        stats["chunks_added"] += added
+        stats["chunks_removed"] += len(stale)
+        print(f"📄 Indexed {name}: {added} new chunks, {len(stale)} removed")
+
+    manifest.save()
+    return stats
@@ -0,0 +1,360 @@
+"""
+RAG Engine - Lazy RAG chain with a separate build step
+
+Importing this module does no I/O. Serving processes open a pre-built Chroma
+index the first time a question arrives; the index itself is built offline by
+`python -m backend.RAG.build_index` (or lazily on first query when no index
+exists yet).
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional
+
+from dotenv import load_dotenv
+
+from backend.utils.deadline import Deadline, timeout_for
+from backend.utils.llm_gateway import LLMTimeout, gateway as llm_gateway
+
+from .ingest import CHROMA_COLLECTION, MANIFEST_FILENAME, hash_text
+
+load_dotenv()
+
+DEFAULT_PERSIST_DIRECTORY = os.getenv("RAG_PERSIST_DIR", "./chroma_db")
+DEFAULT_EMBEDDING_MODEL = "models/text-embedding-004"
+DEFAULT_LLM_MODEL = "gemini-2.0-flash"
+# "google" for Gemini embeddings, "fake" for deterministic offline vectors
+EMBEDDING_PROVIDER = os.getenv("RAG_EMBEDDING_PROVIDER", "google")
+# Persistent embedding cache shared by index builds and queries; empty disables it
+EMBEDDING_CACHE_PATH = os.getenv("RAG_EMBED_CACHE_PATH", "./rag_cache/embeddings.sqlite3")
+# Semantic answer cache for repeated questions; "0" disables it
+ANSWER_CACHE_ENABLED = os.getenv("RAG_ANSWER_CACHE", "1") != "0"
+LLM_TEMPERATURE = 0.5
+
+
+class RagEngineError(RuntimeError):
+    """Raised when the RAG engine cannot be built or loaded."""
+
+
+def format_docs(docs):
+    return "\n\n".join(doc.page_content for doc in docs)
+
+
+class RagEngine:
+    """
+    Owns the vector store and retriever for one document source; answers are
+    generated through the shared LLM gateway.
+
+    Nothing is loaded in __init__; `build_index()` syncs the index with the
+    source and `load()` opens the index and the retriever. `invoke()` calls
+    `load()` on first use.
+    """
+
+    def __init__(self, source_factory: Callable[[], Any], template: str,
+                 persist_directory: str = DEFAULT_PERSIST_DIRECTORY,
+                 embedding_model: str = DEFAULT_EMBEDDING_MODEL,
+                 llm_model: str = DEFAULT_LLM_MODEL,
+                 chunk_size: int = 1000, chunk_overlap: int = 200,
+                 k: int = 3, auto_build: bool = True):
+        self.source_factory = source_factory
+        self.template = template
+        self.persist_directory = persist_directory
+        self.embedding_model = embedding_model
+        self.llm_model = llm_model
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.k = k
+        self.auto_build = auto_build
+
+        self.embeddings = None
+        self.chroma_client = None
+        self.vectorstore = None
+        self.retriever = None
+        self._lock = threading.Lock()
+        self.timings: Dict[str, float] = {}
+        self.answer_cache = None
+        if ANSWER_CACHE_ENABLED:
+            from .answer_cache import SemanticAnswerCache
+            self.answer_cache = SemanticAnswerCache()
+
+    @property
+    def settings(self) -> Dict[str, Any]:
+        """Index settings recorded in the manifest; changing any forces a rebuild."""
+        return {
+            "embedding_model": self.embedding_model,
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+        }
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.retriever is not None
+
+    def has_index(self) -> bool:
+        """Whether a built index (with its ingest manifest) exists on disk."""
+        return os.path.exists(os.path.join(self.persist_directory, MANIFEST_FILENAME))
+
+    @property
+    def template_version(self) -> str:
+        """Short hash of the prompt template; cached answers are scoped by it."""
+        return hash_text(self.template)[:12]
+
+    def index_version(self) -> Optional[int]:
+        """Modification time of the ingest manifest, which changes on every rebuild."""
+        try:
+            return os.stat(os.path.join(self.persist_directory, MANIFEST_FILENAME)).st_mtime_ns
+        except OSError:
+            return None
+
+    def _check_api_key(self, embeddings_only: bool = False):
+        # The offline fake providers need no key; generation is faked when the gateway is forced to "fake"
+        if EMBEDDING_PROVIDER == "fake" and (embeddings_only or llm_gateway.override == "fake"):
+            return
+        if not os.getenv("GOOGLE_API_KEY"):
+            raise RagEngineError("GOOGLE_API_KEY environment variable not set")
+
+    def _open_vectorstore(self):
+        if self.vectorstore is not None:
+            return self.vectorstore
+        from langchain_community.vectorstores import Chroma
+
+        if EMBEDDING_PROVIDER == "fake":
+            from .embedding_executor import FakeEmbeddings
+            self.embeddings = FakeEmbeddings()
+        else:
+            from langchain_google_genai import GoogleGenerativeAIEmbeddings
+            self.embeddings = GoogleGenerativeAIEmbeddings(model=self.embedding_model)
+        from .embedding_cache import CachedEmbeddings, EmbeddingCache, QueryCachedEmbeddings
+        if EMBEDDING_CACHE_PATH:
+            self.embeddings = CachedEmbeddings(
+                self.embeddings,
+                model=f"{EMBEDDING_PROVIDER}/{self.embedding_model}",
+                cache=EmbeddingCache(EMBEDDING_CACHE_PATH),
+            )
+        # Repeated questions are answered from memory before touching disk or network
+        self.embeddings = QueryCachedEmbeddings(self.embeddings)
+        # Our own client, so build_index can write pre-computed vectors through its public Collection API
+        import chromadb
+        self.chroma_client = chromadb.PersistentClient(path=self.persist_directory)
+        self.vectorstore = Chroma(client=self.chroma_client, collection_name=CHROMA_COLLECTION,
+                                  embedding_function=self.embeddings)
+        return self.vectorstore
+
+    def build_index(self) -> Dict[str, int]:
+        """Sync the on-disk index with the document source (offline step)."""
+        self._check_api_key(embeddings_only=True)
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        from .embedding_executor import EmbeddingExecutor, chroma_sink
+        from .ingest import sync_index
+
+        start = time.perf_counter()
+        vectorstore = self._open_vectorstore()
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=self.chunk_size,
+            chunk_overlap=self.chunk_overlap
+        )
+        executor = EmbeddingExecutor.from_env(self.embeddings)
+        stats = sync_index(self.source_factory(), vectorstore, text_splitter,
+                           self.persist_directory, self.settings, executor=executor,
+                           sink=chroma_sink(self.chroma_client.get_collection(CHROMA_COLLECTION)))
+        self.timings["build_seconds"] = time.perf_counter() - start
+        if self.answer_cache is not None:
+            self.answer_cache.invalidate()
+        embed_stats = executor.get_stats()
+        self.timings["embed_chunks_per_second"] = embed_stats["chunks_per_second"]
+        print(f"✅ Index at {self.persist_directory} up to date in {self.timings['build_seconds']:.2f}s: {stats}")
+        if embed_stats["chunks"]:
+            print(f"📈 Embedded {embed_stats['chunks']} chunks at {embed_stats['chunks_per_second']:.1f} chunks/s "
+                  f"({embed_stats['batches']} batches, {embed_stats['retries']} retries)")
+        return stats
+
+    def load(self):
+        """Open the pre-built index and its retriever (idempotent, thread-safe)."""
+        if self.retriever is not None:
+            return self.retriever
+        with self._lock:
+            if self.retriever is not None:
+                return self.retriever
+            self._check_api_key()
+            if not self.has_index():
+                if not self.auto_build:
+                    raise RagEngineError(
+                        f"No index found at {self.persist_directory}. Run `python -m backend.RAG.build_index` first."
+                    )
+                print(f"⚠️ No index found at {self.persist_directory}, building it now...")
+                self.build_index()
+
+            start = time.perf_counter()
+            vectorstore = self._open_vectorstore()
+            self.retriever = vectorstore.as_retriever(search_kwargs={"k": self.k})
+            self.timings["load_seconds"] = time.perf_counter() - start
+            print(f"✅ RAG retriever loaded in {self.timings['load_seconds']:.2f}s")
+            return self.retriever
+
+    def build_prompt(self, question: str) -> str:
+        """Retrieve context for the question and fill in the prompt template."""
+        docs = self.load().invoke(question)
+        return self.template.format(context=format_docs(docs), question=question)
+
+    async def abuild_prompt(self, question: str) -> str:
+        """Async build_prompt(); the first load() still runs in a worker thread."""
+        retriever = self.retriever or await asyncio.to_thread(self.load)
+        docs = await retriever.ainvoke(question)
+        return self.template.format(context=format_docs(docs), question=question)
+
+    def invoke(self, question: str, deadline: Optional[Deadline] = None) -> str:
+        prompt = self._prompt_within(question, deadline)
+        return llm_gateway.complete("gemini", prompt, model=self.llm_model,
+                                    timeout=timeout_for(deadline), temperature=LLM_TEMPERATURE)
+
+    @staticmethod
+    def _check_deadline(deadline: Optional[Deadline]):
+        if deadline is not None and deadline.expired:
+            raise LLMTimeout("Turn deadline expired before the answer was generated")
+
+    def _prompt_within(self, question: str, deadline: Optional[Deadline]) -> str:
+        # Retrieval cannot be interrupted, so only start it while there is time left
+        self._check_deadline(deadline)
+        prompt = self.build_prompt(question)
+        self._check_deadline(deadline)
+        return prompt
+
+    async def _aprompt_within(self, question: str, deadline: Optional[Deadline]) -> str:
+        # Unlike the sync path, async retrieval can be abandoned when the deadline passes
+        self._check_deadline(deadline)
+        try:
+            prompt = await asyncio.wait_for(self.abuild_prompt(question), timeout_for(deadline))
+        except asyncio.TimeoutError:
+            raise LLMTimeout("Turn deadline expired during retrieval")
+        return prompt
+
+    def answer(self, question: str, flow: Optional[str] = None, deadline: Optional[Deadline] = None) -> str:
+        """
+        Answer a question, reusing a cached answer to a semantically similar one.
+
+        Only calls that name a flow are cached, so each flow (and template
+        version) keeps its own answers.
+        """
+        if flow is None or self.answer_cache is None:
+            return self.invoke(question, deadline)
+        return "".join(self.stream(question, flow=flow, deadline=deadline))
+
+    async def aanswer(self, question: str, flow: Optional[str] = None,
+                      deadline: Optional[Deadline] = None) -> str:
+        """Async answer()."""
+        return "".join([chunk async for chunk in self.astream(question, flow=flow, deadline=deadline)])
+
+    def _embed_question(self, question: str, deadline: Optional[Deadline]):
+        # Like retrieval, the sync embedding call cannot be interrupted; only start it while there is time left
+        self._check_deadline(deadline)
+        try:
+            vector = self.embeddings.embed_query(question)
+        except Exception as e:
+            raise RagEngineError(f"Embedding the question failed: {e}") from e
+        self._check_deadline(deadline)
+        return vector
+
+    async def _aembed_question(self, question: str, deadline: Optional[Deadline]):
+        self._check_deadline(deadline)
+        try:
+            return await asyncio.wait_for(self.embeddings.aembed_query(question), timeout_for(deadline))
+        except asyncio.TimeoutError:
+            raise LLMTimeout("Turn deadline expired while embedding the question")
+        except Exception as e:
+            raise RagEngineError(f"Embedding the question failed: {e}") from e
+
+    def _prefetched_prompt(self, question: str, prefetched: Future, deadline: Optional[Deadline]) -> str:
+        """Prompt from a speculative build_prompt() started earlier; rebuilt here if it failed."""
+        try:
+            return prefetched.result(timeout=timeout_for(deadline))
+        except FutureTimeoutError:
+            raise LLMTimeout("Turn deadline expired while waiting for retrieval")
+        except Exception as e:
+            print(f"⚠️ Prefetched retrieval failed, retrying: {e}")
+            return self._prompt_within(question, deadline)
+
+    def stream(self, question: str, flow: Optional[str] = None,
+               deadline: Optional[Deadline] = None, prefetched: Optional[Future] = None) -> Iterator[str]:
+        """
+        Yield the answer in chunks as the LLM generates it (cached answers in one
+        chunk). Raises LLMTimeout when the deadline passes before or during generation.
+
+        prefetched is a Future of build_prompt(question) started ahead of time
+        (e.g. while the intent was being classified); retrieval is then not repeated.
+        It is only waited on when the answer cache misses, and cancelled on a hit.
+        """
+        self.load()
+        scope = vector = None
+        if flow is not None and self.answer_cache is not None:
+            self.answer_cache.check_index_version(self.index_version())
+            scope = (flow, self.template_version)
+            # Goes through the query-embedding cache, so retrieval (or a prefetch that got there first) reuses it
+            vector = self._embed_question(question, deadline)
+            cached = self.answer_cache.lookup(scope, vector)
+            if cached is not None:
+                if prefetched is not None:
+                    prefetched.cancel()
+                yield cached
+                return
+        chunks = []
+        if prefetched is not None:
+            prompt = self._prefetched_prompt(question, prefetched, deadline)
+        else:
+            prompt = self._prompt_within(question, deadline)
+        for chunk in llm_gateway.stream("gemini", prompt, model=self.llm_model,
+                                        timeout=timeout_for(deadline), temperature=LLM_TEMPERATURE):
+            chunks.append(chunk)
+            yield chunk
+        if scope is not None:
+            self.answer_cache.store(scope, question, vector, "".join(chunks))
+
+    async def _aprefetched_prompt(self, question: str, prefetched: Future, deadline: Optional[Deadline]) -> str:
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(prefetched), timeout_for(deadline))
+        except asyncio.TimeoutError:
+            raise LLMTimeout("Turn deadline expired while waiting for retrieval")
+        except Exception as e:
+            print(f"⚠️ Prefetched retrieval failed, retrying: {e}")
+            return await self._aprompt_within(question, deadline)
+
+    async def astream(self, question: str, flow: Optional[str] = None,
+                      deadline: Optional[Deadline] = None, prefetched: Optional[Future] = None) -> AsyncIterator[str]:
+        """Async stream(): retrieval, embedding and generation are awaited, not run on the caller's thread."""
+        if self.retriever is None:
+            await asyncio.to_thread(self.load)
+        scope = vector = None
+        if flow is not None and self.answer_cache is not None:
+            self.answer_cache.check_index_version(self.index_version())
+            scope = (flow, self.template_version)
+            vector = await self._aembed_question(question, deadline)
+            cached = self.answer_cache.lookup(scope, vector)
+            if cached is not None:
+                if prefetched is not None:
+                    prefetched.cancel()
+                yield cached
+                return
+        chunks = []
+        if prefetched is not None:
+            prompt = await self._aprefetched_prompt(question, prefetched, deadline)
+        else:
+            prompt = await self._aprompt_within(question, deadline)
+        async for chunk in llm_gateway.astream("gemini", prompt, model=self.llm_model,
+                                               timeout=timeout_for(deadline), temperature=LLM_TEMPERATURE):
+            chunks.append(chunk)
+            yield chunk
+        if scope is not None:
+            self.answer_cache.store(scope, question, vector, "".join(chunks))
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = {
+            "loaded": self.is_loaded,
+            "has_index": self.has_index(),
+            **self.timings,
+        }
+        if hasattr(self.embeddings, "get_stats"):
+            stats["embedding_cache"] = self.embeddings.get_stats()
+        if self.answer_cache is not None:
+            stats["answer_cache"] = self.answer_cache.get_stats()
+        return stats
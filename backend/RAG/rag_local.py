@@ -1,120 +1,58 @@
 import os
 import sys
-from dotenv import load_dotenv
-import fitz  # PyMuPDF, for extracting text from PDFs
-
-# Langchain imports
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_core.documents import Document
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_community.vectorstores import Chroma
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough
-from langchain_core.output_parsers import StrOutputParser
 
 # Get the absolute path of the current script
 current_script_dir = os.path.dirname(os.path.abspath(__file__))
 
-# Calculate the project root directory (Thalia) path
-project_root_dir = os.path.join(current_script_dir, "..")
-
-# Add the project root directory to Python's module search path
-sys.path.append(project_root_dir)
-
-# --- 1. Configuration ---
-persist_directory = "./chroma_db"
-
-load_dotenv()
-
-print("Please ensure all necessary libraries are installed via pip install.")
-# ----------------------------------------------------
-
-# --- 2. Connecting to Gemini API ---
-gemini_api_key = os.getenv("GOOGLE_API_KEY")
-
-if gemini_api_key:
-    os.environ["GOOGLE_API_KEY"] = gemini_api_key
-    print("Google API Key has been successfully loaded from environment or .env file.")
-else:
-    print("Warning: GOOGLE_API_KEY environment variable not set. Please set it to proceed.")
-    print("Exiting script. Please set GOOGLE_API_KEY and restart.")
-    exit()
-# ----------------------------------------------------
-
-# --- 3. Document Loading from Local PDFs ---
-# Define the path to the PDF folder. Assumes RAG_database is inside the RAG folder.
-pdf_folder = os.path.join(current_script_dir, "RAG_database")
-
-def extract_text_from_pdf(file_path):
-    """Extracts all text from a single PDF file using PyMuPDF (fitz)."""
-    try:
-        doc = fitz.open(file_path)
-        text = "\n".join(page.get_text() for page in doc)
-        doc.close()
-        return text
-    except Exception as e:
-        print(f"Error extracting text from {file_path}: {e}")
-        return None
-
-print(f"Loading documents from local PDF folder: {pdf_folder}...")
-documents = []
-if os.path.exists(pdf_folder):
-    for filename in os.listdir(pdf_folder):
-        if filename.endswith(".pdf"):
-            file_path = os.path.join(pdf_folder, filename)
-            content = extract_text_from_pdf(file_path)
-            if content:
-                documents.append(Document(page_content=content, metadata={"source": filename}))
-    print(f"Loaded {len(documents)} documents from local PDFs.")
-else:
-    print(f"Error: PDF folder not found at {pdf_folder}.")
-    print("Please ensure 'RAG_database' folder exists and contains PDF files.")
-    print("Exiting script.")
-    exit()
-
-if not documents:
-    print("No documents were loaded from the PDF folder. Please check if the folder contains valid PDF files.")
-    print("Exiting script.")
-    exit()
-
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=1000,
-    chunk_overlap=200
-)
-texts = text_splitter.split_documents(documents)
-
-print(f"Number of text chunks after splitting: {len(texts)}")
-if not texts:
-    print("No text chunks were generated. Please check your documents and splitting parameters.")
-    print("Exiting script.")
-    exit()
-else:
-    print(f"Example of the first text chunk (first 200 chars):\n{texts[0].page_content[:200]}...")
+# Add the repository root directory to Python's module search path
+sys.path.append(os.path.join(current_script_dir, "..", ".."))
+
+from backend.RAG.ingest import DocumentSource, page_documents
+from backend.RAG.rag_engine import RagEngine
+
+# --- 1. Document Source from Local PDFs ---
+# Define the path to the PDF folder. Assumes RAG_Database is inside the RAG folder.
+pdf_folder = os.path.join(current_script_dir, "RAG_Database")
+
+class LocalPdfSource(DocumentSource):
+    """PDFs in a local folder, fingerprinted by file size and modification time."""
+
+    def __init__(self, folder=pdf_folder):
+        self.folder = folder
+
+    def fingerprints(self):
+        if not os.path.exists(self.folder):
+            raise FileNotFoundError(f"PDF folder not found at {self.folder}")
+        fingerprints = {}
+        for filename in os.listdir(self.folder):
+            if filename.endswith(".pdf"):
+                stat = os.stat(os.path.join(self.folder, filename))
+                fingerprints[filename] = f"{stat.st_size}:{stat.st_mtime_ns}"
+        return fingerprints
+
+    def load_pages(self, source):
+        """Stream one PDF page by page; read errors surface while iterating (see sync_index)."""
+        from backend.utils.pdf_extractor import iter_pdf_pages
+        return page_documents(source, iter_pdf_pages(os.path.join(self.folder, source)))
+
+    def load_many(self, sources):
+        """
+        Extract changed PDFs across a process pool instead of one by one.
+
+        Pooled extraction returns whole documents (at most 2 * workers in
+        flight), so a single PDF, or PDF_EXTRACT_WORKERS=1, streams pages instead.
+        """
+        from backend.utils.pdf_extractor import DEFAULT_WORKERS, extract_pdfs_parallel
+        if len(sources) <= 1 or DEFAULT_WORKERS == 1:
+            yield from super().load_many(sources)
+            return
+        paths = [os.path.join(self.folder, source) for source in sources]
+        for extracted in extract_pdfs_parallel(paths):
+            yield extracted["file_name"], page_documents(extracted["file_name"], enumerate(extracted["pages"], start=1))
 # ----------------------------------------------------
 
 
-# --- 4. Import embedding model and vector store ---
-print("Initializing Gemini Embedding Model and creating Vector Store...")
-embeddings = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004")
-
-if os.path.exists(persist_directory) and os.listdir(persist_directory):
-    print(f"Loading existing vector store from: {persist_directory}")
-    vectorstore = Chroma(persist_directory=persist_directory, embedding_function=embeddings)
-else:
-    print(f"Creating new vector store and saving to: {persist_directory}")
-    vectorstore = Chroma.from_documents(texts, embeddings, persist_directory=persist_directory)
-
-print(f"All {len(texts)} text chunks successfully embedded and stored in a single vector store!")
-print(f"Vector store saved to: {persist_directory}")
-# ----------------------------------------------------
-
-
-# --- 5. Import LLM model and RAG chain components ---
-print("Initializing Gemini LLM Model and building RAG chain...")
-llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0.5)
-retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
-
+# --- 2. Prompt template ---
 template = """You are a compassionate and knowledgeable menopause support assistant.
 
 Before answering, please:
@@ -245,23 +183,14 @@ Question:
 {question}
 
 Answer:"""
+# ----------------------------------------------------
 
-prompt = ChatPromptTemplate.from_template(template)
-
-def format_docs(docs):
-    return "\n\n".join(doc.page_content for doc in docs)
-
-rag_chain = (
-    {"context": retriever | format_docs, "question": RunnablePassthrough()}
-    | prompt
-    | llm
-    | StrOutputParser()
-)
 
-print("RAG chain successfully built.")
+# --- 3. RAG engine (index and chain are loaded on first use) ---
+engine = RagEngine(source_factory=LocalPdfSource, template=template)
 # ----------------------------------------------------
 
-#  --- 6. Local Testing RAG ---
+#  --- 4. Local Testing RAG ---
 def test_rag_local_output():
     """
     Tests the RAG chain with predefined questions and prints responses to the console.
@@ -281,7 +210,7 @@ def test_rag_local_output():
 
     for question in questions:
         print(f"\nQuestion: {question}")
-        response = rag_chain.invoke(question)
+        response = engine.invoke(question)
         print(f"Answer: {response}")
 
     print("\nRAG pipeline setup complete. Local testing finished.")
@@ -1,12 +1,70 @@
 # teammate_frontend_app.py
-#from .rag_local import rag_chain # Local RAG_Database
-from .rag_sql import rag_chain # MySQL Connection
+#from .rag_local import engine as rag_engine # Local RAG_Database
+from .rag_sql import engine as rag_engine # MySQL Connection
+from .rag_engine import RagEngineError
+from backend.utils.llm_gateway import LLMError, LLMTimeout
 
-def get_chatbot_response(user_message, chat_history):
-    response = rag_chain.invoke(user_message)
+TIMEOUT_MESSAGE = "Sorry, that is taking longer than expected. Please try asking again in a moment."
+TRUNCATED_NOTE = "\n\n(Sorry, I ran out of time to finish this answer.)"
+
+def get_chatbot_response(user_message, chat_history, flow=None, deadline=None):
+    try:
+        response = rag_engine.answer(user_message, flow=flow, deadline=deadline)
+    except LLMTimeout as e:
+        print(f"⏱️ RAG answer timed out: {e}")
+        return TIMEOUT_MESSAGE
+    except (RagEngineError, LLMError) as e:
+        print(f"⚠️ RAG engine unavailable: {e}")
+        return "RAG system unavailable. Please try again later."
     return response
 
+def prefetch_context(user_message):
+    """Embed the question and retrieve its context ahead of time; returns the filled prompt."""
+    return rag_engine.build_prompt(user_message)
+
+def stream_chatbot_response(user_message, chat_history, flow=None, deadline=None, prefetched=None):
+    """
+    Yield the answer in chunks as it is generated, within the turn's deadline.
+    prefetched is a Future of prefetch_context(user_message), if one was started.
+    """
+    started = False
+    try:
+        for chunk in rag_engine.stream(user_message, flow=flow, deadline=deadline, prefetched=prefetched):
+            started = True
+            yield chunk
+    except LLMTimeout as e:
+        print(f"⏱️ RAG answer timed out: {e}")
+        yield TRUNCATED_NOTE if started else TIMEOUT_MESSAGE
+    except (RagEngineError, LLMError) as e:
+        print(f"⚠️ RAG engine unavailable: {e}")
+        yield "RAG system unavailable. Please try again later."
+
+async def aget_chatbot_response(user_message, chat_history, flow=None, deadline=None):
+    """Async get_chatbot_response()."""
+    try:
+        return await rag_engine.aanswer(user_message, flow=flow, deadline=deadline)
+    except LLMTimeout as e:
+        print(f"⏱️ RAG answer timed out: {e}")
+        return TIMEOUT_MESSAGE
+    except (RagEngineError, LLMError) as e:
+        print(f"⚠️ RAG engine unavailable: {e}")
+        return "RAG system unavailable. Please try again later."
+
+async def astream_chatbot_response(user_message, chat_history, flow=None, deadline=None, prefetched=None):
+    """Async stream_chatbot_response(), for event-loop front ends."""
+    started = False
+    try:
+        async for chunk in rag_engine.astream(user_message, flow=flow, deadline=deadline, prefetched=prefetched):
+            started = True
+            yield chunk
+    except LLMTimeout as e:
+        print(f"⏱️ RAG answer timed out: {e}")
+        yield TRUNCATED_NOTE if started else TIMEOUT_MESSAGE
+    except (RagEngineError, LLMError) as e:
+        print(f"⚠️ RAG engine unavailable: {e}")
+        yield "RAG system unavailable. Please try again later."
+
 if __name__ == "__main__":
     user_input = input("Ask me a question: ")
     answer = get_chatbot_response(user_input, []) 
-    print(f"Bot: {answer}")
\ No newline at end of file
+    print(f"Bot: {answer}")
@@ -1,108 +1,45 @@
-
-
 import os
 import sys
 
-# print("\n--- sys.path for debugging ---")
-# for p in sys.path:
-#     print(p)
-# print("----------------------------\n")
-
-
 # to get current pathway
 current_script_dir = os.path.dirname(os.path.abspath(__file__))
 
-project_root_dir = os.path.join(current_script_dir, "..")
-
-sys.path.append(project_root_dir)
+repo_root_dir = os.path.join(current_script_dir, "..", "..")
 
+sys.path.append(repo_root_dir)
 
 
 # --- 1. Configuration ---
-from dotenv import load_dotenv
-persist_directory = "./chroma_db"
-
-load_dotenv()
-
-print("❗️ Please ensure all necessary libraries are installed via pip install.")
-# ----------------------------------------------------
-
-# --- 2. Connecting to Gemini API ---
-gemini_api_key = os.getenv("GOOGLE_API_KEY")
-
-if gemini_api_key:
-    os.environ["GOOGLE_API_KEY"] = gemini_api_key
-    print("✅ Google API Key has been successfully loaded from environment or .env file.")
-else:
-    print("Warning: GOOGLE_API_KEY environment variable not set. Please set it to proceed.")
-    print("Exiting script. Please set GOOGLE_API_KEY and restart.")
-    exit()
+from backend.RAG.ingest import DocumentSource, page_documents
+from backend.RAG.rag_engine import RagEngine
 # ----------------------------------------------------
 
-# --- 3. Documents/Database Loading ---
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_core.documents import Document
-from db.fetch_pdfs import fetch_pdf_texts
-
-print("Loading documents from MySQL database...")
-try:
-    db_documents = fetch_pdf_texts()
-    documents = []
-    for doc in db_documents:
-        documents.append(Document(page_content=doc['content'], metadata={"source": doc['file_name']}))
-    
-    print(f"✅ Loaded {len(documents)} documents from the database.")
-except Exception as e:
-    print(f"Error loading documents from database: {e}")
-    print("Please ensure your MySQL database is running and accessible, and 'pdf_documents' table exists.")
-    print("Exiting script. Please check your database connection.")
-    exit()
-
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=1000,
-    chunk_overlap=200
-)
-texts = text_splitter.split_documents(documents)
-
-print(f"Number of text chunks after splitting: {len(texts)}")
-if not texts:
-    print("No text chunks were generated. Please check your documents and splitting parameters.")
-    print("Exiting script.")
-    exit()
-else:
-    print(f"Example of the first text chunk (first 200 chars):\n{texts[0].page_content[:200]}...")
+# --- 2. Documents/Database Source ---
+class MySQLPdfSource(DocumentSource):
+    """Documents stored in the pdf_documents table, fingerprinted by their timestamps."""
+
+    def fingerprints(self):
+        from backend.db.fetch_pdfs import fetch_pdf_fingerprints
+        return fetch_pdf_fingerprints()
+
+    def load_pages(self, source):
+        from backend.db.fetch_pdfs import fetch_pdf_text
+        from backend.utils.pdf_extractor import split_pages
+        row = fetch_pdf_text(source)
+        if row is None:
+            return None
+        return page_documents(row['file_name'], split_pages(row['content']))
+
+    def load_many(self, sources):
+        """Stream the changed rows through one server-side cursor."""
+        from backend.db.fetch_pdfs import iter_pdf_texts
+        from backend.utils.pdf_extractor import split_pages
+        for row in iter_pdf_texts(file_names=sources):
+            yield row['file_name'], page_documents(row['file_name'], split_pages(row['content']))
 # ----------------------------------------------------
 
 
-# --- 4. Import embedding model and vector store ---
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_community.vectorstores import Chroma
-
-print("Initializing Gemini Embedding Model and creating Vector Store...")
-embeddings = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004")
-
-if os.path.exists(persist_directory) and os.listdir(persist_directory):
-    print(f"Loading existing vector store from: {persist_directory}")
-    vectorstore = Chroma(persist_directory=persist_directory, embedding_function=embeddings)
-else:
-    print(f"Creating new vector store and saving to: {persist_directory}")
-    vectorstore = Chroma.from_documents(texts, embeddings, persist_directory=persist_directory)
-
-print(f"✅ All {len(texts)} text chunks successfully embedded and stored in a single vector store!")
-print(f"Vector store saved to: {persist_directory}")
-# ----------------------------------------------------
-
-
-# --- 5. Import LLM model and RAG chain components ---
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough
-from langchain_core.output_parsers import StrOutputParser
-
-print("Initializing Gemini LLM Model and building RAG chain...")
-llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0.5)
-retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
-
+# --- 3. Prompt template ---
 template = """You are a compassionate and knowledgeable menopause support assistant.
 
 Before answering, please:
@@ -190,22 +127,14 @@ Question:
 {question}
 
 Answer:"""
-prompt = ChatPromptTemplate.from_template(template)
-
-def format_docs(docs):
-    return "\n\n".join(doc.page_content for doc in docs)
+# ----------------------------------------------------
 
-rag_chain = (
-    {"context": retriever | format_docs, "question": RunnablePassthrough()}
-    | prompt
-    | llm
-    | StrOutputParser()
-)
 
-print("RAG chain successfully built.")
+# --- 4. RAG engine (index and chain are loaded on first use) ---
+engine = RagEngine(source_factory=MySQLPdfSource, template=template)
 # ----------------------------------------------------
 
-#  --- 6. Local Testing RAG ---
+#  --- 5. Local Testing RAG ---
 def test_rag_local_output():
     """
     Tests the RAG chain with predefined questions and prints responses to the console.
@@ -225,7 +154,7 @@ def test_rag_local_output():
 
     for question in questions:
         print(f"\nQuestion: {question}")
-        response = rag_chain.invoke(question)
+        response = engine.invoke(question)
         print(f"Answer: {response}")
 
     print("\n ✅ RAG pipeline setup complete. SQL RAG testing finished.")
@@ -1,17 +1,37 @@
 import os
 from dotenv import load_dotenv
 import mysql.connector
+from mysql.connector import pooling
 
 #loads the environment variables from a .env file
 load_dotenv()
 
-def get_db_connection():
-    """Establishes and returns a connection to the database using environment variables."""
-    connection = mysql.connector.connect(
+_pool = None
+
+def _connection_settings():
+    return dict(
         host=os.getenv("DB_HOST"),
         port=os.getenv("DB_PORT"),
         database=os.getenv("DB_NAME"),
         user=os.getenv("DB_USER"),
         password=os.getenv("DB_PASSWORD")
     )
+
+def get_db_connection():
+    """Establishes and returns a connection to the database using environment variables."""
+    connection = mysql.connector.connect(**_connection_settings())
     return connection
+
+def get_pooled_connection():
+    """
+    Returns a connection from a process-wide pool, created on first use.
+    Calling close() on it hands it back to the pool instead of disconnecting.
+    """
+    global _pool
+    if _pool is None:
+        _pool = pooling.MySQLConnectionPool(
+            pool_name="thalia_pool",
+            pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+            **_connection_settings()
+        )
+    return _pool.get_connection()
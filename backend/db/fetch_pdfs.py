@@ -1,17 +1,73 @@
-from connection import get_db_connection
+from backend.db.connection import get_db_connection
+
+FETCH_BATCH_SIZE = 4
+
+def _row_to_dict(r):
+    return {"file_name": r[0], "content": r[1], "title": r[2], "authors": r[3], "journal": r[4], "year": r[5], "doi": r[6]}
+
+def iter_pdf_texts(file_names=None, batch_size=FETCH_BATCH_SIZE):
+    """
+    Stream document rows through a server-side (unbuffered) cursor, batch_size
+    rows at a time, so only one batch of LONGTEXT content is held in memory.
+    Pass file_names to restrict the stream to those documents.
+    """
+    query = "SELECT file_name, content, title, authors, journal, year, doi FROM pdf_documents"
+    params = ()
+    if file_names is not None:
+        if not file_names:
+            return
+        query += " WHERE file_name IN (" + ", ".join(["%s"] * len(file_names)) + ")"
+        params = tuple(file_names)
+
+    conn = get_db_connection()
+    cursor = conn.cursor(buffered=False)
+    try:
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for r in rows:
+                yield _row_to_dict(r)
+    finally:
+        try:
+            cursor.close()
+        finally:
+            conn.close()
 
 def fetch_pdf_texts():
+    """Fetch every document row as a list; prefer iter_pdf_texts for large corpora."""
+    return list(iter_pdf_texts())
+
+
+def fetch_pdf_fingerprints():
+    """Return {file_name: fingerprint} without reading any document content."""
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT file_name, content, title, authors, journal, year, doi FROM pdf_documents")
+    cursor.execute("SELECT file_name, uploaded_at, last_indexed_at FROM pdf_documents")
     rows = cursor.fetchall()
     cursor.close()
     conn.close()
-    return [{"file_name": r[0], "content": r[1], "title": r[2], "authors": r[3], "journal": r[4], "year": r[5], "doi": r[6]} for r in rows]
+    return {r[0]: f"{r[1]}|{r[2]}" for r in rows}
+
+
+def fetch_pdf_text(file_name):
+    """Fetch a single document row by file name, or None if it is gone."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT file_name, content, title, authors, journal, year, doi FROM pdf_documents WHERE file_name = %s",
+        (file_name,),
+    )
+    r = cursor.fetchone()
+    cursor.close()
+    conn.close()
+    if r is None:
+        return None
+    return _row_to_dict(r)
 
 
 if __name__ == "__main__":
-    docs = fetch_pdf_texts()
-    for doc in docs:
+    for doc in iter_pdf_texts():
         print(f"\n {doc['file_name']}\n{'-'*50}\n{doc['content'][:500]}...\n")
-        print(f"Metadata: Title={doc['title']}, Authors={doc['authors']}, Journal={doc['journal']}, Year={doc['year']}, DOI={doc['doi']}\n")
\ No newline at end of file
+        print(f"Metadata: Title={doc['title']}, Authors={doc['authors']}, Journal={doc['journal']}, Year={doc['year']}, DOI={doc['doi']}\n")
@@ -0,0 +1,4 @@
+USE thalia;
+
+-- one-off migration for databases created before file_hash existed
+ALTER TABLE pdf_documents ADD COLUMN file_hash CHAR(64) NULL AFTER file_path;
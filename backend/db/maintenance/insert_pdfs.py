@@ -1,85 +1,83 @@
 import os
-# make sure we get the real PyMuPDF
-try:
-    import fitz  # this should be PyMuPDF
-    if not hasattr(fitz, "open"):
-        raise ImportError
-except ImportError:
-    # fallback if something shadows it
-    import pymupdf as fitz # PyMuPDF
 from datetime import datetime
-from backend.db.connection import get_db_connection
+from backend.db.connection import get_pooled_connection
+from backend.utils.pdf_extractor import PAGE_BREAK, extract_pdfs_parallel, file_hash
 
-def extract_metadata_from_pdf(file_path):
-    doc = fitz.open(file_path)
-    metadata = doc.metadata or {}
+BATCH_SIZE = int(os.getenv("PDF_INSERT_BATCH_SIZE", "8"))
 
-    raw_date = metadata.get("creationDate")  # e.g. "D:20241109..."
-    year = None
-    if raw_date and len(raw_date) >= 6:
-        # D:YYYY...
-        year_part = raw_date[2:6]
-        if year_part.isdigit():
-            year = int(year_part)
+UPSERT_SQL = """
+    INSERT INTO pdf_documents
+    (file_name, title, authors, journal, year, doi, content, file_path, file_hash, last_indexed_at)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        title = VALUES(title), authors = VALUES(authors), journal = VALUES(journal),
+        year = VALUES(year), doi = VALUES(doi), content = VALUES(content),
+        file_path = VALUES(file_path), file_hash = VALUES(file_hash),
+        last_indexed_at = VALUES(last_indexed_at)
+"""
 
+def _row_from_extracted(extracted, hashes):
+    meta = extracted["metadata"]
+    return (
+        extracted["file_name"],
+        (meta.get("title") or "")[:500],
+        (meta.get("authors") or "")[:255],
+        (meta.get("journal") or "")[:500],
+        meta["year"],
+        meta["doi"],
+        PAGE_BREAK.join(extracted["pages"]),
+        extracted["file_path"],
+        hashes[extracted["file_path"]],
+        datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+    )
 
-    return {
-        "title": metadata.get("title", "") or "",
-        "authors": metadata.get("author", "") or "", 
-        "year": year,
-        "journal": metadata.get("subject", "") or "",
-        "doi": metadata.get("keywords", "") or ""
-    }
+def insert_pdfs(file_paths):
+    """
+    Insert or refresh PDFs in pdf_documents.
 
-def extract_text_from_pdf(file_path):
-    doc = fitz.open(file_path)
-    return "\n".join(page.get_text() for page in doc)
-
-def insert_pdf(file_path):
-    text = extract_text_from_pdf(file_path)
-    file_name = os.path.basename(file_path)
-    meta = extract_metadata_from_pdf(file_path)
-
-    title = (meta.get("title") or "")[:500]
-    journal = (meta.get("journal") or "")[:500]
-    author = (meta.get("author") or "")[:255]
-
-
-    conn = get_db_connection()
+    Files whose hash matches an already indexed row are skipped without being
+    opened; the rest are extracted across a process pool and written in
+    batches over a single pooled connection.
+    """
+    conn = get_pooled_connection()
     cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT file_name, file_hash, last_indexed_at FROM pdf_documents")
+        indexed = {name: stored_hash for name, stored_hash, last_indexed_at in cursor.fetchall()
+                   if last_indexed_at is not None}
+
+        hashes = {}
+        pending = []
+        for path in file_paths:
+            hashes[path] = file_hash(path)
+            if indexed.get(os.path.basename(path)) == hashes[path]:
+                print(f"Skipping {os.path.basename(path)} — already in database.")
+            else:
+                pending.append(path)
 
-    cursor.execute("SELECT COUNT(*) FROM pdf_documents WHERE file_name = %s", (file_name,))
-    (count,) = cursor.fetchone()
+        batch = []
+        written = 0
+        for extracted in extract_pdfs_parallel(pending):
+            batch.append(_row_from_extracted(extracted, hashes))
+            if len(batch) >= BATCH_SIZE:
+                cursor.executemany(UPSERT_SQL, batch)
+                conn.commit()
+                written += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany(UPSERT_SQL, batch)
+            conn.commit()
+            written += len(batch)
 
-    if count>0:
-        print(f"Skipping {file_name} — already in database.")
-    else:
-        cursor.execute(
-            """
-            INSERT INTO pdf_documents
-            (file_name, title, authors, journal, year, doi, content, file_path, last_indexed_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """,
-            (
-                file_name,
-                title,  # fallback to filename
-                author,
-                journal,
-                meta["year"],
-                meta["doi"],
-                text,
-                file_path,
-                datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
-            ),
-        )
-        conn.commit()
-        print(f"Inserted {file_name} into database.")
+        print(f"Inserted or updated {written} documents, skipped {len(file_paths) - len(pending)}.")
+        return written
+    finally:
+        cursor.close()
+        conn.close()
 
-    cursor.close()
-    conn.close()
+def insert_pdf(file_path):
+    return insert_pdfs([file_path])
 
 if __name__ == "__main__":
     pdf_folder = os.path.join(os.path.dirname(__file__), "..", "pdfs")
-    for file in os.listdir(pdf_folder):
-        if file.endswith(".pdf"):
-            insert_pdf(os.path.join(pdf_folder, file))
+    insert_pdfs([os.path.join(pdf_folder, file) for file in sorted(os.listdir(pdf_folder)) if file.endswith(".pdf")])
@@ -11,6 +11,7 @@ CREATE TABLE IF NOT EXISTS pdf_documents (
     doi VARCHAR(255) NULL,
     content LONGTEXT NOT NULL,
     file_path VARCHAR(512),
+    file_hash CHAR(64) NULL,
     uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     last_indexed_at TIMESTAMP NULL,
     INDEX idx_title (title),
@@ -0,0 +1,210 @@
+"""
+MRS Response Parser - Scores clear assessment replies without calling the LLM
+
+The lexicon comes from the mrs_response_analyzer prompt itself: the symptom
+expressions, the severity table and the exit phrases. They are compiled into
+a word trie, and a reply is scanned for the longest phrase at each position.
+
+Only unambiguous replies are scored locally ("no", "mild for both", "no hot
+flashes but moderate palpitations"). Anything else - questions, unknown
+words, mixed severities, symptoms without a severity - returns None so the
+caller falls back to the LLM.
+"""
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+_WORD = re.compile(r"[a-z0-9']+|[.,;:!?]")
+_SYMPTOM_LINE = re.compile(r"\*\*(\w+)\*\*:\s*(.+)")
+_SEVERITY_ROW = re.compile(r"^\|\s*([0-4])\s*\|([^|]+)\|([^|]+)\|")
+_QUOTED = re.compile(r'"([^"]+)"')
+
+# Words that may precede a symptom to deny it ("no hot flashes", "never had night sweats")
+NEGATORS = {"no", "not", "never", "don't", "dont", "doesn't", "haven't", "hasn't", "without"}
+# Words allowed between a negator and the symptom it denies
+NEGATION_GAP = {"have", "had", "get", "got", "any", "really", "much", "experience", "experienced", "the", "a"}
+# Symptom expressions that name a faculty rather than the problem: "no desire" or "no bladder
+# control" reports the symptom, so a negated mention of one of these goes to the LLM
+FACULTIES = {"desire", "libido", "interest", "sex life", "sex drive", "intimacy", "arousal",
+             "bladder control", "sleep", "energy", "concentration", "memory", "focus"}
+# Words that carry no information in a short severity answer
+FILLER = {
+    "i", "i'm", "im", "i'd", "it", "it's", "its", "is", "are", "am", "was", "were", "be", "been",
+    "the", "a", "an", "my", "me", "those", "these", "them", "that", "this", "they", "both",
+    "of", "and", "or", "but", "so", "just", "really", "yeah", "um", "uh", "hmm", "well",
+    "ok", "okay", "would", "say", "have", "has", "had", "get", "gets", "got", "any", "with",
+    "for", "to", "at", "all", "only", "pretty", "quite", "kind", "sort", "feel", "feels",
+    "lately", "now", "too", "one", "ones", "either", "honestly", "probably", "mostly",
+    ".", ",", ";", ":", "!",
+}
+
+ACKNOWLEDGEMENTS = {
+    0: "Okay, I understand.",
+    1: "That sounds manageable for now.",
+    2: "I can see how that would affect you.",
+    3: "That sounds really challenging.",
+    4: "I hear that it's been quite difficult.",
+}
+
+
+def _words(text: str) -> List[str]:
+    return _WORD.findall(text.lower().replace("’", "'"))
+
+
+def _stem(word: str) -> str:
+    """Fold plurals so "hot flashes" matches the lexicon's "hot flash"."""
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith(("shes", "ches", "xes", "sses")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "'s")):
+        return word[:-1]
+    return word
+
+
+class MRSResponseParser:
+    """
+    Longest-match phrase scanner over the analyzer prompt's lexicon.
+
+    parse() returns a result in the same shape as the LLM analyzer
+    (symptoms_scored, action_type, next_message), or None to escalate.
+    """
+
+    def __init__(self, symptoms: Dict[str, List[str]], severities: Dict[int, List[str]], exits: List[str]):
+        self.symptom_names = list(symptoms)
+        self._trie: Dict[str, Any] = {}
+        self._longest = 1
+        faculties = {tuple(_stem(word) for word in _words(phrase)) for phrase in FACULTIES}
+        for name, phrases in symptoms.items():
+            for phrase in phrases:
+                stems = tuple(_stem(word) for word in _words(phrase))
+                self._add(phrase, ("faculty" if stems in faculties else "symptom", name))
+        for score, phrases in severities.items():
+            for phrase in phrases:
+                self._add(phrase, ("severity", score))
+        for phrase in exits:
+            self._add(phrase, ("exit", None))
+        self.stats = {"local": 0, "escalated": 0}
+
+    @classmethod
+    def from_template(cls, template: str) -> "MRSResponseParser":
+        """Extract the lexicon from the mrs_response_analyzer prompt text."""
+        symptoms: Dict[str, List[str]] = {}
+        severities: Dict[int, List[str]] = {}
+        exits: List[str] = []
+        for line in template.splitlines():
+            line = line.strip()
+            symptom = _SYMPTOM_LINE.match(line.lstrip("- "))
+            if symptom:
+                symptoms[symptom.group(1)] = [p.strip() for p in symptom.group(2).split(",") if p.strip()]
+                continue
+            row = _SEVERITY_ROW.match(line)
+            if row:
+                phrases = [row.group(2).strip()] + row.group(3).split(",")
+                severities[int(row.group(1))] = [p.strip() for p in phrases if p.strip()]
+                continue
+            if "emergency_exit" in line and not exits:
+                exits = _QUOTED.findall(line.split("set action_type")[0])
+        return cls(symptoms, severities, exits)
+
+    def _add(self, phrase: str, payload: Tuple[str, Any]):
+        words = _words(phrase)
+        if not words:
+            return
+        node = self._trie
+        for word in words:
+            node = node.setdefault(_stem(word), {})
+        # First definition wins so symptom expressions keep priority over severity words
+        node.setdefault(None, payload)
+        self._longest = max(self._longest, len(words))
+
+    def _scan(self, words: List[str]) -> List[Tuple[str, Any, str]]:
+        """(kind, value, text) for the longest phrase at each position; unknown words are ("word", w, w)."""
+        matches = []
+        i = 0
+        while i < len(words):
+            node, found = self._trie, None
+            for j in range(i, min(len(words), i + self._longest)):
+                node = node.get(_stem(words[j]))
+                if node is None:
+                    break
+                if None in node:
+                    found = (j + 1, node[None])
+            if found:
+                end, (kind, value) = found
+                matches.append((kind, value, " ".join(words[i:end])))
+                i = end
+            else:
+                matches.append(("word", words[i], words[i]))
+                i += 1
+        return matches
+
+    def parse(self, user_input: str, asked_symptoms: List[str]) -> Optional[Dict[str, Any]]:
+        result = self._parse(user_input, asked_symptoms)
+        self.stats["local" if result else "escalated"] += 1
+        return result
+
+    def _parse(self, user_input: str, asked_symptoms: List[str]) -> Optional[Dict[str, Any]]:
+        words = _words(user_input)
+        if not words or "?" in words:
+            return None
+        matches = self._scan(words)
+
+        # Pass 1: symptoms, and the negators that deny them
+        negated, mentioned, consumed = set(), set(), set()
+        for index, (kind, value, _) in enumerate(matches):
+            if kind not in ("symptom", "faculty"):
+                continue
+            back = index - 1
+            while back >= 0 and matches[back][0] == "word" and matches[back][2] in NEGATION_GAP:
+                back -= 1
+            if back >= 0 and matches[back][2] in NEGATORS:
+                if kind == "faculty":
+                    # "no desire" reports the symptom; how badly is for the LLM to judge
+                    return None
+                negated.add(value)
+                consumed.update(range(back, index))
+            else:
+                mentioned.add(value)
+            consumed.add(index)
+
+        # Pass 2: everything else must be a severity, an exit phrase or filler
+        levels = set()
+        exit_requested = False
+        for index, (kind, value, _) in enumerate(matches):
+            if index in consumed:
+                continue
+            if kind == "severity":
+                levels.add(value)
+            elif kind == "exit":
+                exit_requested = True
+            elif value not in FILLER:
+                return None
+
+        if exit_requested:
+            if mentioned or negated or levels:
+                return None
+            return {"symptoms_scored": [], "action_type": "emergency_exit", "next_message": ""}
+
+        if len(levels) > 1 or mentioned & negated:
+            return None
+        level = next(iter(levels)) if levels else None
+        if mentioned and (level is None or level == 0):
+            # Symptoms without a severity need a follow-up; "no" next to a named symptom is too easy to misread
+            return None
+        if not mentioned and not negated:
+            if level is None or not asked_symptoms:
+                return None
+            scores = {name: level for name in asked_symptoms}
+        else:
+            if level is not None and not mentioned:
+                return None
+            scores = {name: 0 for name in negated}
+            scores.update({name: level for name in mentioned})
+            if any(name not in scores for name in asked_symptoms):
+                return None
+
+        return {
+            "symptoms_scored": [{"symptom": name, "mrs_score": score} for name, score in scores.items()],
+            "action_type": "severity_clear",
+            "next_message": ACKNOWLEDGEMENTS[max(scores.values())],
+        }
@@ -1,9 +1,12 @@
 from typing import Any, Dict, Optional
 import json
+from backend.utils.deadline import Deadline, timeout_for
 from backend.utils.template_loader import template_loader, format_template
 from backend.utils import openai_client
 from .mrs_symptom_tracker import MRSTracker
-from .symptom_assessment_processors import MRSCollector, MRSScorer
+from .symptom_assessment_processors import (
+    SEVERITY_CHOICES, MRSCollector, MRSScorer, out_of_time, readable_symptoms,
+)
 
 class MRSFlow:
     def __init__(self):
@@ -14,91 +17,168 @@ class MRSFlow:
         self.pending_exit_confirmation = False
         self.original_question = ""
 
-    def process_input(self, user_input: str) -> Dict[str, Any]:
+    def to_dict(self) -> Dict[str, Any]:
+        """Export assessment state; only symptoms already addressed are included."""
+        records = {
+            domain: {name: record for name, record in symptoms.items() if record["is_addressed"]}
+            for domain, symptoms in self.tracker.to_dict().items()
+        }
+        return {
+            "records": {domain: symptoms for domain, symptoms in records.items() if symptoms},
+            "previous_question": self.collector.previous_question,
+            "last_asked_symptoms": self.collector.last_asked_symptoms,
+            "pending_zero_confirmation": self.pending_zero_confirmation,
+            "pending_exit_confirmation": self.pending_exit_confirmation,
+            "original_question": self.original_question,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MRSFlow":
+        flow = cls()
+        flow.tracker.from_dict(data.get("records", {}))
+        flow.collector.previous_question = data.get("previous_question", "")
+        flow.collector.last_asked_symptoms = list(data.get("last_asked_symptoms", []))
+        flow.pending_zero_confirmation = data.get("pending_zero_confirmation", False)
+        flow.pending_exit_confirmation = data.get("pending_exit_confirmation", False)
+        flow.original_question = data.get("original_question", "")
+        return flow
+
+    def process_input(self, user_input: str, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        """
+        Handle one reply. With a deadline, LLM steps that run out of time fall
+        back to fixed questions and a locally computed score.
+        """
+        step = self._pending_step(user_input)
+        if step is None:
+            step = self._collected_step(self.collector.collect(user_input, deadline), user_input)
+        return self._run(step, deadline)
+
+    async def aprocess_input(self, user_input: str, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        """Async counterpart of process_input(); LLM calls are awaited instead of blocking."""
+        step = self._pending_step(user_input)
+        if step is None:
+            step = self._collected_step(await self.collector.acollect(user_input, deadline), user_input)
+        return await self._arun(step, deadline)
+
+    # A turn is a short chain of steps: ("done", result), ("ask", ack message),
+    # ("generate", question request) or ("score", None). _run and _arun execute
+    # the LLM steps; everything else is shared.
+
+    def _run(self, step, deadline: Optional[Deadline]) -> Dict[str, Any]:
+        kind, value = step
+        if kind == "ask":
+            kind, value = self._question_step(value)
+        if kind == "generate":
+            model_out = openai_client.call_model_with_prompt(value["prompt"], cache=False,
+                                                             timeout=timeout_for(deadline))
+            return self._asked(value, model_out, deadline)
+        if kind == "score":
+            return self._scored(self.scorer.score(deadline))
+        return value
+
+    async def _arun(self, step, deadline: Optional[Deadline]) -> Dict[str, Any]:
+        kind, value = step
+        if kind == "ask":
+            kind, value = self._question_step(value)
+        if kind == "generate":
+            model_out = await openai_client.acall_model_with_prompt(value["prompt"], cache=False,
+                                                                    timeout=timeout_for(deadline))
+            return self._asked(value, model_out, deadline)
+        if kind == "score":
+            return self._scored(await self.scorer.ascore(deadline))
+        return value
+
+    def _pending_step(self, user_input: str):
+        """Step for a reply to a pending confirmation, or None if the reply needs analysis."""
         if self.pending_zero_confirmation:
-            return self._handle_zero_confirmation(user_input)
+            if user_input.strip().lower() in {"yes", "y"}:
+                self.pending_zero_confirmation = False
+                return ("score", None)
+            return ("ask", None)
         if self.pending_exit_confirmation:
-            return self._handle_exit_confirmation(user_input)
+            self.pending_exit_confirmation = False
+            response = user_input.strip().lower()
+            if response in {"yes", "y"}:
+                return ("done", self._exit_flow(self.original_question))
+            if response in {"no", "n"}:
+                message = f"Great, let's continue. {self.collector.previous_question}"
+                return ("done", {
+                    "status": "continue_assessment",
+                    "message": message.strip(),
+                    "flow": "symptom_assessment",
+                })
+            return ("ask", None)
+        return None
 
-        parsed = self.collector.collect(user_input)
+    def _collected_step(self, parsed: Dict[str, Any], user_input: str):
         scored_symptoms = parsed.get("symptoms_scored", [])
         self.tracker.update_records(self.collector.last_asked_symptoms, scored_symptoms)
         action_type = parsed.get("action_type", "")
         next_message = parsed.get("next_message", "")
 
         if action_type == "emergency_exit":
-            return self._exit_flow()
+            return ("done", self._exit_flow())
         if action_type == "exit_intent":
             self.pending_exit_confirmation = True
             self.original_question = user_input
-            return {
+            return ("done", {
                 "status": "exit_confirmation_pending",
                 "message": next_message,
                 "flow": "symptom_assessment",
-            }
+            })
         if action_type == "severity_unclear":
-            return {
+            return ("done", {
                 "status": "clarification_needed",
                 "message": next_message,
                 "flow": "symptom_assessment",
-            }
+            })
         if action_type == "severity_clear":
-            return self._ask_next_question(next_message)
-        return {
+            return ("ask", next_message)
+        return ("done", {
             "status": "error",
             "message": f"Error: {next_message}",
             "flow": "symptom_assessment",
-        }
+        })
 
-    def _handle_zero_confirmation(self, user_input: str) -> Dict[str, Any]:
-        if user_input.strip().lower() in {"yes", "y"}:
-            self.pending_zero_confirmation = False
-            return self._score_and_respond()
-        return self._ask_next_question()
-
-    def _handle_exit_confirmation(self, user_input: str) -> Dict[str, Any]:
-        self.pending_exit_confirmation = False
-        response = user_input.strip().lower()
-        if response in {"yes", "y"}:
-            return self._exit_flow(self.original_question)
-        if response in {"no", "n"}:
-            message = f"Great, let's continue. {self.collector.previous_question}"
-            return {
-                "status": "continue_assessment",
-                "message": message.strip(),
-                "flow": "symptom_assessment",
-            }
-        return self._ask_next_question()
-
-
-    def _ask_next_question(self, next_message: Optional[str] = None) -> Dict[str, Any]:
+    def _question_step(self, next_message: Optional[str]):
         if self.tracker.is_assessment_complete():
-            return self._check_zero_before_score()
+            return self._zero_check_step()
         target_symptoms, _ = self.tracker.get_bundle_question_symptoms(max_symptoms=2)
         if not target_symptoms:
-            return self._check_zero_before_score()
+            return self._zero_check_step()
         prompt_template = template_loader.load_prompt_template(
             "mrs_question_generator"
         )
         if not prompt_template:
-            return self._error("Prompt template loading failed")
+            return ("done", self._error("Prompt template loading failed"))
         prompt = format_template(prompt_template, target_symptoms=target_symptoms)
-        model_out = openai_client.call_model_with_prompt(prompt)
+        # Not cached (see _run): the same symptoms should be asked about in varied words
+        return ("generate", {"prompt": prompt, "targets": target_symptoms, "next_message": next_message or ""})
+
+    def _asked(self, request: Dict[str, Any], model_out: Optional[str],
+               deadline: Optional[Deadline]) -> Dict[str, Any]:
+        target_symptoms = request["targets"]
         if not model_out:
-            return self._error("LLM calling failed")
-        try:
-            next_question = json.loads(model_out)["next_question"]
-        except Exception:
-            return self._error("LLM output parsing failed")
+            if not out_of_time(deadline):
+                return self._error("LLM calling failed")
+            next_question = (
+                f"How much have you been bothered by {readable_symptoms(target_symptoms)} recently - "
+                f"{SEVERITY_CHOICES}?"
+            )
+        else:
+            try:
+                next_question = json.loads(model_out)["next_question"]
+            except Exception:
+                return self._error("LLM output parsing failed")
         self.collector.previous_question = next_question
         self.collector.last_asked_symptoms = target_symptoms
         return {
             "status": "asking_next_symptom",
-            "message": (next_message + " " + next_question).strip(),
+            "message": (request["next_message"] + " " + next_question).strip(),
             "flow": "symptom_assessment",
         }
 
-    def _check_zero_before_score(self) -> Dict[str, Any]:
+    def _zero_check_step(self):
         zero_symptoms = [
             s
             for d in self.tracker.records.values()
@@ -108,18 +188,17 @@ class MRSFlow:
         if zero_symptoms:
             self.pending_zero_confirmation = True
             readable = ", ".join(s.replace("_", " ") for s in zero_symptoms)
-            return {
+            return ("done", {
                 "status": "zero_confirmation_pending",
                 "message": (
                     f"Assessment completed! Before calculating your score, I assumed you don't have these symptoms: {readable}. "
                     "Is this accurate? (yes) If not, please share any updates and I’ll make adjustments."
                 ),
                 "flow": "symptom_assessment",
-            }
-        return self._score_and_respond()
+            })
+        return ("score", None)
 
-    def _score_and_respond(self) -> Dict[str, Any]:
-        score_data = self.scorer.score()
+    def _scored(self, score_data: Dict[str, Any]) -> Dict[str, Any]:
         total_score = score_data["total_score"]
         interpretation = score_data["interpretation"]
         self.__init__()
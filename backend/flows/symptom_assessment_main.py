@@ -1,11 +1,18 @@
 from .symptom_assessment_flow import MRSFlow
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+from backend.utils.deadline import Deadline
 
 # ---- 外部兼容性 ----
+# Shared single-user flow for scripts; multi-user callers pass their own per-session flow
 symptom_assessment_flow = MRSFlow()
 
-def menopause_support_enhanced(user_input: str, history=None) -> Dict[str, Any]:
-    return symptom_assessment_flow.process_input(user_input)
+def menopause_support_enhanced(user_input: str, history=None, flow: Optional[MRSFlow] = None,
+                               deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+    return (flow or symptom_assessment_flow).process_input(user_input, deadline)
+
+async def amenopause_support_enhanced(user_input: str, history=None, flow: Optional[MRSFlow] = None,
+                                      deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+    return await (flow or symptom_assessment_flow).aprocess_input(user_input, deadline)
 
 def menopause_support(user_input: str, history=None) -> str:
     result = menopause_support_enhanced(user_input, history)
@@ -1,36 +1,104 @@
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 import json
+import os
 import re
+from backend.utils.deadline import Deadline, timeout_for
 from backend.utils.template_loader import template_loader, format_template
 from backend.utils import openai_client
+from .mrs_response_parser import MRSResponseParser
 from .mrs_symptom_tracker import MRSTracker
 
+# Score clear replies ("no", "mild", "none of those") locally; set to 0 to send every reply to the LLM
+MRS_LOCAL_PARSER = os.getenv("MRS_LOCAL_PARSER", "1") != "0"
+
+_response_parser: Optional[MRSResponseParser] = None
+
+
+def get_response_parser(prompt_template: str) -> Optional[MRSResponseParser]:
+    """Parser compiled from the analyzer prompt's lexicon, shared by all flows."""
+    global _response_parser
+    if not MRS_LOCAL_PARSER:
+        return None
+    if _response_parser is None:
+        _response_parser = MRSResponseParser.from_template(prompt_template)
+    return _response_parser
+
+# Answer scale offered in fallback questions; each option is in the local parser's lexicon
+SEVERITY_CHOICES = "not at all, mild, moderate, severe or very severe"
+
+
+def readable_symptoms(symptoms: List[str]) -> str:
+    return " and ".join(s.replace("_", " ") for s in symptoms) or "these symptoms"
+
+
+def out_of_time(deadline: Optional[Deadline]) -> bool:
+    return deadline is not None and deadline.expired
+
 class MRSCollector:
     def __init__(self, tracker: MRSTracker) -> None:
         self.tracker = tracker
         self.previous_question: str = ""
         self.last_asked_symptoms: List[str] = []
 
-    def collect(self, user_input: str) -> Dict[str, Any]:
+    def collect(self, user_input: str, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        result, prompt, version = self._prepare(user_input)
+        if result is not None:
+            return result
+        model_output = openai_client.call_model_with_prompt(prompt, template_version=version,
+                                                            timeout=timeout_for(deadline))
+        return self._parse(model_output, prompt, version, deadline)
+
+    async def acollect(self, user_input: str, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        result, prompt, version = self._prepare(user_input)
+        if result is not None:
+            return result
+        model_output = await openai_client.acall_model_with_prompt(prompt, template_version=version,
+                                                                   timeout=timeout_for(deadline))
+        return self._parse(model_output, prompt, version, deadline)
+
+    def _prepare(self, user_input: str):
+        """(result, None, None) when no LLM call is needed, else (None, prompt, template version)."""
         prompt_template = template_loader.load_prompt_template(
             "mrs_response_analyzer"
         )
         if not prompt_template:
-            return self._error("Prompt template loading failed")
+            return self._error("Prompt template loading failed"), None, None
+        parser = get_response_parser(prompt_template)
+        if parser:
+            parsed = parser.parse(user_input, self.last_asked_symptoms)
+            if parsed:
+                return parsed, None, None
         prompt = format_template(
             prompt_template,
             user_input=user_input,
             previous_question=self.previous_question,
         )
-        model_output = openai_client.call_model_with_prompt(prompt)
+        return None, prompt, template_loader.template_version("mrs_response_analyzer")
+
+    def _parse(self, model_output: Optional[str], prompt: str, version: Optional[str],
+               deadline: Optional[Deadline]) -> Dict[str, Any]:
         if not model_output:
+            if out_of_time(deadline):
+                return self._clarify()
             return self._error("LLM calling failed")
         try:
             json_text = re.search(r'\{.*\}', model_output, re.DOTALL).group(0)
             return json.loads(json_text)
         except Exception:
+            openai_client.discard_cached_response(prompt, template_version=version)
             return self._error("LLM output parsing failed")
 
+    def _clarify(self) -> Dict[str, Any]:
+        """Out of time for the LLM: ask for an answer the local parser can score."""
+        if self.last_asked_symptoms:
+            message = (
+                f"Sorry, could you tell me how much {readable_symptoms(self.last_asked_symptoms)} "
+                f"has been bothering you - {SEVERITY_CHOICES}?"
+            )
+        else:
+            message = "Sorry, could you tell me which symptoms you've noticed and how much each one bothers you?"
+        return {"symptoms_scored": [], "action_type": "severity_unclear", "next_message": message}
+
     def _error(self, message: str) -> Dict[str, Any]:
         return {
             "symptom_updates": [],
@@ -43,25 +111,66 @@ class MRSScorer:
     def __init__(self, tracker: MRSTracker) -> None:
         self.tracker = tracker
 
-    def score(self) -> Dict[str, Any]:
+    def score(self, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        result, prompt, version = self._prepare()
+        if result is not None:
+            return result
+        model_output = openai_client.call_model_with_prompt(prompt, template_version=version,
+                                                            timeout=timeout_for(deadline))
+        return self._parse(model_output, prompt, version, deadline)
+
+    async def ascore(self, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        result, prompt, version = self._prepare()
+        if result is not None:
+            return result
+        model_output = await openai_client.acall_model_with_prompt(prompt, template_version=version,
+                                                                   timeout=timeout_for(deadline))
+        return self._parse(model_output, prompt, version, deadline)
+
+    def _prepare(self):
         prompt_template = template_loader.load_prompt_template(
             "mrs_score_calculator"
         )
         if not prompt_template:
-            return self._error("Prompt template loading failed")
+            return self._error("Prompt template loading failed"), None, None
         prompt = format_template(
             prompt_template,
             user_records=json.dumps(self.tracker.to_dict(), ensure_ascii=False),
         )
-        model_output = openai_client.call_model_with_prompt(prompt)
+        return None, prompt, template_loader.template_version("mrs_score_calculator")
+
+    def _parse(self, model_output: Optional[str], prompt: str, version: Optional[str],
+               deadline: Optional[Deadline]) -> Dict[str, Any]:
         if not model_output:
+            if out_of_time(deadline):
+                return self._local_score()
             return self._error("LLM calling failed")
         try:
             json_text = re.search(r'\{.*\}', model_output, re.DOTALL).group(0)
             return json.loads(json_text)
         except Exception:
+            openai_client.discard_cached_response(prompt, template_version=version)
             return self._error("LLM output parsing failed")
 
+    def _local_score(self) -> Dict[str, Any]:
+        """Out of time for the LLM: sum the scores and use the standard MRS bands."""
+        total = sum(
+            record.mrs_score or 0
+            for domain in self.tracker.records.values()
+            for record in domain.values()
+        )
+        if total <= 11:
+            band = "which suggests mild or no symptoms"
+        elif total <= 35:
+            band = "which suggests mild to moderate symptoms"
+        else:
+            band = "which suggests severe symptoms that have a major impact on daily life"
+        advice = " Talking with your doctor about support options could help." if total >= 14 else ""
+        return {
+            "total_score": total,
+            "interpretation": f"Your Menopause Rating Scale score is {total} out of 44, {band}.{advice}",
+        }
+
     def _error(self, message: str) -> Dict[str, Any]:
         return {
             "total_score": 0,
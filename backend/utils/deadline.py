@@ -0,0 +1,51 @@
+"""
+Deadline - Latency budget for one conversational turn
+
+The router starts a Deadline per turn and hands it down to every stage
+(classification, symptom flow, LLM and retrieval calls). Each stage asks for
+the time it may spend, capped by its own limit, and takes its cheaper
+fallback when nothing is left.
+"""
+import math
+import time
+from typing import Optional
+
+
+class Deadline:
+    """A point in time after which the turn should stop waiting on upstreams."""
+
+    def __init__(self, seconds: Optional[float] = None):
+        self.seconds = seconds
+        self.started = time.monotonic()
+        self.expires_at = self.started + seconds if seconds else None
+
+    def remaining(self) -> float:
+        if self.expires_at is None:
+            return math.inf
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def timeout(self, cap: Optional[float] = None, reserve: float = 0.0) -> Optional[float]:
+        """
+        Seconds a call may take: what is left after keeping `reserve` for later
+        stages, capped at `cap`. None means no limit; 0 means skip the call.
+        """
+        remaining = self.remaining()
+        if remaining != math.inf:
+            remaining = max(0.0, remaining - reserve)
+        if cap is not None:
+            remaining = min(remaining, cap)
+        return None if remaining == math.inf else remaining
+
+
+def timeout_for(deadline: Optional[Deadline], cap: Optional[float] = None, reserve: float = 0.0) -> Optional[float]:
+    """Deadline.timeout() that also accepts no deadline at all."""
+    if deadline is None:
+        return cap
+    return deadline.timeout(cap, reserve)
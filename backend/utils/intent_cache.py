@@ -0,0 +1,38 @@
+"""
+Intent Cache - Remembers LLM intent labels for repeated messages
+
+Keys are normalized message text, so "What is menopause?" and "what is
+menopause" share an entry. Entries are tagged with the classifier version
+(a hash of the prompt and model); entries from another version are ignored
+and purged, so editing the prompt invalidates the cache.
+
+An optional SQLite tier keeps labels across restarts and worker processes.
+"""
+from typing import Any, Dict, Optional
+
+from backend.utils.intent_model import normalize_message
+from backend.utils.lru_cache import PersistentTTLCache
+
+
+class IntentCache(PersistentTTLCache):
+    """
+    Bounded LRU/TTL cache of intent labels, optionally backed by SQLite at path.
+    """
+
+    def __init__(self, version: str, max_entries: int = 2048, ttl_seconds: Optional[float] = 86400,
+                 path: Optional[str] = None):
+        super().__init__("intent_cache", max_entries, ttl_seconds, path, version)
+        if self.purged:
+            print(f"🧹 Dropped {self.purged} stale intent cache entries (older classifier prompt or expired)")
+
+    def get(self, text: str) -> Optional[str]:
+        key = normalize_message(text)
+        return super().get(key) if key else None
+
+    def set(self, text: str, label: str):
+        key = normalize_message(text)
+        if key:
+            super().set(key, label)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"version": self.version, **super().get_stats()}
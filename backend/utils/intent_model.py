@@ -0,0 +1,139 @@
+"""
+Intent Model - Small local intent classifier (multinomial naive Bayes)
+
+Trained from seed examples (backend/prompts/intent_examples.yaml) plus labels
+logged from earlier LLM classifications. Prediction is a handful of dict
+lookups, so confident messages can be routed without calling the LLM.
+"""
+import json
+import math
+import os
+import re
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import yaml
+
+_TOKEN = re.compile(r"[a-z0-9']+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased words plus adjacent word pairs."""
+    words = _TOKEN.findall(text.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def normalize_message(text: str) -> str:
+    """Lower-cased words joined by single spaces; punctuation and spacing are ignored."""
+    return " ".join(_TOKEN.findall((text or "").lower()))
+
+
+class LocalIntentModel:
+    """
+    Multinomial naive Bayes over unigrams and bigrams with Laplace smoothing.
+
+    predict() returns the best label and its posterior probability; callers
+    decide how confident is confident enough. learn() adds one example
+    incrementally, so labels from the LLM improve the model as they arrive.
+    """
+
+    def __init__(self, alpha: float = 1.0):
+        self.alpha = alpha
+        self.doc_counts: Dict[str, int] = defaultdict(int)
+        self.token_counts: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.token_totals: Dict[str, int] = defaultdict(int)
+        self.vocabulary = set()
+        self._lock = threading.Lock()
+
+    @property
+    def labels(self) -> List[str]:
+        return list(self.doc_counts)
+
+    def learn(self, text: str, label: str):
+        tokens = tokenize(text)
+        with self._lock:
+            self.doc_counts[label] += 1
+            counts = self.token_counts[label]
+            for token in tokens:
+                counts[token] += 1
+                self.vocabulary.add(token)
+            self.token_totals[label] += len(tokens)
+
+    def train(self, examples: Iterable[Tuple[str, str]]):
+        for text, label in examples:
+            self.learn(text, label)
+
+    def predict(self, text: str) -> Tuple[Optional[str], float]:
+        """Best label and its posterior probability; (None, 0.0) before any training."""
+        if not self.doc_counts:
+            return None, 0.0
+        tokens = [token for token in tokenize(text) if token in self.vocabulary]
+        if not tokens:
+            return None, 0.0
+        total_docs = sum(self.doc_counts.values())
+        vocab_size = len(self.vocabulary)
+        scores = {}
+        for label, docs in self.doc_counts.items():
+            counts = self.token_counts[label]
+            denominator = self.token_totals[label] + self.alpha * vocab_size
+            score = math.log(docs / total_docs)
+            for token in tokens:
+                score += math.log((counts.get(token, 0) + self.alpha) / denominator)
+            scores[label] = score
+        best = max(scores, key=scores.get)
+        top = scores[best]
+        normalizer = sum(math.exp(score - top) for score in scores.values())
+        return best, 1.0 / normalizer
+
+
+def load_seed_examples(path: str) -> List[Tuple[str, str]]:
+    """Read {"intent_examples": {LABEL: [text, ...]}} from a YAML file."""
+    if not os.path.exists(path):
+        print(f"⚠️ Intent examples not found: {path}")
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f) or {}
+    return [
+        (text, label)
+        for label, texts in (data.get("intent_examples") or {}).items()
+        for text in texts or []
+    ]
+
+
+def load_logged_labels(path: str) -> List[Tuple[str, str]]:
+    """Read labels appended by log_label() (and its rotated file); lines that fail to parse are skipped."""
+    examples = []
+    if not path:
+        return examples
+    for log_path in (path + ".1", path):
+        if not os.path.exists(log_path):
+            continue
+        with open(log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    examples.append((record["text"], record["label"]))
+                except (ValueError, KeyError):
+                    continue
+    return examples
+
+
+def log_label(path: str, text: str, label: str, max_bytes: int = 1 << 20):
+    """
+    Append one labelled example for future training. A file past max_bytes is
+    rotated to path + ".1" (replacing the previous one), so at most about
+    2 * max_bytes of messages are kept on disk.
+    """
+    if not path:
+        return
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    try:
+        if max_bytes and os.path.getsize(path) >= max_bytes:
+            os.replace(path, path + ".1")
+    except OSError:
+        pass
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"text": text, "label": label}, ensure_ascii=False) + "\n")
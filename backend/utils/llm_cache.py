@@ -0,0 +1,29 @@
+"""
+LLM Cache - Prompt-level cache of model responses
+
+Keys are a hash of everything that shapes the answer: model, sampling
+parameters, template version and the rendered prompt. Lookups go to a
+bounded in-memory LRU first, then to an optional SQLite file that survives
+restarts (development replays and tests reuse earlier responses).
+"""
+import hashlib
+import json
+from typing import Any, Dict, Optional
+
+from backend.utils.lru_cache import PersistentTTLCache
+
+
+def response_key(model: str, params: Dict[str, Any], prompt: str, template_version: Optional[str] = None) -> str:
+    """Stable cache key for one model call."""
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    material = json.dumps([model, params, template_version, prompt_hash], sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache(PersistentTTLCache):
+    """In-memory LRU/TTL tier in front of an optional SQLite tier at path."""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: Optional[float] = 604800,
+                 path: Optional[str] = None):
+        # The template version is part of every key, so rows need no version tag of their own
+        super().__init__("llm_responses", max_entries, ttl_seconds, path)
@@ -0,0 +1,503 @@
+"""
+LLM Gateway - One entry point for every model call (OpenAI, Gemini, fake)
+
+Each provider keeps long-lived clients, so HTTP keep-alive connections are
+pooled and reused instead of set up per call. Calls go through a
+per-provider concurrency limit and a per-call deadline (LLM_TIMEOUT by
+default); a call that cannot finish in time raises LLMTimeout.
+
+Sync and async entry points share the same limits:
+
+    from backend.utils.llm_gateway import gateway
+    text = gateway.complete("openai", prompt, model="gpt-4.1-mini", temperature=0.7)
+    text = await gateway.acomplete("gemini", prompt, model="gemini-2.0-flash")
+    for chunk in gateway.stream("gemini", prompt, model="gemini-2.0-flash"): ...
+
+LLM_PROVIDER=fake sends every call to the offline fake provider.
+"""
+import asyncio
+import hashlib
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional, Union
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+LLM_POOL_CONNECTIONS = int(os.getenv("LLM_POOL_CONNECTIONS", "20"))
+LLM_OPENAI_CONCURRENCY = int(os.getenv("LLM_OPENAI_CONCURRENCY", "8"))
+LLM_GEMINI_CONCURRENCY = int(os.getenv("LLM_GEMINI_CONCURRENCY", "8"))
+# "fake" routes every call to FakeProvider (offline development and tests)
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "")
+
+
+class LLMError(RuntimeError):
+    """Raised when a model call fails."""
+
+
+class LLMTimeout(LLMError):
+    """Raised when a model call does not finish before its deadline."""
+
+
+class Provider:
+    """
+    Model backend. Subclasses implement complete() and acomplete(); streaming
+    defaults to a single chunk holding the whole answer.
+    """
+
+    name = "provider"
+
+    def available(self) -> bool:
+        return True
+
+    def complete(self, prompt: str, model: str, timeout: float, **params) -> str:
+        raise NotImplementedError
+
+    async def acomplete(self, prompt: str, model: str, timeout: float, **params) -> str:
+        raise NotImplementedError
+
+    def stream(self, prompt: str, model: str, timeout: float, **params) -> Iterator[str]:
+        yield self.complete(prompt, model, timeout, **params)
+
+    async def astream(self, prompt: str, model: str, timeout: float, **params) -> AsyncIterator[str]:
+        yield await self.acomplete(prompt, model, timeout, **params)
+
+    async def aclose(self):
+        """Release connections owned by the running event loop."""
+
+
+class OpenAIProvider(Provider):
+    """OpenAI chat completions over pooled httpx clients (openai>=1.0)."""
+
+    name = "openai"
+
+    def __init__(self, max_connections: int = LLM_POOL_CONNECTIONS):
+        self.max_connections = max_connections
+        self._client = None
+        # One async client per event loop; dropped when the loop is garbage collected
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        return bool(os.getenv("OPENAI_API_KEY"))
+
+    def _limits(self):
+        import httpx
+        return httpx.Limits(max_connections=self.max_connections,
+                            max_keepalive_connections=self.max_connections)
+
+    def _sync_client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import httpx
+                    import openai
+                    self._client = openai.OpenAI(http_client=httpx.Client(limits=self._limits()), max_retries=0)
+        return self._client
+
+    def _loop_client(self):
+        # httpx async connections belong to the event loop that opened them
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            import httpx
+            import openai
+            client = openai.AsyncOpenAI(http_client=httpx.AsyncClient(limits=self._limits()), max_retries=0)
+            self._async_clients[loop] = client
+        return client
+
+    async def aclose(self):
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.close()
+
+    @staticmethod
+    def _messages(prompt: str):
+        return [{"role": "user", "content": prompt}]
+
+    def complete(self, prompt: str, model: str, timeout: float, **params) -> str:
+        response = self._sync_client().chat.completions.create(
+            model=model, messages=self._messages(prompt), timeout=timeout, **params
+        )
+        return response.choices[0].message.content or ""
+
+    async def acomplete(self, prompt: str, model: str, timeout: float, **params) -> str:
+        response = await self._loop_client().chat.completions.create(
+            model=model, messages=self._messages(prompt), timeout=timeout, **params
+        )
+        return response.choices[0].message.content or ""
+
+    def stream(self, prompt: str, model: str, timeout: float, **params) -> Iterator[str]:
+        chunks = self._sync_client().chat.completions.create(
+            model=model, messages=self._messages(prompt), timeout=timeout, stream=True, **params
+        )
+        for chunk in chunks:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def astream(self, prompt: str, model: str, timeout: float, **params) -> AsyncIterator[str]:
+        chunks = await self._loop_client().chat.completions.create(
+            model=model, messages=self._messages(prompt), timeout=timeout, stream=True, **params
+        )
+        async for chunk in chunks:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+class GeminiProvider(Provider):
+    """Gemini through google-generativeai; one model object (and channel) per model name."""
+
+    name = "gemini"
+
+    _CONFIG_KEYS = {"temperature": "temperature", "max_tokens": "max_output_tokens",
+                    "top_p": "top_p", "top_k": "top_k"}
+
+    def __init__(self):
+        self._models: Dict[str, Any] = {}
+        self._configured = False
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        if not os.getenv("GOOGLE_API_KEY"):
+            return False
+        try:
+            import google.generativeai  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def _model(self, model: str):
+        cached = self._models.get(model)
+        if cached is not None:
+            return cached
+        with self._lock:
+            import google.generativeai as genai
+            if not self._configured:
+                genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+                self._configured = True
+            return self._models.setdefault(model, genai.GenerativeModel(model))
+
+    def _generation_config(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return {self._CONFIG_KEYS[k]: v for k, v in params.items() if k in self._CONFIG_KEYS}
+
+    def complete(self, prompt: str, model: str, timeout: float, **params) -> str:
+        response = self._model(model).generate_content(
+            prompt, generation_config=self._generation_config(params), request_options={"timeout": timeout}
+        )
+        return response.text
+
+    async def acomplete(self, prompt: str, model: str, timeout: float, **params) -> str:
+        response = await self._model(model).generate_content_async(
+            prompt, generation_config=self._generation_config(params), request_options={"timeout": timeout}
+        )
+        return response.text
+
+    def stream(self, prompt: str, model: str, timeout: float, **params) -> Iterator[str]:
+        response = self._model(model).generate_content(
+            prompt, generation_config=self._generation_config(params),
+            request_options={"timeout": timeout}, stream=True,
+        )
+        for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+    async def astream(self, prompt: str, model: str, timeout: float, **params) -> AsyncIterator[str]:
+        response = await self._model(model).generate_content_async(
+            prompt, generation_config=self._generation_config(params),
+            request_options={"timeout": timeout}, stream=True,
+        )
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+
+class FakeProvider(Provider):
+    """
+    Offline provider. reply may be a fixed string or a callable(prompt, model);
+    by default the answer names the model and a hash of the prompt, so it is
+    deterministic. latency adds a fixed delay per call.
+    """
+
+    name = "fake"
+
+    def __init__(self, reply: Union[None, str, Callable[[str, str], str]] = None, latency: float = 0.0):
+        self.reply = reply
+        self.latency = latency
+        self.prompts = []
+
+    def _answer(self, prompt: str, model: str) -> str:
+        self.prompts.append(prompt)
+        if callable(self.reply):
+            return self.reply(prompt, model)
+        if self.reply is not None:
+            return self.reply
+        return f"[fake {model}] {hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:12]}"
+
+    def complete(self, prompt: str, model: str, timeout: float, **params) -> str:
+        if self.latency:
+            time.sleep(min(self.latency, timeout))
+            if self.latency > timeout:
+                raise TimeoutError("fake provider timed out")
+        return self._answer(prompt, model)
+
+    async def acomplete(self, prompt: str, model: str, timeout: float, **params) -> str:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._answer(prompt, model)
+
+    def stream(self, prompt: str, model: str, timeout: float, **params) -> Iterator[str]:
+        for word in self.complete(prompt, model, timeout, **params).split(" "):
+            yield word + " "
+
+    async def astream(self, prompt: str, model: str, timeout: float, **params) -> AsyncIterator[str]:
+        for word in (await self.acomplete(prompt, model, timeout, **params)).split(" "):
+            yield word + " "
+
+
+class _Limiter:
+    """
+    Concurrency limit shared by threads and event loops.
+
+    Threads wait on a condition; coroutines wait on an asyncio.Event of their
+    own loop, so no thread is held while waiting. A permit is only ever taken
+    synchronously (never across an await), so a waiter that is cancelled or
+    times out owns nothing; a woken waiter that gives up passes the wake-up on.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._active = 0
+        self._cond = threading.Condition()
+        self._async_waiters = deque()  # (loop, event), first come first woken
+
+    def acquire(self, deadline: float) -> bool:
+        with self._cond:
+            while self._active >= self.limit:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            self._active += 1
+            return True
+
+    async def aacquire(self, deadline: float) -> bool:
+        loop = asyncio.get_running_loop()
+        while True:
+            waiter = (loop, asyncio.Event())
+            with self._cond:
+                if self._active < self.limit:
+                    self._active += 1
+                    return True
+                self._async_waiters.append(waiter)
+            retry = False
+            try:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), remaining)
+                except asyncio.TimeoutError:
+                    return False
+                retry = True
+            finally:
+                with self._cond:
+                    woken = waiter not in self._async_waiters
+                    if not woken:
+                        self._async_waiters.remove(waiter)
+                if woken and not retry:
+                    # Timed out or cancelled after being woken; pass the wake-up on
+                    self._wake_async()
+
+    def release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify()
+        self._wake_async()
+
+    def _wake_async(self):
+        while True:
+            with self._cond:
+                if not self._async_waiters:
+                    return
+                loop, event = self._async_waiters.popleft()
+            try:
+                loop.call_soon_threadsafe(event.set)
+                return
+            except RuntimeError:
+                # That waiter's loop is closed; wake the next one
+                continue
+
+
+class _Slot:
+    """Per-provider concurrency limit and counters."""
+
+    def __init__(self, provider: Provider, max_concurrency: int):
+        self.provider = provider
+        self.max_concurrency = max(1, max_concurrency)
+        self.limiter = _Limiter(self.max_concurrency)
+        self.stats = {"calls": 0, "errors": 0, "timeouts": 0, "in_flight": 0, "seconds": 0.0}
+        self.lock = threading.Lock()
+
+    def record(self, key: str, amount: float = 1):
+        with self.lock:
+            self.stats[key] += amount
+
+
+class LLMGateway:
+    """
+    Routes model calls to registered providers with a shared concurrency
+    limit per provider (for sync and async callers alike) and a deadline
+    per call.
+    """
+
+    def __init__(self, timeout: float = LLM_TIMEOUT, override: str = ""):
+        self.timeout = timeout
+        self.override = override
+        self._slots: Dict[str, _Slot] = {}
+
+    def register(self, name: str, provider: Provider, max_concurrency: int = 8):
+        self._slots[name] = _Slot(provider, max_concurrency)
+
+    @classmethod
+    def from_env(cls) -> "LLMGateway":
+        gateway = cls(override=LLM_PROVIDER)
+        gateway.register("openai", OpenAIProvider(), LLM_OPENAI_CONCURRENCY)
+        gateway.register("gemini", GeminiProvider(), LLM_GEMINI_CONCURRENCY)
+        gateway.register("fake", FakeProvider(), LLM_POOL_CONNECTIONS)
+        return gateway
+
+    def _slot(self, provider: str) -> _Slot:
+        name = self.override or provider
+        if name not in self._slots:
+            raise LLMError(f"Unknown LLM provider: {name}")
+        return self._slots[name]
+
+    def available(self, provider: str) -> bool:
+        return self._slot(provider).provider.available()
+
+    def _deadline(self, timeout: Optional[float]) -> float:
+        return time.monotonic() + (self.timeout if timeout is None else timeout)
+
+    @staticmethod
+    def _remaining(deadline: float) -> float:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise LLMTimeout("LLM call deadline expired")
+        return remaining
+
+    def _acquire(self, slot: _Slot, deadline: float):
+        self._remaining(deadline)
+        if not slot.limiter.acquire(deadline):
+            slot.record("timeouts")
+            raise LLMTimeout(f"No free {slot.provider.name} slot before the deadline")
+        slot.record("in_flight")
+
+    async def _aacquire(self, slot: _Slot, deadline: float):
+        # Returns holding the permit without another await, so callers' finally always releases it
+        self._remaining(deadline)
+        if not await slot.limiter.aacquire(deadline):
+            slot.record("timeouts")
+            raise LLMTimeout(f"No free {slot.provider.name} slot before the deadline")
+        slot.record("in_flight")
+
+    @staticmethod
+    def _release(slot: _Slot, started: float):
+        slot.record("in_flight", -1)
+        slot.record("seconds", time.monotonic() - started)
+        slot.limiter.release()
+
+    def _failure(self, slot: _Slot, error: Exception) -> LLMError:
+        if isinstance(error, LLMError):
+            return error
+        if isinstance(error, (TimeoutError, asyncio.TimeoutError)) or "timeout" in type(error).__name__.lower():
+            slot.record("timeouts")
+            return LLMTimeout(f"{slot.provider.name} call timed out: {error}")
+        slot.record("errors")
+        return LLMError(f"{slot.provider.name} call failed: {error}")
+
+    def complete(self, provider: str, prompt: str, model: str, timeout: Optional[float] = None, **params) -> str:
+        """Blocking call; raises LLMTimeout or LLMError."""
+        slot = self._slot(provider)
+        deadline = self._deadline(timeout)
+        self._acquire(slot, deadline)
+        started = time.monotonic()
+        slot.record("calls")
+        try:
+            return slot.provider.complete(prompt, model, self._remaining(deadline), **params)
+        except Exception as e:
+            raise self._failure(slot, e) from e
+        finally:
+            self._release(slot, started)
+
+    async def acomplete(self, provider: str, prompt: str, model: str, timeout: Optional[float] = None,
+                        **params) -> str:
+        """Async call; raises LLMTimeout or LLMError."""
+        slot = self._slot(provider)
+        deadline = self._deadline(timeout)
+        await self._aacquire(slot, deadline)
+        started = time.monotonic()
+        slot.record("calls")
+        try:
+            remaining = self._remaining(deadline)
+            return await asyncio.wait_for(slot.provider.acomplete(prompt, model, remaining, **params), remaining)
+        except Exception as e:
+            raise self._failure(slot, e) from e
+        finally:
+            self._release(slot, started)
+
+    def stream(self, provider: str, prompt: str, model: str, timeout: Optional[float] = None,
+               **params) -> Iterator[str]:
+        """Yield the answer in chunks; the slot is held until the stream ends."""
+        slot = self._slot(provider)
+        deadline = self._deadline(timeout)
+        self._acquire(slot, deadline)
+        started = time.monotonic()
+        slot.record("calls")
+        try:
+            for chunk in slot.provider.stream(prompt, model, self._remaining(deadline), **params):
+                yield chunk
+                self._remaining(deadline)
+        except Exception as e:
+            raise self._failure(slot, e) from e
+        finally:
+            self._release(slot, started)
+
+    async def astream(self, provider: str, prompt: str, model: str, timeout: Optional[float] = None,
+                      **params) -> AsyncIterator[str]:
+        """Async counterpart of stream()."""
+        slot = self._slot(provider)
+        deadline = self._deadline(timeout)
+        await self._aacquire(slot, deadline)
+        started = time.monotonic()
+        slot.record("calls")
+        try:
+            chunks = slot.provider.astream(prompt, model, self._remaining(deadline), **params).__aiter__()
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), self._remaining(deadline))
+                except StopAsyncIteration:
+                    break
+                yield chunk
+        except Exception as e:
+            raise self._failure(slot, e) from e
+        finally:
+            self._release(slot, started)
+
+    async def aclose(self):
+        """Close the providers' connections for the running event loop."""
+        for slot in self._slots.values():
+            await slot.provider.aclose()
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            name: {**slot.stats, "max_concurrency": slot.max_concurrency}
+            for name, slot in self._slots.items()
+        }
+
+
+gateway = LLMGateway.from_env()
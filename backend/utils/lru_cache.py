@@ -0,0 +1,174 @@
+"""
+LRU Cache Module - Small thread-safe LRU cache with per-entry TTL
+
+PersistentTTLCache puts one in front of an optional SQLite table, for caches
+that should survive restarts and be shared by worker processes.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Bounded in-process cache: least recently used entries are dropped once
+    max_entries is reached, and entries older than ttl_seconds are treated as
+    missing. A ttl of 0 or None keeps entries until they are evicted.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: Optional[float] = 3600):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, stored_at = entry
+                if not self.ttl_seconds or time.monotonic() - stored_at < self.ttl_seconds:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+            return default if entry is _MISSING else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get_stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+class PersistentTTLCache:
+    """
+    TTLCache of string values in front of an optional SQLite table at path.
+
+    Rows are tagged with version: rows written under another version are
+    deleted when the table is opened (and never returned), so bumping the
+    version invalidates everything cached before. Expired rows are purged on
+    open as well; `purged` counts the rows removed then.
+    """
+
+    COLUMNS = ["key", "value", "version", "created_at"]
+
+    def __init__(self, table: str, max_entries: int = 1024, ttl_seconds: Optional[float] = 3600,
+                 path: Optional[str] = None, version: str = ""):
+        self.table = table
+        self.version = version
+        self.ttl_seconds = ttl_seconds
+        self.path = path or None
+        self.persistent_hits = 0
+        self.purged = 0
+        self._memory = TTLCache(max_entries, ttl_seconds)
+        self._lock = threading.Lock()
+        self._conn = None
+        if self.path:
+            self._open()
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        columns = [row[1] for row in self._conn.execute(f"PRAGMA table_info({self.table})")]
+        if columns and columns != self.COLUMNS:
+            # Written by an older layout; it is only a cache, so start over
+            self._conn.execute(f"DROP TABLE {self.table}")
+        self._conn.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {self.table} (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                version TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        cutoff = time.time() - self.ttl_seconds if self.ttl_seconds else 0.0
+        self.purged = self._conn.execute(
+            f"DELETE FROM {self.table} WHERE version != ? OR created_at <= ?", (self.version, cutoff)
+        ).rowcount
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._memory.get(key)
+        if value is not None or self._conn is None:
+            return value
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, created_at FROM {self.table} WHERE key = ? AND version = ?", (key, self.version)
+            ).fetchone()
+        if row is None or (self.ttl_seconds and time.time() - row[1] >= self.ttl_seconds):
+            return None
+        self.persistent_hits += 1
+        self._memory.set(key, row[0])
+        return row[0]
+
+    def set(self, key: str, value: str):
+        self._memory.set(key, value)
+        if self._conn is None:
+            return
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, version, created_at) VALUES (?, ?, ?, ?)",
+                (key, value, self.version, time.time()),
+            )
+            self._conn.commit()
+
+    def delete(self, key: str):
+        self._memory.pop(key)
+        if self._conn is None:
+            return
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self):
+        self._memory.clear()
+        if self._conn is not None:
+            with self._lock:
+                self._conn.execute(f"DELETE FROM {self.table}")
+                self._conn.commit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "persistent": self._conn is not None,
+            "persistent_hits": self.persistent_hits,
+            **self._memory.get_stats(),
+        }
@@ -1,24 +1,83 @@
 """
 OpenAI Client Module
+
+Calls go through the shared LLM gateway (pooled connections, concurrency
+limit, deadline). Responses are cached per prompt (see llm_cache); pass
+cache=False where a prompt should produce a fresh, varied answer every time.
 """
 import os
-import openai
-from typing import Optional
+from typing import Any, Dict, Optional
 from dotenv import load_dotenv
 
+from backend.utils.llm_cache import LLMResponseCache, response_key
+from backend.utils.llm_gateway import LLMError, gateway
+
 load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY") or "your-api-key-here"
 
-def call_model_with_prompt(prompt: str) -> Optional[str]:
+MODEL = "gpt-4.1-mini"
+PARAMS = {"temperature": 0.7, "presence_penalty": 0.5, "max_tokens": 600}
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE", "1") != "0"
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "1024"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "604800"))
+# Memory only by default: responses include users' symptom answers. Set a file path
+# (e.g. ./llm_cache/responses.sqlite3) to keep them across restarts, for development replays
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "")
+
+response_cache = LLMResponseCache(LLM_CACHE_SIZE, LLM_CACHE_TTL, LLM_CACHE_PATH) if LLM_CACHE_ENABLED else None
+
+
+def _cache_key(prompt: str, cache: bool, template_version: Optional[str]) -> Optional[str]:
+    if cache and response_cache is not None:
+        return response_key(MODEL, PARAMS, prompt, template_version)
+    return None
+
+
+def call_model_with_prompt(prompt: str, cache: bool = True, template_version: Optional[str] = None,
+                           timeout: Optional[float] = None) -> Optional[str]:
+    """Model response, or None if the call failed or did not finish within timeout seconds."""
+    key = _cache_key(prompt, cache, template_version)
+    if key:
+        cached = response_cache.get(key)
+        if cached is not None:
+            return cached
+    if timeout is not None and timeout <= 0:
+        return None
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-4.1-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
-            presence_penalty=0.5,
-            max_tokens=600
-        )
-        return response.choices[0].message.content
-    except Exception as e:
+        content = gateway.complete("openai", prompt, model=MODEL, timeout=timeout, **PARAMS)
+    except LLMError as e:
         print(f"Error calling OpenAI model: {e}")
-        return None
\ No newline at end of file
+        return None
+    if key and content:
+        response_cache.set(key, content)
+    return content
+
+
+async def acall_model_with_prompt(prompt: str, cache: bool = True, template_version: Optional[str] = None,
+                                  timeout: Optional[float] = None) -> Optional[str]:
+    """Async counterpart of call_model_with_prompt()."""
+    key = _cache_key(prompt, cache, template_version)
+    if key:
+        cached = response_cache.get(key)
+        if cached is not None:
+            return cached
+    if timeout is not None and timeout <= 0:
+        return None
+    try:
+        content = await gateway.acomplete("openai", prompt, model=MODEL, timeout=timeout, **PARAMS)
+    except LLMError as e:
+        print(f"Error calling OpenAI model: {e}")
+        return None
+    if key and content:
+        response_cache.set(key, content)
+    return content
+
+
+def discard_cached_response(prompt: str, template_version: Optional[str] = None):
+    """Drop a cached response the caller could not use (e.g. it failed to parse)."""
+    if response_cache is not None:
+        response_cache.delete(response_key(MODEL, PARAMS, prompt, template_version))
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    return response_cache.get_stats() if response_cache is not None else {"enabled": False}
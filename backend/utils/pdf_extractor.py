@@ -0,0 +1,129 @@
+"""
+PDF Extraction Module - Shared by the MySQL ingest script and the local RAG source
+
+Text is handled page by page: pages are joined with PAGE_BREAK when stored
+in pdf_documents and split back apart when streamed into the RAG index, so
+chunks keep the page they came from.
+"""
+import hashlib
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# make sure we get the real PyMuPDF
+try:
+    import fitz  # this should be PyMuPDF
+    if not hasattr(fitz, "open"):
+        raise ImportError
+except ImportError:
+    # fallback if something shadows it
+    import pymupdf as fitz  # PyMuPDF
+
+DEFAULT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", "0")) or (os.cpu_count() or 1)
+PAGE_BREAK = "\f"
+
+
+def file_hash(file_path: str) -> str:
+    """SHA-256 of the file bytes, read in blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _metadata_from_doc(doc) -> Dict[str, Any]:
+    metadata = doc.metadata or {}
+
+    raw_date = metadata.get("creationDate")  # e.g. "D:20241109..."
+    year = None
+    if raw_date and len(raw_date) >= 6:
+        # D:YYYY...
+        year_part = raw_date[2:6]
+        if year_part.isdigit():
+            year = int(year_part)
+
+    return {
+        "title": metadata.get("title", "") or "",
+        "authors": metadata.get("author", "") or "",
+        "year": year,
+        "journal": metadata.get("subject", "") or "",
+        "doi": metadata.get("keywords", "") or ""
+    }
+
+
+def iter_pdf_pages(file_path: str) -> Iterator[Tuple[int, str]]:
+    """Yield (page_number, text) one page at a time, starting at page 1."""
+    with fitz.open(file_path) as doc:
+        for index, page in enumerate(doc):
+            yield index + 1, page.get_text()
+
+
+def split_pages(content: str) -> Iterator[Tuple[int, str]]:
+    """Yield (page_number, text) from content stored with PAGE_BREAK separators."""
+    start = 0
+    page_number = 1
+    while True:
+        end = content.find(PAGE_BREAK, start)
+        if end == -1:
+            yield page_number, content[start:]
+            return
+        yield page_number, content[start:end]
+        start = end + len(PAGE_BREAK)
+        page_number += 1
+
+
+def extract_pdf(file_path: str) -> Optional[Dict[str, Any]]:
+    """
+    Extract page texts and metadata with a single open of the PDF.
+
+    Returns:
+        Dict with file_name, file_path, pages (list of page texts) and metadata,
+        or None if the file could not be read
+    """
+    try:
+        with fitz.open(file_path) as doc:
+            pages: List[str] = [page.get_text() for page in doc]
+            meta = _metadata_from_doc(doc)
+        return {
+            "file_name": os.path.basename(file_path),
+            "file_path": file_path,
+            "pages": pages,
+            "metadata": meta,
+        }
+    except Exception as e:
+        print(f"Error extracting text from {file_path}: {e}")
+        return None
+
+
+def extract_pdfs_parallel(file_paths: Iterable[str], max_workers: int = DEFAULT_WORKERS) -> Iterator[Dict[str, Any]]:
+    """
+    Extract many PDFs across a process pool, yielding results in input order.
+
+    At most 2 * max_workers files are in flight, so a slow consumer never lets
+    extracted text pile up beyond that. Unreadable files are skipped. A single
+    file is extracted in-process to avoid paying the pool start-up cost.
+    """
+    file_paths = list(file_paths)
+    if len(file_paths) <= 1 or max_workers == 1:
+        for path in file_paths:
+            result = extract_pdf(path)
+            if result:
+                yield result
+        return
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        in_flight = deque()
+        paths = iter(file_paths)
+        for path in paths:
+            in_flight.append(pool.submit(extract_pdf, path))
+            if len(in_flight) >= 2 * max_workers:
+                break
+        while in_flight:
+            result = in_flight.popleft().result()
+            next_path = next(paths, None)
+            if next_path is not None:
+                in_flight.append(pool.submit(extract_pdf, next_path))
+            if result:
+                yield result
@@ -0,0 +1,105 @@
+"""
+Streaming Module - Response text that is produced incrementally
+"""
+import inspect
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Iterable, Iterator, List, Union
+
+Part = Union[str, Iterable[str], AsyncIterable[str]]
+
+
+class StreamedResponse:
+    """
+    A chat response made of fixed text and token streams, consumed lazily.
+
+    Iterating yields chunks as they are produced (nothing is generated until
+    then); str() drains whatever is left and returns the full text. Callbacks
+    registered with on_complete receive the full text once the stream ends.
+
+    Parts may also be async iterables; such responses are consumed with
+    `async for` or `await aread()` instead, and their on_complete callbacks
+    may be coroutine functions (register them before consuming the stream).
+    """
+
+    def __init__(self, *parts: Part):
+        self.parts: List[Part] = [part for part in parts if part]
+        self._chunks: List[str] = []
+        self._callbacks: List[Callable[[str], Any]] = []
+        self._started = False
+        self.done = False
+
+    def on_complete(self, callback: Callable[[str], Any]):
+        if self.done:
+            callback(self.text)
+        else:
+            self._callbacks.append(callback)
+
+    @property
+    def text(self) -> str:
+        """Text produced so far."""
+        return "".join(self._chunks)
+
+    @property
+    def is_async(self) -> bool:
+        return any(hasattr(part, "__aiter__") for part in self.parts)
+
+    def _start(self):
+        if self._started:
+            raise RuntimeError("StreamedResponse can only be iterated once")
+        self._started = True
+
+    def _finish(self):
+        self.done = True
+        for callback in self._callbacks:
+            callback(self.text)
+
+    async def _afinish(self):
+        self.done = True
+        for callback in self._callbacks:
+            result = callback(self.text)
+            if inspect.isawaitable(result):
+                await result
+
+    def __iter__(self) -> Iterator[str]:
+        if self.is_async:
+            raise TypeError("StreamedResponse has async parts; use `async for` or aread()")
+        self._start()
+        for part in self.parts:
+            for chunk in ([part] if isinstance(part, str) else part):
+                if chunk:
+                    self._chunks.append(chunk)
+                    yield chunk
+        self._finish()
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        self._start()
+        for part in self.parts:
+            if hasattr(part, "__aiter__"):
+                async for chunk in part:
+                    if chunk:
+                        self._chunks.append(chunk)
+                        yield chunk
+            else:
+                for chunk in ([part] if isinstance(part, str) else part):
+                    if chunk:
+                        self._chunks.append(chunk)
+                        yield chunk
+        await self._afinish()
+
+    async def aread(self) -> str:
+        """Async counterpart of str(): drain what is left and return the full text."""
+        if not self._started:
+            async for _ in self:
+                pass
+        return self.text
+
+    def __str__(self) -> str:
+        if not self._started:
+            for _ in self:
+                pass
+        return self.text
+
+    def __add__(self, other: Union[str, "StreamedResponse"]) -> "StreamedResponse":
+        return StreamedResponse(*self.parts, *(other.parts if isinstance(other, StreamedResponse) else [other]))
+
+    def __radd__(self, other: str) -> "StreamedResponse":
+        return StreamedResponse(other, *self.parts)
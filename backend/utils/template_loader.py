@@ -4,6 +4,7 @@ Template and System Message Loader
 import os
 import yaml
 import json
+import hashlib
 from typing import Optional
 
 class TemplateLoader:
@@ -36,6 +37,13 @@ class TemplateLoader:
             print(f"Error loading template {name}: {e}")
             return None
 
+    def template_version(self, name: str) -> Optional[str]:
+        """Short hash of a template's text; changes whenever the template is edited."""
+        template = self.load_prompt_template(name)
+        if template is None:
+            return None
+        return hashlib.sha256(template.encode("utf-8")).hexdigest()[:12]
+
 def format_template(template: str, **kwargs) -> str:
     for k, v in kwargs.items():
         if isinstance(v, (list, dict)):
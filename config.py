@@ -14,7 +14,9 @@ APP_CONFIG = {
     "server_port": 7860,
     "max_width": "1200px",
     "share": False,
-    "show_error": True
+    "show_error": True,
+    # Chats answered at once; async handlers wait on the LLM without holding a thread
+    "chat_concurrency": int(os.getenv("CHAT_CONCURRENCY", "64"))
 }
 
 # File paths
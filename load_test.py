@@ -0,0 +1,115 @@
+"""
+Load test - Concurrent chat turns through the sync and async router pipelines
+
+Runs symptom-assessment conversations against the fake LLM provider (fixed
+latency, no API keys needed) and reports throughput and the peak number of
+LLM calls in flight. With the sync pipeline, concurrency is capped by the
+worker threads; with the async one, by the provider quota (the gateway's
+max_concurrency).
+
+    python load_test.py --users 200 --threads 8 --quota 32 --latency 0.2
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.update(LLM_PROVIDER="fake", LLM_CACHE_PATH="", INTENT_LABEL_LOG="", INTENT_CACHE_PATH="",
+                  SPECULATIVE_RETRIEVAL="0", SESSION_STORE="memory")
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+from backend.utils.llm_gateway import FakeProvider, gateway
+
+CONVERSATION = ["I'm having hot flashes and mood swings", "mild"]
+
+
+def fake_reply(prompt, model):
+    """Plausible answers for each prompt the symptom flow sends"""
+    if prompt.startswith("Analyze this user message"):
+        return "SYMPTOM_ASSESSMENT"
+    if "**Target Symptoms:**" in prompt:
+        targets = re.search(r"Target Symptoms:\*\* (.*)", prompt).group(1)
+        return json.dumps({"next_question": f"How much have {targets} bothered you?"})
+    if "**User Input:**" in prompt:
+        return json.dumps({"symptoms_scored": [], "action_type": "severity_clear", "next_message": "Thanks."})
+    return json.dumps({"total_score": 0, "interpretation": "No symptoms."})
+
+
+class InFlightSampler:
+    """Records the peak number of fake LLM calls in flight"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, gateway.get_stats()["fake"]["in_flight"])
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_sync(router, users, threads):
+    def conversation(user):
+        for message in CONVERSATION:
+            router.route_request(message, f"sync-{user}")
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(conversation, range(users)))
+
+
+async def run_async(router, users):
+    async def conversation(user):
+        for message in CONVERSATION:
+            await router.aroute_request(message, f"async-{user}")
+
+    await asyncio.gather(*(conversation(user) for user in range(users)))
+    await gateway.aclose()
+
+
+def measure(label, run):
+    calls_before = gateway.get_stats()["fake"]["calls"]
+    with contextlib.redirect_stdout(io.StringIO()), InFlightSampler() as sampler:
+        start = time.perf_counter()
+        run()
+        seconds = time.perf_counter() - start
+    calls = gateway.get_stats()["fake"]["calls"] - calls_before
+    print(f"{label:<26} {seconds:7.2f}s  {calls / seconds:7.1f} LLM calls/s  peak in flight {sampler.peak}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=200, help="concurrent conversations")
+    parser.add_argument("--threads", type=int, default=8, help="worker threads for the sync pipeline")
+    parser.add_argument("--quota", type=int, default=32, help="max concurrent calls to the provider")
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per fake LLM call")
+    args = parser.parse_args()
+
+    gateway.register("fake", FakeProvider(reply=fake_reply, latency=args.latency), args.quota)
+    with contextlib.redirect_stdout(io.StringIO()):
+        from main_flow_router import MainFlowRouter
+        router = MainFlowRouter()
+
+    print(f"🧪 {args.users} conversations x {len(CONVERSATION)} turns, "
+          f"{args.latency:.2f}s per LLM call, provider quota {args.quota}")
+    measure(f"sync ({args.threads} threads)", lambda: run_sync(router, args.users, args.threads))
+    measure("async (event loop)", lambda: asyncio.run(run_async(router, args.users)))
+
+
+if __name__ == "__main__":
+    main()
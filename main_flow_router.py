@@ -1,5 +1,11 @@
+import asyncio
 import sys
 import os
+import hashlib
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,9 +17,31 @@ sys.path.append(os.path.join(current_dir, 'backend'))
 sys.path.append(os.path.join(current_dir, 'backend', 'RAG'))
 sys.path.append(os.path.join(current_dir, 'backend', 'flows'))
 
+from backend.utils.deadline import Deadline, timeout_for
+from backend.utils.intent_cache import IntentCache
+from backend.utils.intent_model import LocalIntentModel, load_logged_labels, load_seed_examples, log_label
+from backend.utils.llm_gateway import LLMError, gateway as llm_gateway
+from backend.utils.template_loader import TemplateLoader, format_template
+from backend.utils.streaming import StreamedResponse
+from session_store import create_session_store
+
+# Turns of conversation kept per session
+HISTORY_WINDOW = int(os.getenv("SESSION_HISTORY_WINDOW", "20"))
+
+# Latency budget for one turn (seconds, 0 = unbounded); every stage shares it
+TURN_LATENCY_BUDGET = float(os.getenv("TURN_LATENCY_BUDGET", "20"))
+# Part of the budget kept for answering, so classification cannot use all of it
+TURN_ANSWER_RESERVE = float(os.getenv("TURN_ANSWER_RESERVE", "8"))
+# Start retrieval for the likely RAG query while the LLM classifies the intent; "0" disables it
+SPECULATIVE_RETRIEVAL = os.getenv("SPECULATIVE_RETRIEVAL", "1") != "0"
+SPECULATIVE_WORKERS = int(os.getenv("SPECULATIVE_WORKERS", "8"))
+
 # Import symptom assessment flow
 try:
-    from backend.flows.symptom_assessment_main import symptom_assessment_flow, menopause_support, menopause_support_enhanced
+    from backend.flows.symptom_assessment_main import (
+        amenopause_support_enhanced, menopause_support, menopause_support_enhanced,
+    )
+    from backend.flows.symptom_assessment_flow import MRSFlow
     SYMPTOM_ASSESSMENT_AVAILABLE = True
     print("✅ Symptom assessment flow loaded")
 except ImportError as e:
@@ -22,67 +50,201 @@ except ImportError as e:
 
 # Import RAG system
 try:
-    from backend.RAG.rag_pipeline import get_chatbot_response
+    from backend.RAG.rag_pipeline import astream_chatbot_response, prefetch_context, stream_chatbot_response
     RAG_AVAILABLE = True
     print("✅ RAG system loaded")
 except ImportError as e:
     print(f"⚠️ RAG not available: {e}")
     RAG_AVAILABLE = False
     
-    def get_chatbot_response(message, history):
-        return "RAG system unavailable. Please try again later."
+    def stream_chatbot_response(message, history, flow=None, deadline=None, prefetched=None):
+        yield "RAG system unavailable. Please try again later."
 
+    async def astream_chatbot_response(message, history, flow=None, deadline=None, prefetched=None):
+        yield "RAG system unavailable. Please try again later."
 
-# Import Gemini for intent classification
-try:
-    import google.generativeai as genai
-    api_key = os.getenv("GOOGLE_API_KEY")
-    if api_key:
-        genai.configure(api_key=api_key)
-        gemini_model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        GEMINI_AVAILABLE = True
-        print("✅ Gemini loaded for intent classification")
-    else:
-        print("⚠️ GOOGLE_API_KEY not found")
-        GEMINI_AVAILABLE = False
-except ImportError:
-    print("⚠️ Gemini not available")
-    GEMINI_AVAILABLE = False
+
+INTENT_MODEL_NAME = 'gemini-2.0-flash-exp'
+# Seconds allowed for one LLM intent classification before falling back locally
+INTENT_LLM_TIMEOUT = float(os.getenv("INTENT_LLM_TIMEOUT", "10"))
+
+# Gemini intent classification goes through the shared LLM gateway
+GEMINI_AVAILABLE = llm_gateway.available("gemini")
+if GEMINI_AVAILABLE:
+    print("✅ Gemini loaded for intent classification")
+else:
+    print("⚠️ Gemini not available (GOOGLE_API_KEY or google-generativeai missing)")
+
+INTENT_LABELS = ["SYMPTOM_ASSESSMENT", "KNOWLEDGE_QUERY", "EMOTIONAL_SUPPORT", "OUT_OF_SCOPE"]
+INTENT_EXAMPLES_PATH = os.path.join(current_dir, 'backend', 'prompts', 'intent_examples.yaml')
+# Local model confidence needed to skip the LLM
+INTENT_LOCAL_THRESHOLD = float(os.getenv("INTENT_LOCAL_THRESHOLD", "0.9"))
+# Confidence needed to trust the local model when the LLM is unavailable (else keywords)
+INTENT_FALLBACK_THRESHOLD = float(os.getenv("INTENT_FALLBACK_THRESHOLD", "0.5"))
+# Opt-in: LLM labels (with the user's message) are logged here, learned online and used to
+# train the local model on the next start. Empty (the default) disables all of it.
+INTENT_LABEL_LOG = os.getenv("INTENT_LABEL_LOG", "")
+# Size at which the label log is rotated (one previous file is kept)
+INTENT_LABEL_LOG_MAX_BYTES = int(os.getenv("INTENT_LABEL_LOG_MAX_BYTES", str(1 << 20)))
+# Cache of LLM labels for repeated messages; the SQLite path is optional (empty = memory only)
+INTENT_CACHE_SIZE = int(os.getenv("INTENT_CACHE_SIZE", "2048"))
+INTENT_CACHE_TTL = float(os.getenv("INTENT_CACHE_TTL", "86400"))
+INTENT_CACHE_PATH = os.getenv("INTENT_CACHE_PATH", "")
+
+IntentResult = namedtuple("IntentResult", ["intent", "source", "confidence", "llm_calls"])
 
 class SimpleIntentClassifier:
-    """Simple intent classifier using Gemini or fallback"""
+    """
+    Two-tier intent classifier: a local naive Bayes model settles confident
+    messages, and only ambiguous ones go to Gemini (or keywords as fallback).
+    """
     
-    def __init__(self):
+    def __init__(self, local_threshold=INTENT_LOCAL_THRESHOLD, fallback_threshold=INTENT_FALLBACK_THRESHOLD,
+                 label_log=INTENT_LABEL_LOG):
         self.available = GEMINI_AVAILABLE
+        self.local_threshold = local_threshold
+        self.fallback_threshold = fallback_threshold
+        self.label_log = label_log
+        self.local_model = LocalIntentModel()
+        self.local_model.train(load_seed_examples(INTENT_EXAMPLES_PATH))
+        self.local_model.train(load_logged_labels(label_log))
+        self.prompt_template = TemplateLoader(os.path.join(current_dir, 'backend')).load_prompt_template("intent_classifier")
+        if self.prompt_template is None:
+            self.available = False
+        # Changing the prompt or model changes the version and invalidates cached labels
+        self.version = hashlib.sha256(f"{INTENT_MODEL_NAME}\n{self.prompt_template}".encode("utf-8")).hexdigest()[:12]
+        self.cache = IntentCache(self.version, INTENT_CACHE_SIZE, INTENT_CACHE_TTL, INTENT_CACHE_PATH)
+        self.stats = {"messages": 0, "local": 0, "cached": 0, "llm": 0, "llm_errors": 0, "budget_skips": 0,
+                      "fallback": 0}
     
     def classify_intent(self, user_input):
         """Classify user intent"""
-        if self.available:
-            try:
-                prompt = f"""Analyze this user message and classify the intent. Respond with just one word:
+        return self.classify(user_input).intent
 
-SYMPTOM_ASSESSMENT - if user describes personal symptoms or wants symptom evaluation
-KNOWLEDGE_QUERY - if user asks general questions about menopause
-EMOTIONAL_SUPPORT - if user expresses emotional distress or needs support
-OUT_OF_SCOPE - if completely unrelated to menopause
+    def lookup(self, user_input):
+        """
+        (local model's guess, cached label) - the tiers classify() tries before
+        the LLM. The cache is only read when the local model is not confident.
+        Pass the result to needs_llm() and classify() so each is done once.
+        """
+        guess = self.local_model.predict(user_input)
+        label, confidence = guess
+        if label and confidence >= self.local_threshold:
+            return guess, None
+        return guess, self.cache.get(user_input)
 
-User message: "{user_input}"
+    def needs_llm(self, lookup):
+        """Best label known before the LLM and whether classify() would have to ask it"""
+        (label, confidence), cached = lookup
+        if label and confidence >= self.local_threshold:
+            return label, False
+        if cached:
+            return cached, False
+        return label, self.available
 
-Response (one word only):"""
+    def classify(self, user_input, deadline=None, lookup=None):
+        """
+        Classify user intent, reporting which tier decided and how many LLM calls
+        it took. The LLM is skipped when the turn's deadline leaves no time for it.
+        """
+        result, timeout, guess = self._before_llm(user_input, deadline, lookup)
+        if result is None:
+            result = self._after_llm(user_input, self._classify_with_llm(user_input, timeout), guess)
+        return result
 
-                response = gemini_model.generate_content(prompt)
-                intent = response.text.strip().upper()
-                
-                if intent in ["SYMPTOM_ASSESSMENT", "KNOWLEDGE_QUERY", "EMOTIONAL_SUPPORT", "OUT_OF_SCOPE"]:
-                    return intent
-                else:
-                    return self._keyword_fallback(user_input)
-                    
-            except Exception as e:
-                print(f"Gemini classification error: {e}")
-                return self._keyword_fallback(user_input)
-        else:
-            return self._keyword_fallback(user_input)
+    async def aclassify(self, user_input, deadline=None, lookup=None):
+        """Async classify(); the LLM call is awaited instead of blocking a thread"""
+        result, timeout, guess = self._before_llm(user_input, deadline, lookup)
+        if result is None:
+            result = self._after_llm(user_input, await self._aclassify_with_llm(user_input, timeout), guess)
+        return result
+
+    def _before_llm(self, user_input, deadline, lookup=None):
+        """(result, None, guess) if settled without the LLM, else (None, LLM timeout, guess)"""
+        self.stats["messages"] += 1
+        guess, cached = lookup or self.lookup(user_input)
+        label, confidence = guess
+        if label and confidence >= self.local_threshold:
+            self.stats["local"] += 1
+            return IntentResult(label, "local", confidence, 0), None, guess
+
+        if cached:
+            self.stats["cached"] += 1
+            return IntentResult(cached, "cache", 1.0, 0), None, guess
+
+        timeout = timeout_for(deadline, INTENT_LLM_TIMEOUT, reserve=TURN_ANSWER_RESERVE)
+        if self.available and timeout <= 0:
+            self.stats["budget_skips"] += 1
+        elif self.available:
+            return None, timeout, guess
+        return self._fallback(user_input, guess, 0), None, guess
+
+    def _after_llm(self, user_input, intent, guess):
+        if intent:
+            self.cache.set(user_input, intent)
+            return IntentResult(intent, "llm", 1.0, 1)
+        return self._fallback(user_input, guess, 1)
+
+    def _fallback(self, user_input, guess, llm_calls):
+        self.stats["fallback"] += 1
+        label, confidence = guess
+        if label and confidence >= self.fallback_threshold:
+            return IntentResult(label, "local_fallback", confidence, llm_calls)
+        return IntentResult(self._keyword_fallback(user_input), "keywords", 0.0, llm_calls)
+
+    def _classify_with_llm(self, user_input, timeout=INTENT_LLM_TIMEOUT):
+        """Ask Gemini; returns None if the call fails or the answer is not a known intent"""
+        self.stats["llm"] += 1
+        try:
+            prompt = format_template(self.prompt_template, user_input=user_input)
+            response = llm_gateway.complete("gemini", prompt, model=INTENT_MODEL_NAME, timeout=timeout)
+        except LLMError as e:
+            return self._llm_failed(e)
+        return self._learn_label(user_input, response)
+
+    async def _aclassify_with_llm(self, user_input, timeout=INTENT_LLM_TIMEOUT):
+        self.stats["llm"] += 1
+        try:
+            prompt = format_template(self.prompt_template, user_input=user_input)
+            response = await llm_gateway.acomplete("gemini", prompt, model=INTENT_MODEL_NAME, timeout=timeout)
+        except LLMError as e:
+            return self._llm_failed(e)
+        return self._learn_label(user_input, response)
+
+    def _llm_failed(self, error):
+        print(f"Gemini classification error: {error}")
+        self.stats["llm_errors"] += 1
+        return None
+
+    def _learn_label(self, user_input, response):
+        intent = response.strip().upper()
+        if intent not in INTENT_LABELS:
+            return None
+        if not self.label_log:
+            return intent
+        # With label logging enabled, every LLM decision becomes training data for the local model
+        self.local_model.learn(user_input, intent)
+        try:
+            log_label(self.label_log, user_input, intent, INTENT_LABEL_LOG_MAX_BYTES)
+        except OSError as e:
+            print(f"⚠️ Failed to log intent label: {e}")
+        return intent
+
+    def get_stats(self):
+        messages = self.stats["messages"]
+        return {
+            **self.stats,
+            "llm_call_rate": self.stats["llm"] / messages if messages else 0.0,
+            "local_rate": self.stats["local"] / messages if messages else 0.0,
+            "cache": self.cache.get_stats(),
+        }
+
+    def report(self):
+        """One-line summary of how often the LLM was needed"""
+        stats = self.get_stats()
+        return (f"📊 Intent classification: {stats['messages']} messages, "
+                f"{stats['local']} local, {stats['cached']} cached, {stats['llm']} LLM ({stats['llm_call_rate']:.0%} LLM call rate), "
+                f"{stats['fallback']} fallback")
     
     def _keyword_fallback(self, user_input):
         """Fallback keyword-based classification"""
@@ -97,26 +259,204 @@ Response (one word only):"""
         else:
             return "OUT_OF_SCOPE"
 
+class RoutingDecision:
+    """
+    The intent of one message, classified at most once (on first use) and
+    passed to every handler that routes the turn, together with the turn's
+    deadline. Decisions made for other text in the same turn (see for_text)
+    share the turn's counters and deadline.
+
+    On the async path (is_async) the LLM work is resolved up front with
+    aresolve() and the assessment slot, so the handlers never block, and RAG
+    answers are streamed asynchronously.
+    """
+    def __init__(self, classifier, user_input, counters=None, deadline=None, is_async=False):
+        self.classifier = classifier
+        self.user_input = user_input
+        self.counters = counters if counters is not None else {"classifications": 0, "llm_calls": 0}
+        self.deadline = deadline if deadline is not None else Deadline()
+        self.is_async = is_async
+        self.assessment = None  # Symptom flow result computed ahead of the handlers
+        self._result = None
+        self._lookup = None  # Local guess and cached label, shared by speculation and classification
+        self._speculation = None  # (query, future) started before classification
+        self._others = {}
+
+    @property
+    def lookup(self):
+        if self._lookup is None:
+            self._lookup = self.classifier.lookup(self.user_input)
+        return self._lookup
+
+    @property
+    def result(self):
+        if self._result is None:
+            self._record(self.classifier.classify(self.user_input, self.deadline, self._lookup))
+        return self._result
+
+    async def aresolve(self):
+        if self._result is None:
+            self._record(await self.classifier.aclassify(self.user_input, self.deadline, self._lookup))
+        return self._result
+
+    def _record(self, result):
+        self._result = result
+        self.counters["classifications"] += 1
+        self.counters["llm_calls"] += result.llm_calls
+        print(f"🎯 Classified intent: {result.intent} ({result.source}, {result.confidence:.2f})")
+
+    @property
+    def intent(self):
+        return self.result.intent
+
+    def speculate(self, query, future):
+        self._speculation = (query, future)
+
+    def take_speculation(self, query):
+        """Future of the prefetched RAG prompt if it was started for this query"""
+        if self._speculation is None or self._speculation[0] != query:
+            return None
+        future = self._speculation[1]
+        self._speculation = None
+        self.counters["prefetch_used"] = True
+        return future
+
+    def discard_speculation(self):
+        """Cancel prefetched work the routed flow did not use"""
+        if self._speculation is not None:
+            self._speculation[1].cancel()
+            self._speculation = None
+            self.counters["prefetch_used"] = False
+
+    def for_text(self, text):
+        """Decision for other text handled in the same turn"""
+        if text == self.user_input:
+            return self
+        if text not in self._others:
+            self._others[text] = RoutingDecision(self.classifier, text, self.counters, self.deadline,
+                                                 self.is_async)
+        return self._others[text]
+
 class SessionState:
     """Simple session state management"""
-    def __init__(self, session_id):
+    def __init__(self, session_id, history_window=HISTORY_WINDOW):
         self.session_id = session_id
         self.current_flow = "main_menu"  # "main_menu"|"symptom_assessment"|"knowledge_query"|"emotional_support"
-        self.conversation_history = []
+        # Only the most recent messages are kept (user and assistant messages count separately)
+        self.conversation_history = deque(maxlen=history_window * 2)
+        self.mrs_flow = None  # This session's MRSFlow, created lazily by MRSFlowPool
     
     def reset_assessment(self):
         """Reset symptom assessment state"""
-        if self.current_flow == "symptom_assessment" and SYMPTOM_ASSESSMENT_AVAILABLE:
-            # The MRSFlow handles its own state reset via __init__() in _exit_flow and _score_and_respond
-            pass
+        self.mrs_flow = None
         self.current_flow = "main_menu"
 
+    def to_dict(self):
+        """Compact serializable form, used by the session store."""
+        data = {
+            "id": self.session_id,
+            "flow": self.current_flow,
+            "history": list(self.conversation_history),
+        }
+        if self.mrs_flow is not None:
+            data["mrs"] = self.mrs_flow.to_dict()
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        session = cls(data["id"])
+        session.current_flow = data.get("flow", "main_menu")
+        session.conversation_history.extend(data.get("history", []))
+        if data.get("mrs") is not None and SYMPTOM_ASSESSMENT_AVAILABLE:
+            session.mrs_flow = MRSFlow.from_dict(data["mrs"])
+        elif session.current_flow == "symptom_assessment":
+            session.current_flow = "main_menu"
+        return session
+
+class MRSFlowPool:
+    """
+    Hands out one MRSFlow per session, created on first use.
+
+    Flows idle for longer than idle_timeout are dropped, and once more than
+    max_flows are live the least recently used one is dropped. A session
+    whose flow is dropped mid-assessment goes back to the main menu.
+
+    The pool tracks session ids only; drops are applied to the copy in the
+    session store, since with a persistent store each turn loads a fresh
+    SessionState.
+    """
+
+    def __init__(self, max_flows=None, idle_timeout=None, store=None):
+        self.max_flows = max(1, max_flows if max_flows is not None else int(os.getenv("MRS_MAX_LIVE_FLOWS", "500")))
+        self.idle_timeout = idle_timeout if idle_timeout is not None else float(os.getenv("MRS_FLOW_IDLE_TIMEOUT", "1800"))
+        self.store = store
+        self.evictions = 0
+        self._live = OrderedDict()  # session_id -> last_used
+        self._lock = threading.Lock()
+
+    def acquire(self, session):
+        """Return the session's MRSFlow, creating it if needed."""
+        now = time.monotonic()
+        with self._lock:
+            # A session coming back to its own flow resumes it, however long it was idle
+            self._live.pop(session.session_id, None)
+            dropped = self._evict_idle(now)
+            if session.mrs_flow is None:
+                session.mrs_flow = MRSFlow()
+            self._live[session.session_id] = now
+            while len(self._live) > self.max_flows:
+                dropped.append(self._live.popitem(last=False)[0])
+        # Store I/O happens outside the lock
+        for session_id in dropped:
+            self._drop(session_id)
+        return session.mrs_flow
+
+    def release(self, session):
+        """Forget the session's flow, e.g. once its assessment has finished."""
+        with self._lock:
+            self._live.pop(session.session_id, None)
+        session.mrs_flow = None
+
+    def _evict_idle(self, now):
+        dropped = []
+        if not self.idle_timeout:
+            return dropped
+        while self._live:
+            session_id, last_used = next(iter(self._live.items()))
+            if now - last_used < self.idle_timeout:
+                break
+            del self._live[session_id]
+            dropped.append(session_id)
+        return dropped
+
+    def _drop(self, session_id):
+        self.evictions += 1
+        print(f"🧹 Dropping idle symptom assessment for session {session_id[:8]}")
+        session = self.store.get(session_id) if self.store is not None else None
+        if session is None:
+            # Expired from the store already; nothing left to free
+            return
+        if session.current_flow == "symptom_assessment":
+            session.reset_assessment()
+        else:
+            session.mrs_flow = None
+        self.store.save(session)
+
+    def __len__(self):
+        return len(self._live)
+
 class MainFlowRouter:
     """Simplified main flow router"""
     
-    def __init__(self):
-        self.sessions = {}
+    def __init__(self, session_store=None):
+        # Not `session_store or ...`: stores define __len__, so an empty one is falsy
+        if session_store is None:
+            session_store = create_session_store(SessionState.from_dict)
+        self.sessions = session_store
         self.intent_classifier = SimpleIntentClassifier()
+        self.flow_pool = MRSFlowPool(store=self.sessions)
+        self.prefetch_pool = ThreadPoolExecutor(max_workers=SPECULATIVE_WORKERS, thread_name_prefix="rag-prefetch")
+        self.prefetch_stats = {"started": 0, "used": 0, "discarded": 0}
         
         self.welcome_message = """👋 Welcome to the Menopause Health Support System!
 
@@ -139,78 +479,227 @@ Is there anything about menopause I can help you with?"""
 
     def get_session(self, session_id):
         """Get or create session"""
-        if session_id not in self.sessions:
-            self.sessions[session_id] = SessionState(session_id)
-        return self.sessions[session_id]
+        session = self.sessions.get(session_id)
+        if session is None:
+            session = SessionState(session_id)
+        return session
 
-    def route_request(self, user_input, session_id="default"):
-        """Main routing function"""
+    def route_request(self, user_input, session_id="default", stream=False):
+        """
+        Main routing function
+
+        With stream=True, RAG answers come back as a StreamedResponse that the
+        caller iterates for tokens; otherwise result["response"] is always a str.
+        """
         session = self.get_session(session_id)
+        try:
+            return self._route(user_input, session, stream)
+        finally:
+            self.sessions.save(session)
+
+    async def aroute_request(self, user_input, session_id="default", stream=False):
+        """
+        Async route_request(): LLM calls are awaited on the event loop, so
+        concurrent turns are limited by the LLM gateway's quotas rather than by
+        worker threads. Streamed responses must be consumed with `async for`.
+        Session store I/O runs in worker threads so it never blocks the loop.
+        """
+        session = await asyncio.to_thread(self.get_session, session_id)
+        try:
+            return await self._aroute(user_input, session, stream)
+        finally:
+            await asyncio.to_thread(self.sessions.save, session)
+
+    def _route(self, user_input, session, stream):
         user_input = user_input.strip()
-        
         if not user_input:
-            return {
-                "response": self.welcome_message,
-                "status": "success",
-                "flow": "main_menu",
-                "action_needed": "none"
-            }
+            return self._welcome()
         
         # Record conversation history
         session.conversation_history.append({"role": "user", "content": user_input})
         
         try:
-            # Handle global commands
-            user_lower = user_input.lower()
-            if user_lower in ["help", "?", "start", "restart", "main menu", "home"]:
-                session.reset_assessment()
-                return {
-                    "response": self.welcome_message,
-                    "status": "success",
-                    "flow": "main_menu",
-                    "action_needed": "none"
-                }
-            
-            if user_lower in ["quit", "exit", "goodbye", "bye"]:
-                session.reset_assessment()
-                return {
-                    "response": "Thank you for using the Menopause Health Support System! Take care! 👋",
-                    "status": "success",
-                    "flow": "ended",
-                    "action_needed": "none"
-                }
-            
-            # Route based on current state
-            if session.current_flow == "main_menu":
-                result = self._handle_main_menu(user_input, session)
-            elif session.current_flow == "symptom_assessment":
-                result = self._handle_symptom_assessment(user_input, session)
-            elif session.current_flow == "knowledge_query":
-                result = self._handle_knowledge_query(user_input, session)
-            elif session.current_flow == "emotional_support":
-                result = self._handle_emotional_support(user_input, session)
-            else:
-                result = self._handle_unknown_state(session)
-            
-            # Record response in history
-            session.conversation_history.append({"role": "assistant", "content": result["response"]})
-            
-            return result
+            result = self._handle_global_command(user_input, session)
+            if result is not None:
+                return result
+            decision = self._start_turn(user_input, session)
+            result = self._dispatch(user_input, session, decision)
+            if not stream:
+                result["response"] = str(result["response"])
+            return self._finish_turn(result, session, decision)
             
         except Exception as e:
-            print(f"❌ Error in main router: {e}")
+            return self._route_error(e, session)
+
+    async def _aroute(self, user_input, session, stream):
+        user_input = user_input.strip()
+        if not user_input:
+            return self._welcome()
+
+        session.conversation_history.append({"role": "user", "content": user_input})
+
+        try:
+            result = self._handle_global_command(user_input, session)
+            if result is not None:
+                return result
+            decision = self._start_turn(user_input, session, is_async=True)
+            await self._resolve_async(user_input, session, decision)
+            result = self._dispatch(user_input, session, decision)
+            if not stream and isinstance(result["response"], StreamedResponse):
+                result["response"] = await result["response"].aread()
+            return self._finish_turn(result, session, decision)
+
+        except Exception as e:
+            return self._route_error(e, session)
+
+    def _welcome(self):
+        return {
+            "response": self.welcome_message,
+            "status": "success",
+            "flow": "main_menu",
+            "action_needed": "none"
+        }
+
+    def _handle_global_command(self, user_input, session):
+        user_lower = user_input.lower()
+        if user_lower in ["help", "?", "start", "restart", "main menu", "home"]:
+            self.flow_pool.release(session)
+            session.reset_assessment()
+            return self._welcome()
+        
+        if user_lower in ["quit", "exit", "goodbye", "bye"]:
+            self.flow_pool.release(session)
+            session.reset_assessment()
             return {
-                "response": "Sorry, I encountered an error. Please try again.",
-                "status": "error",
-                "flow": session.current_flow,
-                "action_needed": "restart"
+                "response": "Thank you for using the Menopause Health Support System! Take care! 👋",
+                "status": "success",
+                "flow": "ended",
+                "action_needed": "none"
             }
-    
-    def _handle_main_menu(self, user_input, session):
+        return None
+
+    def _start_turn(self, user_input, session, is_async=False):
+        # The message is classified at most once
+        decision = RoutingDecision(self.intent_classifier, user_input,
+                                   deadline=Deadline(TURN_LATENCY_BUDGET), is_async=is_async)
+        self._speculate(decision, session)
+        return decision
+
+    async def _resolve_async(self, user_input, session, decision):
+        """
+        Do the turn's LLM work (classification, symptom flow) with awaits, in
+        the order _dispatch would, so the handlers only read the results.
+        """
+        flow = session.current_flow
+        if flow in ("main_menu", "knowledge_query", "emotional_support"):
+            await decision.aresolve()
+            wants_assessment = decision.intent == "SYMPTOM_ASSESSMENT"
+        else:
+            wants_assessment = flow == "symptom_assessment"
+        if not (wants_assessment and SYMPTOM_ASSESSMENT_AVAILABLE):
+            return
+        # Acquiring may evict other sessions' flows through the session store
+        flow = await asyncio.to_thread(self.flow_pool.acquire, session)
+        decision.assessment = await amenopause_support_enhanced(user_input, flow=flow, deadline=decision.deadline)
+        if isinstance(decision.assessment, dict) and decision.assessment.get("status") == "exit_confirmed":
+            original_question = decision.assessment.get("original_question")
+            if original_question:
+                await decision.for_text(original_question).aresolve()
+
+    def _dispatch(self, user_input, session, decision):
+        # Route based on current state
+        if session.current_flow == "main_menu":
+            return self._handle_main_menu(user_input, session, decision)
+        elif session.current_flow == "symptom_assessment":
+            return self._handle_symptom_assessment(user_input, session, decision)
+        elif session.current_flow == "knowledge_query":
+            return self._handle_knowledge_query(user_input, session, decision)
+        elif session.current_flow == "emotional_support":
+            return self._handle_emotional_support(user_input, session, decision)
+        return self._handle_unknown_state(session)
+
+    def _finish_turn(self, result, session, decision):
+        self._settle_speculation(decision)
+        result["turn_stats"] = {**decision.counters, "routing_seconds": decision.deadline.elapsed(),
+                                "budget_exceeded": decision.deadline.expired}
+        print(f"📊 Turn: {decision.counters['classifications']} classification(s), "
+              f"{decision.counters['llm_calls']} intent LLM call(s), "
+              f"routed in {decision.deadline.elapsed():.2f}s")
+
+        # Record response in history
+        if isinstance(result["response"], StreamedResponse):
+            entry = {"role": "assistant", "content": ""}
+            session.conversation_history.append(entry)
+
+            def record(text):
+                entry["content"] = text
+                self.sessions.save(session)
+
+            async def arecord(text):
+                entry["content"] = text
+                await asyncio.to_thread(self.sessions.save, session)
+
+            result["response"].on_complete(arecord if decision.is_async else record)
+        else:
+            session.conversation_history.append({"role": "assistant", "content": result["response"]})
+        return result
+
+    def _route_error(self, e, session):
+        print(f"❌ Error in main router: {e}")
+        return {
+            "response": "Sorry, I encountered an error. Please try again.",
+            "status": "error",
+            "flow": session.current_flow,
+            "action_needed": "restart"
+        }
+
+    def _assess(self, user_input, session, decision):
+        """Run the session's symptom flow, unless the async path already did"""
+        if decision.assessment is not None:
+            return decision.assessment
+        return menopause_support_enhanced(user_input, flow=self.flow_pool.acquire(session),
+                                          deadline=decision.deadline)
+
+    def _rag(self, query, decision, flow=None):
+        """Streamed RAG answer for the query, using retrieval prefetched for it if any"""
+        stream_fn = astream_chatbot_response if decision.is_async else stream_chatbot_response
+        return StreamedResponse(stream_fn(query, [], flow=flow, deadline=decision.deadline,
+                                          prefetched=decision.take_speculation(query)))
+
+    @staticmethod
+    def _emotional_query(user_input):
+        return f"emotional support needed: {user_input}"
+
+    def _speculate(self, decision, session):
+        """
+        When the intent needs the LLM, start embedding and retrieval for the RAG
+        query the turn will most likely make, so it overlaps with classification.
+        """
+        if not (SPECULATIVE_RETRIEVAL and RAG_AVAILABLE):
+            return
+        if session.current_flow not in ("main_menu", "knowledge_query", "emotional_support"):
+            return
+        guess, needs_llm = self.intent_classifier.needs_llm(decision.lookup)
+        if not needs_llm:
+            return
+        if guess == "EMOTIONAL_SUPPORT":
+            query = self._emotional_query(decision.user_input)
+        else:
+            query = decision.user_input
+        decision.speculate(query, self.prefetch_pool.submit(prefetch_context, query))
+        self.prefetch_stats["started"] += 1
+
+    def _settle_speculation(self, decision):
+        used = decision.counters.get("prefetch_used")
+        decision.discard_speculation()
+        if used:
+            self.prefetch_stats["used"] += 1
+        elif "prefetch_used" in decision.counters:
+            self.prefetch_stats["discarded"] += 1
+
+    def _handle_main_menu(self, user_input, session, decision):
         """Handle main menu state with intent classification"""
-        # Classify intent
-        intent = self.intent_classifier.classify_intent(user_input)
-        print(f"🎯 Classified intent: {intent}")
+        intent = decision.intent
         
         # Route based on intent
         if intent == "OUT_OF_SCOPE":
@@ -226,14 +715,14 @@ Is there anything about menopause I can help you with?"""
             if SYMPTOM_ASSESSMENT_AVAILABLE:
                 # Start symptom assessment using the real flow
                 print(f"🧪 Calling menopause_support_enhanced with: {user_input}")
-                assessment_result = menopause_support_enhanced(user_input)
+                assessment_result = self._assess(user_input, session, decision)
                 print(f"🧪 Assessment result: {assessment_result}")
                 
-                return self._process_symptom_result(assessment_result, session)
+                return self._process_symptom_result(assessment_result, session, decision)
             else:
                 # Fallback to RAG with symptom context
                 if RAG_AVAILABLE:
-                    rag_response = get_chatbot_response(f"symptom assessment: {user_input}", [])
+                    rag_response = self._rag(f"symptom assessment: {user_input}", decision)
                     response = "I understand you want to assess your symptoms. Let me provide you with some information that might help.\n\n" + rag_response
                 else:
                     response = "I understand you want to assess your symptoms. For a detailed symptom assessment, I recommend consulting with a healthcare professional."
@@ -247,23 +736,23 @@ Is there anything about menopause I can help you with?"""
         
         elif intent == "EMOTIONAL_SUPPORT":
             session.current_flow = "emotional_support"
-            return self._handle_emotional_support(user_input, session)
+            return self._handle_emotional_support(user_input, session, decision)
         
         else:  # KNOWLEDGE_QUERY
             session.current_flow = "knowledge_query"
-            return self._handle_knowledge_query(user_input, session)
+            return self._handle_knowledge_query(user_input, session, decision)
     
-    def _handle_symptom_assessment(self, user_input, session):
+    def _handle_symptom_assessment(self, user_input, session, decision):
         """Handle symptom assessment flow"""
         if SYMPTOM_ASSESSMENT_AVAILABLE:
-            assessment_result = menopause_support_enhanced(user_input)
+            assessment_result = self._assess(user_input, session, decision)
             print(f"🧪 Assessment result: {assessment_result}")
             
-            return self._process_symptom_result(assessment_result, session)
+            return self._process_symptom_result(assessment_result, session, decision)
         else:
             # Fallback when symptom assessment not available
             if RAG_AVAILABLE:
-                rag_response = get_chatbot_response(f"symptom assessment: {user_input}", [])
+                rag_response = self._rag(f"symptom assessment: {user_input}", decision)
                 response = "I understand you want to continue with symptom assessment. Here's some relevant information:\n\n" + rag_response
             else:
                 response = "I'm sorry, the symptom assessment system is currently unavailable. Please consult with a healthcare professional."
@@ -275,7 +764,7 @@ Is there anything about menopause I can help you with?"""
                 "action_needed": "none"
             }
     
-    def _process_symptom_result(self, assessment_result, session):
+    def _process_symptom_result(self, assessment_result, session, decision):
         """Process the result from symptom assessment flow"""
         if not isinstance(assessment_result, dict):
             # Handle unexpected format
@@ -288,6 +777,9 @@ Is there anything about menopause I can help you with?"""
         
         status = assessment_result.get("status", "success")
         message = assessment_result.get("message", str(assessment_result))
+        if status in ("scoring_completed_and_exited", "exit_confirmed"):
+            # Assessment is over; free the session's flow
+            self.flow_pool.release(session)
         
         # Handle different statuses from the latest symptom flow
         if status == "exit_confirmation_pending":
@@ -358,19 +850,20 @@ Is there anything about menopause I can help you with?"""
             # If there was an original question, try to handle it
             if original_question:
                 print(f"🔄 Processing original question after exit: {original_question}")
-                intent = self.intent_classifier.classify_intent(original_question)
+                original_decision = decision.for_text(original_question)
+                intent = original_decision.intent
                 
                 if intent == "KNOWLEDGE_QUERY":
                     session.current_flow = "knowledge_query"
-                    return self._handle_knowledge_query(original_question, session)
+                    return self._handle_knowledge_query(original_question, session, original_decision)
                 elif intent == "EMOTIONAL_SUPPORT":
                     session.current_flow = "emotional_support"
-                    return self._handle_emotional_support(original_question, session)
+                    return self._handle_emotional_support(original_question, session, original_decision)
                 else:
                     # Default to knowledge query for the original question
                     session.current_flow = "knowledge_query"
                     if RAG_AVAILABLE:
-                        rag_response = get_chatbot_response(original_question, [])
+                        rag_response = self._rag(original_question, decision, flow="knowledge_query")
                         response = message + "\n\nRegarding your original question:\n" + rag_response
                     else:
                         response = message + "\n\n" + self.welcome_message
@@ -408,24 +901,24 @@ Is there anything about menopause I can help you with?"""
                 "action_needed": "none"
             }
     
-    def _handle_knowledge_query(self, user_input, session):
+    def _handle_knowledge_query(self, user_input, session, decision):
         """Handle knowledge query flow"""
         # Check if user wants to start symptom assessment
-        intent = self.intent_classifier.classify_intent(user_input)
+        intent = decision.intent
         
         if intent == "SYMPTOM_ASSESSMENT":
             session.current_flow = "symptom_assessment"
             if SYMPTOM_ASSESSMENT_AVAILABLE:
-                assessment_result = menopause_support_enhanced(user_input)
+                assessment_result = self._assess(user_input, session, decision)
                 intro_message = "I understand you want to assess your symptoms. Let me help you with that.\n\n"
                 
-                result = self._process_symptom_result(assessment_result, session)
+                result = self._process_symptom_result(assessment_result, session, decision)
                 result["response"] = intro_message + result["response"]
                 return result
             else:
                 # Fallback to RAG
                 if RAG_AVAILABLE:
-                    rag_response = get_chatbot_response(f"symptom assessment: {user_input}", [])
+                    rag_response = self._rag(f"symptom assessment: {user_input}", decision)
                     response = "I understand you want to assess your symptoms. Let me provide you with some information that might help.\n\n" + rag_response
                 else:
                     response = "I understand you want to assess your symptoms. For a detailed assessment, I recommend consulting with a healthcare professional."
@@ -438,7 +931,7 @@ Is there anything about menopause I can help you with?"""
         
         elif intent == "EMOTIONAL_SUPPORT":
             session.current_flow = "emotional_support"
-            return self._handle_emotional_support(user_input, session)
+            return self._handle_emotional_support(user_input, session, decision)
         
         elif intent == "OUT_OF_SCOPE":
             return {
@@ -450,7 +943,7 @@ Is there anything about menopause I can help you with?"""
         
         # Process knowledge query with RAG
         if RAG_AVAILABLE:
-            rag_response = get_chatbot_response(user_input, [])
+            rag_response = self._rag(user_input, decision, flow="knowledge_query")
             response = rag_response + "\n\n💡 Is there anything else about menopause you'd like to know?"
         else:
             response = "I apologize, but my knowledge system is currently unavailable. Please consult with a healthcare professional for menopause-related questions."
@@ -462,25 +955,25 @@ Is there anything about menopause I can help you with?"""
             "action_needed": "none"
         }
     
-    def _handle_emotional_support(self, user_input, session):
+    def _handle_emotional_support(self, user_input, session, decision):
         """Handle emotional support flow"""
         # Check if user wants to switch to other flows
-        intent = self.intent_classifier.classify_intent(user_input)
+        intent = decision.intent
         
         if intent == "SYMPTOM_ASSESSMENT":
             session.current_flow = "symptom_assessment"
             if SYMPTOM_ASSESSMENT_AVAILABLE:
-                assessment_result = menopause_support_enhanced(user_input)
+                assessment_result = self._assess(user_input, session, decision)
                 intro_message = "I understand you want to assess your symptoms. Let me help you with that.\n\n"
                 
-                result = self._process_symptom_result(assessment_result, session)
+                result = self._process_symptom_result(assessment_result, session, decision)
                 result["response"] = intro_message + result["response"]
                 return result
             # If symptom assessment not available, fall through to other options
         
         elif intent == "KNOWLEDGE_QUERY":
             session.current_flow = "knowledge_query"
-            return self._handle_knowledge_query(user_input, session)
+            return self._handle_knowledge_query(user_input, session, decision)
         
         elif intent == "OUT_OF_SCOPE":
             return {
@@ -492,8 +985,8 @@ Is there anything about menopause I can help you with?"""
         
         # Provide emotional support using RAG with emotional context
         if RAG_AVAILABLE:
-            emotional_context = f"emotional support needed: {user_input}"
-            rag_response = get_chatbot_response(emotional_context, [])
+            emotional_context = self._emotional_query(user_input)
+            rag_response = self._rag(emotional_context, decision)
             response = rag_response + "\n\n💝 Remember, you're not alone in this journey. Would you like to:\n• Learn more about managing specific symptoms\n• Continue talking about your feelings\n• Get a systematic symptom assessment"
         else:
             response = """I hear you, and I want you to know that what you're feeling is completely valid. Menopause is a significant life transition, and it's normal to feel overwhelmed or anxious about the changes.
@@ -511,6 +1004,7 @@ You're not alone in this journey. Many women experience similar feelings during
     
     def _handle_unknown_state(self, session):
         """Handle unknown state"""
+        self.flow_pool.release(session)
         session.reset_assessment()
         return {
             "response": "I seem to have lost track of our conversation. Let's start fresh.\n\n" + self.welcome_message,
@@ -522,12 +1016,15 @@ You're not alone in this journey. Many women experience similar feelings during
 # Global router instance
 main_router = MainFlowRouter()
 
-def process_user_input(user_input, session_id="default"):
+def process_user_input(user_input, session_id="default", stream=False):
     """
     Main interface function for external use
+
+    Pass stream=True to get result["response"] as a StreamedResponse: iterate
+    it for chunks as they are generated, or str() it for the full text.
     """
     try:
-        return main_router.route_request(user_input, session_id)
+        return main_router.route_request(user_input, session_id, stream=stream)
     except Exception as e:
         print(f"❌ Error in process_user_input: {e}")
         return {
@@ -537,6 +1034,22 @@ def process_user_input(user_input, session_id="default"):
             "action_needed": "none"
         }
 
+async def process_user_input_async(user_input, session_id="default", stream=False):
+    """
+    Async process_user_input() for event-loop servers (Gradio async handlers).
+    With stream=True, iterate result["response"] with `async for`.
+    """
+    try:
+        return await main_router.aroute_request(user_input, session_id, stream=stream)
+    except Exception as e:
+        print(f"❌ Error in process_user_input_async: {e}")
+        return {
+            "response": "I apologize, but I encountered an error. Please try again.",
+            "status": "error",
+            "flow": "main_menu",
+            "action_needed": "none"
+        }
+
 # Test function
 if __name__ == "__main__":
     print("🧪 Testing Main Flow Router...")
@@ -553,4 +1066,6 @@ if __name__ == "__main__":
         result = process_user_input(msg)
         print(f"📝 Intent/Flow: {result['flow']}")
         print(f"💬 Response: {result['response'][:100]}...")
-        print("-" * 50)
\ No newline at end of file
+        print("-" * 50)
+
+    print(main_router.intent_classifier.report())
\ No newline at end of file
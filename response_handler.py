@@ -1,15 +1,18 @@
 """
 Response Handler - Handles user input and generates chat responses
 """
+import asyncio
 import traceback
 from config import ERROR_MESSAGES
+from backend.utils.streaming import StreamedResponse
 
 
 class ThaliaResponseHandler:
     """Handles responses for Thalia Gradio interface"""
     
     def __init__(self, user_manager=None, main_router_available=False, rag_available=False, 
-                 process_user_input=None, rag_response=None):
+                 process_user_input=None, rag_response=None, process_user_input_async=None,
+                 rag_response_async=None):
         self.session_data = {}
         self.user_manager = user_manager
         self.auth_available = user_manager is not None
@@ -17,47 +20,29 @@ class ThaliaResponseHandler:
         self.rag_available = rag_available
         self.process_user_input = process_user_input
         self.rag_response = rag_response
+        # Async variants, used by the async Gradio handlers (acustom_chat_function)
+        self.process_user_input_async = process_user_input_async
+        self.rag_response_async = rag_response_async
         print(f"🔧 ThaliaResponseHandler initialization completed, user_manager: {self.auth_available}")
         
-    def get_chatbot_response(self, message: str, session_id="default"):
-        """Main response function for processing user input"""
+    def get_chatbot_response(self, message: str, session_id="default", stream=False):
+        """
+        Main response function for processing user input
+
+        With stream=True the router's answer may be a StreamedResponse, which
+        the caller iterates to show tokens as they arrive.
+        """
         print(f"💬 get_chatbot_response called: message='{message[:50]}...', session_id='{session_id[:8] if session_id else 'None'}'")
         
-        if not message.strip():
-            return "I'm here to help with your menopause journey. What would you like to know?"
-        
-        # Check user authentication
-        if self.auth_available and self.user_manager and session_id != "default":
-            if not self.user_manager.is_logged_in(session_id):
-                return "Please log in to continue our conversation."
-            
-            # Update user activity
-            self.user_manager.update_user_activity(session_id)
-            self.user_manager.increment_conversation_count(session_id)
-            
-            # Get user info for personalization
-            username = self.user_manager.get_username(session_id)
-            print(f"👤 User: {username} - processing message")
+        refusal = self._check_message(message, session_id)
+        if refusal:
+            return refusal
         
         try:
             if self.main_router_available and self.process_user_input:
                 # Use full system
-                result = self.process_user_input(message, session_id)
-                response = result.get("response", "I'm having trouble processing your request.")
-                status = result.get("status", "unknown")
-                flow = result.get("flow", "unknown")
-                
-                print(f"🔄 Flow: {flow}, Status: {status}")
-                
-                # Add personalization
-                if (self.auth_available and self.user_manager and 
-                    session_id != "default" and self.user_manager.is_logged_in(session_id)):
-                    user_info = self.user_manager.get_user_info(session_id)
-                    if user_info and "hello" in message.lower() and status == "conversation_start":
-                        preferred_name = user_info.get('profile', {}).get('preferred_name', 'there')
-                        response = f"Hello {preferred_name}! " + response
-                
-                return response
+                result = self.process_user_input(message, session_id, stream=stream)
+                return self._router_response(result, message, session_id)
                 
             elif self.rag_available and self.rag_response:
                 print("⚠️ Using RAG fallback mode")
@@ -73,6 +58,80 @@ class ThaliaResponseHandler:
             traceback.print_exc()
             return ERROR_MESSAGES["processing_error"]
 
+    async def aget_chatbot_response(self, message: str, session_id="default", stream=False):
+        """
+        Async get_chatbot_response(). Uses the router's async pipeline when it
+        was provided; streamed answers are then consumed with `async for`.
+        """
+        print(f"💬 aget_chatbot_response called: message='{message[:50]}...', session_id='{session_id[:8] if session_id else 'None'}'")
+
+        # UserManager calls block on sessions and the write-behind queue; keep them off the loop
+        refusal = await asyncio.to_thread(self._check_message, message, session_id)
+        if refusal:
+            return refusal
+
+        try:
+            if self.main_router_available and self.process_user_input_async:
+                result = await self.process_user_input_async(message, session_id, stream=stream)
+                return await asyncio.to_thread(self._router_response, result, message, session_id)
+
+            elif self.main_router_available and self.process_user_input:
+                result = await asyncio.to_thread(self.process_user_input, message, session_id)
+                return await asyncio.to_thread(self._router_response, result, message, session_id)
+
+            elif self.rag_available and self.rag_response_async:
+                print("⚠️ Using RAG fallback mode")
+                return await self.rag_response_async(message, [])
+
+            elif self.rag_available and self.rag_response:
+                print("⚠️ Using RAG fallback mode")
+                return await asyncio.to_thread(self.rag_response, message, [])
+
+            else:
+                print("⚠️ Using basic response mode")
+                return self._get_basic_response(message)
+
+        except Exception as e:
+            print(f"❌ Response handler error: {e}")
+            traceback.print_exc()
+            return ERROR_MESSAGES["processing_error"]
+
+    def _check_message(self, message: str, session_id):
+        """Reply to send instead of processing the message, or None to process it"""
+        if not message.strip():
+            return "I'm here to help with your menopause journey. What would you like to know?"
+        
+        # Check user authentication
+        if self.auth_available and self.user_manager and session_id != "default":
+            if not self.user_manager.is_logged_in(session_id):
+                return "Please log in to continue our conversation."
+            
+            # Update user activity
+            self.user_manager.update_user_activity(session_id)
+            self.user_manager.increment_conversation_count(session_id)
+            
+            # Get user info for personalization
+            username = self.user_manager.get_username(session_id)
+            print(f"👤 User: {username} - processing message")
+        return None
+
+    def _router_response(self, result, message: str, session_id):
+        response = result.get("response", "I'm having trouble processing your request.")
+        status = result.get("status", "unknown")
+        flow = result.get("flow", "unknown")
+        
+        print(f"🔄 Flow: {flow}, Status: {status}")
+        
+        # Add personalization
+        if (self.auth_available and self.user_manager and 
+            session_id != "default" and self.user_manager.is_logged_in(session_id)):
+            user_info = self.user_manager.get_user_info(session_id)
+            if user_info and "hello" in message.lower() and status == "conversation_start":
+                preferred_name = user_info.get('profile', {}).get('preferred_name', 'there')
+                response = f"Hello {preferred_name}! " + response
+        
+        return response
+
     def _get_basic_response(self, message: str) -> str:
         """Provide basic responses when no other systems are available"""
         message_lower = message.lower()
@@ -118,35 +177,104 @@ While some of my advanced features aren't currently available, I'm still here to
 For comprehensive medical advice, always consult with your healthcare provider."""
 
     def custom_chat_function(self, message, chat_history, session_id=None):
-        """Custom chat function with conversation saving functionality"""
+        """
+        Custom chat function with conversation saving functionality
+
+        A generator for Gradio: the assistant message is updated in place and
+        the history re-yielded as each chunk of the answer arrives.
+        """
         print(f"💬 custom_chat_function called: message_length={len(message) if message else 0}, session={session_id[:8] if session_id else 'None'}")
         
+        save_session = self._chat_session(message, session_id)
+        if save_session is False:
+            yield "", chat_history
+            return
+        
+        # Call response handler with session (or without, when authentication is unavailable)
+        bot_response = self.get_chatbot_response(message, save_session or "default", stream=True)
+        assistant_message = self._start_reply(chat_history, message)
+
+        if isinstance(bot_response, StreamedResponse):
+            try:
+                for _ in bot_response:
+                    assistant_message["content"] = bot_response.text
+                    yield "", chat_history
+            except Exception as e:
+                self._stream_failed(assistant_message, bot_response, e)
+        else:
+            assistant_message["content"] = bot_response
+
+        self._finish_reply(chat_history, message, assistant_message, save_session)
+        yield "", chat_history
+
+    async def acustom_chat_function(self, message, chat_history, session_id=None):
+        """
+        Async custom_chat_function() for Gradio async handlers: waiting on the
+        LLM does not hold a worker thread, so many chats can be in flight.
+        """
+        print(f"💬 acustom_chat_function called: message_length={len(message) if message else 0}, session={session_id[:8] if session_id else 'None'}")
+
+        save_session = await asyncio.to_thread(self._chat_session, message, session_id)
+        if save_session is False:
+            yield "", chat_history
+            return
+
+        bot_response = await self.aget_chatbot_response(message, save_session or "default", stream=True)
+        assistant_message = self._start_reply(chat_history, message)
+
+        if isinstance(bot_response, StreamedResponse):
+            try:
+                async for _ in bot_response:
+                    assistant_message["content"] = bot_response.text
+                    yield "", chat_history
+            except Exception as e:
+                self._stream_failed(assistant_message, bot_response, e)
+        else:
+            assistant_message["content"] = bot_response
+
+        await asyncio.to_thread(self._finish_reply, chat_history, message, assistant_message, save_session)
+        yield "", chat_history
+
+    def _chat_session(self, message, session_id):
+        """
+        Session to save the turn under (None when authentication is unavailable),
+        or False if the message should not be answered.
+        """
         if not message.strip():
-            return "", chat_history
+            return False
         
         # If authentication is available, check session
         if self.auth_available and self.user_manager and session_id:
             if not self.user_manager.is_logged_in(session_id):
                 print("❌ Invalid session, user not logged in")
-                return "", chat_history
-            
-            # Call response handler with session
-            bot_response_content = self.get_chatbot_response(message, session_id)
-            
-            # Save message
-            try:
-                self.user_manager.save_message(session_id, message, bot_response_content)
-                print("💾 Message saved")
-            except Exception as e:
-                print(f"⚠️ Failed to save message: {e}")
-            
-        else:
-            # Fallback behavior without authentication
-            bot_response_content = self.get_chatbot_response(message)
+                return False
+            return session_id
+        return None
 
+    @staticmethod
+    def _start_reply(chat_history, message):
         # Update Gradio Chatbot display history
         chat_history.append({"role": "user", "content": message})
-        chat_history.append({"role": "assistant", "content": bot_response_content})
+        assistant_message = {"role": "assistant", "content": ""}
+        chat_history.append(assistant_message)
+        return assistant_message
+
+    @staticmethod
+    def _stream_failed(assistant_message, bot_response, e):
+        print(f"❌ Streaming response error: {e}")
+        traceback.print_exc()
+        partial = bot_response.text
+        assistant_message["content"] = (partial + "\n\n" if partial else "") + ERROR_MESSAGES["processing_error"]
+
+    def _finish_reply(self, chat_history, message, assistant_message, save_session):
+        bot_response_content = assistant_message["content"]
+
+        # Queue the turn for saving once the full answer is known (written in the background)
+        if save_session:
+            try:
+                self.user_manager.save_message(save_session, message, bot_response_content)
+                print("💾 Message queued for saving")
+            except Exception as e:
+                print(f"⚠️ Failed to save message: {e}")
         
         print(f"✅ Chat response generation completed, history length: {len(chat_history)}")
-        return "", chat_history
\ No newline at end of file
@@ -0,0 +1,159 @@
+"""
+Session Store - Where MainFlowRouter keeps SessionState between turns
+
+Two backends:
+- InMemorySessionStore: per-process LRU with an idle TTL (the default)
+- SQLiteSessionStore: sessions serialized to a shared SQLite file, so every
+  worker process on the host can pick up any session
+
+Select one with SESSION_STORE=memory|sqlite.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from backend.utils.lru_cache import TTLCache
+
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH", "./session_data/sessions.sqlite3")
+SESSION_TTL = float(os.getenv("SESSION_TTL", "3600"))
+SESSION_MAX = int(os.getenv("SESSION_MAX", "10000"))
+
+
+class SessionStore:
+    """
+    Interface for session storage.
+
+    Stored objects need a session_id attribute and a to_dict() method; stores
+    that serialize rebuild them with the loads callable they are given.
+    """
+
+    def get(self, session_id: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def save(self, session: Any):
+        raise NotImplementedError
+
+    def delete(self, session_id: str):
+        raise NotImplementedError
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class InMemorySessionStore(SessionStore):
+    """Live SessionState objects in an LRU; sessions not saved for ttl_seconds expire."""
+
+    def __init__(self, max_sessions: int = SESSION_MAX, ttl_seconds: float = SESSION_TTL):
+        self._cache = TTLCache(max_sessions, ttl_seconds)
+
+    def get(self, session_id: str) -> Optional[Any]:
+        return self._cache.get(session_id)
+
+    def save(self, session: Any):
+        self._cache.set(session.session_id, session)
+
+    def delete(self, session_id: str):
+        self._cache.pop(session_id)
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"backend": "memory", **self._cache.get_stats()}
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Sessions as compact JSON rows in SQLite (WAL mode, safe across processes).
+
+    Rows not saved for ttl_seconds are treated as missing and purged every
+    purge_every saves.
+    """
+
+    def __init__(self, loads: Callable[[Dict[str, Any]], Any], path: str = SESSION_STORE_PATH,
+                 ttl_seconds: float = SESSION_TTL, purge_every: int = 500):
+        self.loads = loads
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.purge_every = purge_every
+        self.hits = 0
+        self.misses = 0
+        self._saves = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_updated_at ON sessions (updated_at)")
+        self._conn.commit()
+
+    def _cutoff(self) -> float:
+        return time.time() - self.ttl_seconds if self.ttl_seconds else 0.0
+
+    def get(self, session_id: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM sessions WHERE session_id = ? AND updated_at > ?",
+                (session_id, self._cutoff()),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return self.loads(json.loads(row[0]))
+
+    def save(self, session: Any):
+        data = json.dumps(session.to_dict(), separators=(",", ":"), ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, data, updated_at) VALUES (?, ?, ?)",
+                (session.session_id, data, time.time()),
+            )
+            self._saves += 1
+            if self.purge_every and self._saves % self.purge_every == 0:
+                self._conn.execute("DELETE FROM sessions WHERE updated_at <= ?", (self._cutoff(),))
+            self._conn.commit()
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM sessions WHERE updated_at > ?", (self._cutoff(),)
+            ).fetchone()[0]
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": "sqlite",
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def create_session_store(loads: Callable[[Dict[str, Any]], Any]) -> SessionStore:
+    """Build the store selected by SESSION_STORE."""
+    if SESSION_STORE == "sqlite":
+        print(f"🗄️ Using SQLite session store at {SESSION_STORE_PATH}")
+        return SQLiteSessionStore(loads)
+    return InMemorySessionStore()
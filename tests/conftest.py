@@ -0,0 +1,12 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Offline defaults: no API keys, nothing written outside pytest's tmp dirs
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("RAG_EMBEDDING_PROVIDER", "fake")
+os.environ.setdefault("LLM_CACHE_PATH", "")
+os.environ.setdefault("INTENT_CACHE_PATH", "")
+os.environ.setdefault("INTENT_LABEL_LOG", "")
@@ -0,0 +1,50 @@
+from backend.RAG.answer_cache import SemanticAnswerCache
+
+SCOPE = ("KNOWLEDGE_QUERY", "v1")
+
+
+def filled(**kwargs):
+    cache = SemanticAnswerCache(threshold=0.95, **kwargs)
+    cache.check_index_version("index-1")
+    cache.store(SCOPE, "what is menopause", [1.0, 0.0, 0.0], "An answer")
+    return cache
+
+
+def test_near_duplicate_question_hits():
+    cache = filled()
+    assert cache.lookup(SCOPE, [0.99, 0.05, 0.0]) == "An answer"
+    assert cache.lookup(SCOPE, [0.0, 1.0, 0.0]) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_scopes_do_not_share_answers():
+    cache = filled()
+    assert cache.lookup(("EMOTIONAL_SUPPORT", "v1"), [1.0, 0.0, 0.0]) is None
+    assert cache.lookup(("KNOWLEDGE_QUERY", "v2"), [1.0, 0.0, 0.0]) is None
+
+
+def test_rebuilt_index_invalidates_every_entry():
+    cache = filled()
+    cache.check_index_version("index-1")
+    assert cache.lookup(SCOPE, [1.0, 0.0, 0.0]) == "An answer"
+    cache.check_index_version("index-2")
+    assert cache.lookup(SCOPE, [1.0, 0.0, 0.0]) is None
+    stats = cache.get_stats()
+    assert (stats["entries"], stats["invalidations"]) == (0, 1)
+
+
+def test_expired_answers_are_dropped():
+    cache = filled(ttl_seconds=60)
+    next(iter(cache._scopes[SCOPE].values())).created_at -= 120
+    assert cache.lookup(SCOPE, [1.0, 0.0, 0.0]) is None
+    assert cache.get_stats()["entries"] == 0
+
+
+def test_least_recently_used_answer_is_evicted():
+    cache = filled(max_entries=2)
+    cache.store(SCOPE, "what are hot flashes", [0.0, 1.0, 0.0], "Flashes")
+    assert cache.lookup(SCOPE, [1.0, 0.0, 0.0]) == "An answer"
+    cache.store(SCOPE, "what is HRT", [0.0, 0.0, 1.0], "HRT")
+    assert cache.lookup(SCOPE, [0.0, 1.0, 0.0]) is None
+    assert cache.lookup(SCOPE, [1.0, 0.0, 0.0]) == "An answer"
+    assert cache.get_stats()["evictions"] == 1
@@ -0,0 +1,43 @@
+import sqlite3
+
+from backend.utils.intent_cache import IntentCache
+
+
+def test_normalized_messages_share_an_entry():
+    cache = IntentCache("v1")
+    cache.set("What is menopause?", "KNOWLEDGE_QUERY")
+    assert cache.get("  what IS menopause ") == "KNOWLEDGE_QUERY"
+    assert cache.get("?!") is None
+
+
+def test_entries_survive_restarts_for_the_same_version(tmp_path):
+    path = str(tmp_path / "intents.sqlite3")
+    IntentCache("v1", path=path).set("hot flashes", "SYMPTOM_ASSESSMENT")
+    reopened = IntentCache("v1", path=path)
+    assert reopened.get("hot flashes") == "SYMPTOM_ASSESSMENT"
+    assert reopened.get_stats()["persistent_hits"] == 1
+
+
+def test_new_version_invalidates_and_purges(tmp_path):
+    path = str(tmp_path / "intents.sqlite3")
+    IntentCache("v1", path=path).set("hot flashes", "SYMPTOM_ASSESSMENT")
+    assert IntentCache("v2", path=path).get("hot flashes") is None
+    # The v2 open purged the v1 rows, so going back does not resurrect them
+    assert IntentCache("v1", path=path).get("hot flashes") is None
+
+
+def test_expired_entries_are_not_returned(tmp_path):
+    path = str(tmp_path / "intents.sqlite3")
+    IntentCache("v1", ttl_seconds=60, path=path).set("hot flashes", "SYMPTOM_ASSESSMENT")
+    with sqlite3.connect(path) as conn:
+        conn.execute("UPDATE intent_cache SET created_at = created_at - 120")
+    assert IntentCache("v1", ttl_seconds=60, path=path).get("hot flashes") is None
+
+
+def test_table_from_the_old_layout_is_replaced(tmp_path):
+    path = str(tmp_path / "intents.sqlite3")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE intent_cache (message TEXT PRIMARY KEY, label TEXT, version TEXT, created_at REAL)")
+    cache = IntentCache("v1", path=path)
+    cache.set("hot flashes", "SYMPTOM_ASSESSMENT")
+    assert IntentCache("v1", path=path).get("hot flashes") == "SYMPTOM_ASSESSMENT"
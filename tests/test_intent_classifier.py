@@ -0,0 +1,57 @@
+import pytest
+
+import main_flow_router
+from backend.utils.llm_gateway import FakeProvider, LLMGateway
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    """Fake Gemini answering KNOWLEDGE_QUERY; swap `provider.reply` to change the answer."""
+    provider = FakeProvider(reply="KNOWLEDGE_QUERY")
+    gateway = LLMGateway(override="fake")
+    gateway.register("fake", provider)
+    monkeypatch.setattr(main_flow_router, "llm_gateway", gateway)
+    return provider
+
+
+def classifier(**kwargs):
+    return main_flow_router.SimpleIntentClassifier(label_log="", **kwargs)
+
+
+def test_confident_local_guess_skips_the_llm(llm):
+    result = classifier(local_threshold=0.0).classify("I want to assess my symptoms")
+    assert result.source == "local" and result.llm_calls == 0
+    assert llm.prompts == []
+
+
+def test_unsure_guess_goes_to_the_llm_then_the_cache(llm):
+    intents = classifier(local_threshold=1.01)
+    first = intents.classify("Tell me about estrogen")
+    second = intents.classify("tell me about ESTROGEN!")
+    assert (first.source, first.intent, first.llm_calls) == ("llm", "KNOWLEDGE_QUERY", 1)
+    assert (second.source, second.intent, second.llm_calls) == ("cache", "KNOWLEDGE_QUERY", 0)
+    assert len(llm.prompts) == 1
+
+
+def test_unusable_llm_answer_falls_back_locally(llm):
+    llm.reply = "I am not sure"
+    result = classifier(local_threshold=1.01, fallback_threshold=0.0).classify("what is menopause")
+    assert result.source == "local_fallback" and result.llm_calls == 1
+
+
+def test_expired_deadline_skips_the_llm(llm):
+    from backend.utils.deadline import Deadline
+    intents = classifier(local_threshold=1.01, fallback_threshold=1.01)
+    result = intents.classify("tell me something", deadline=Deadline(1e-9))
+    assert result.source == "keywords" and result.llm_calls == 0
+    assert intents.stats["budget_skips"] == 1
+
+
+def test_lookup_reads_the_cache_once_per_message(llm):
+    intents = classifier(local_threshold=1.01)
+    intents.classify("Tell me about estrogen")
+    decision = main_flow_router.RoutingDecision(intents, "tell me about estrogen")
+    assert intents.needs_llm(decision.lookup) == ("KNOWLEDGE_QUERY", False)
+    assert decision.result.source == "cache"
+    stats = intents.cache.get_stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
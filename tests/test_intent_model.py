@@ -0,0 +1,59 @@
+from backend.utils.intent_model import LocalIntentModel, load_logged_labels, log_label, normalize_message
+
+EXAMPLES = [
+    ("I want to assess my symptoms", "SYMPTOM_ASSESSMENT"),
+    ("can you evaluate my symptoms", "SYMPTOM_ASSESSMENT"),
+    ("what is menopause", "KNOWLEDGE_QUERY"),
+    ("what causes hot flashes", "KNOWLEDGE_QUERY"),
+    ("I feel so alone and sad", "EMOTIONAL_SUPPORT"),
+    ("I am overwhelmed and sad", "EMOTIONAL_SUPPORT"),
+]
+
+
+def trained():
+    model = LocalIntentModel()
+    model.train(EXAMPLES)
+    return model
+
+
+def test_untrained_model_has_no_guess():
+    assert LocalIntentModel().predict("what is menopause") == (None, 0.0)
+
+
+def test_unknown_words_have_no_guess():
+    assert trained().predict("zebra xylophone") == (None, 0.0)
+
+
+def test_predicts_the_closest_label_with_a_probability():
+    label, confidence = trained().predict("what is perimenopause")
+    assert label == "KNOWLEDGE_QUERY"
+    assert 0.5 < confidence <= 1.0
+
+
+def test_learn_shifts_predictions():
+    model = trained()
+    before = model.predict("night sweats")
+    for _ in range(3):
+        model.learn("night sweats", "SYMPTOM_ASSESSMENT")
+    label, confidence = model.predict("night sweats")
+    assert before[0] is None
+    assert label == "SYMPTOM_ASSESSMENT" and confidence > 0.9
+
+
+def test_normalize_message_ignores_case_punctuation_and_spacing():
+    assert normalize_message("  What IS   menopause?! ") == "what is menopause"
+
+
+def test_label_log_rotates_and_is_read_back(tmp_path):
+    path = str(tmp_path / "labels.jsonl")
+    for i in range(20):
+        log_label(path, f"message {i}", "KNOWLEDGE_QUERY", max_bytes=200)
+    assert (tmp_path / "labels.jsonl.1").exists()
+    examples = load_logged_labels(path)
+    assert examples[-1] == ("message 19", "KNOWLEDGE_QUERY")
+    assert len(examples) < 20  # only the current and one rotated file are kept
+
+
+def test_label_log_disabled_without_path(tmp_path):
+    log_label("", "hello", "OUT_OF_SCOPE")
+    assert load_logged_labels("") == []
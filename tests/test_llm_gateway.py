@@ -0,0 +1,98 @@
+import asyncio
+import time
+
+import pytest
+
+from backend.utils.llm_gateway import FakeProvider, LLMGateway, LLMTimeout, _Limiter
+
+
+def later(seconds):
+    return time.monotonic() + seconds
+
+
+def test_cancelled_waiter_owns_no_permit():
+    async def scenario():
+        limiter = _Limiter(1)
+        assert await limiter.aacquire(later(1))
+        waiter = asyncio.create_task(limiter.aacquire(later(5)))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert not limiter._async_waiters
+        limiter.release()
+        assert limiter._active == 0
+        assert await limiter.aacquire(later(1))
+
+    asyncio.run(scenario())
+
+
+def test_woken_waiter_that_is_cancelled_passes_the_wake_up_on():
+    async def scenario():
+        limiter = _Limiter(1)
+        assert await limiter.aacquire(later(1))
+        first = asyncio.create_task(limiter.aacquire(later(5)))
+        second = asyncio.create_task(limiter.aacquire(later(5)))
+        await asyncio.sleep(0.01)
+        limiter.release()  # wakes `first`, which is cancelled before it can take the permit
+        first.cancel()
+        assert await asyncio.wait_for(second, 1) is True
+        assert first.cancelled()
+        assert limiter._active == 1
+
+    asyncio.run(scenario())
+
+
+def test_waiter_times_out_without_a_permit():
+    async def scenario():
+        limiter = _Limiter(1)
+        assert await limiter.aacquire(later(1))
+        assert await limiter.aacquire(later(0.05)) is False
+        assert not limiter._async_waiters and limiter._active == 1
+
+    asyncio.run(scenario())
+
+
+def test_thread_and_coroutine_share_the_limit():
+    limiter = _Limiter(1)
+    assert limiter.acquire(later(1))
+
+    async def scenario():
+        return await limiter.aacquire(later(0.05))
+
+    assert asyncio.run(scenario()) is False
+    limiter.release()
+    assert asyncio.run(scenario()) is True
+
+
+def test_cancelled_calls_release_their_slot():
+    gateway = LLMGateway(override="fake")
+    gateway.register("fake", FakeProvider(reply="ok", latency=1.0), max_concurrency=1)
+
+    async def scenario():
+        running = asyncio.create_task(gateway.acomplete("fake", "a", "model", timeout=5))
+        queued = asyncio.create_task(gateway.acomplete("fake", "b", "model", timeout=5))
+        await asyncio.sleep(0.05)
+        running.cancel()
+        queued.cancel()
+        await asyncio.gather(running, queued, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert gateway.get_stats()["fake"]["in_flight"] == 0
+    gateway.register("fake", FakeProvider(reply="ok"), max_concurrency=1)
+    assert gateway.complete("fake", "c", "model", timeout=1) == "ok"
+
+
+def test_no_free_slot_before_the_deadline_times_out():
+    gateway = LLMGateway(override="fake")
+    gateway.register("fake", FakeProvider(reply="ok", latency=0.3), max_concurrency=1)
+
+    async def scenario():
+        busy = asyncio.create_task(gateway.acomplete("fake", "a", "model", timeout=5))
+        await asyncio.sleep(0.01)
+        with pytest.raises(LLMTimeout):
+            await gateway.acomplete("fake", "b", "model", timeout=0.05)
+        assert await busy == "ok"
+
+    asyncio.run(scenario())
+    assert gateway.get_stats()["fake"]["timeouts"] == 1
@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+from backend.flows.mrs_response_parser import MRSResponseParser
+from backend.utils.template_loader import TemplateLoader
+from conftest import ROOT
+
+
+@pytest.fixture(scope="module")
+def parser():
+    template = TemplateLoader(os.path.join(ROOT, "backend")).load_prompt_template("mrs_response_analyzer")
+    return MRSResponseParser.from_template(template)
+
+
+def scores(result):
+    return {item["symptom"]: item["mrs_score"] for item in result["symptoms_scored"]}
+
+
+@pytest.mark.parametrize("reply, expected", [
+    ("no", 0),
+    ("mild", 1),
+    ("None of those", 0),
+    ("moderate for both", 2),
+    ("very severe", 4),
+])
+def test_clear_severity_scores_every_asked_symptom(parser, reply, expected):
+    result = parser.parse(reply, ["hot_flashes", "sleep_problems"])
+    assert result["action_type"] == "severity_clear"
+    assert scores(result) == {"hot_flashes": expected, "sleep_problems": expected}
+
+
+def test_negated_symptom_scores_zero(parser):
+    result = parser.parse("no hot flashes but moderate palpitations", ["hot_flashes", "heart_discomfort"])
+    assert scores(result) == {"hot_flashes": 0, "heart_discomfort": 2}
+
+
+@pytest.mark.parametrize("reply, asked", [
+    ("no desire", ["sexual_problems"]),
+    ("no sex life", ["sexual_problems"]),
+    ("I have no desire at all", ["sexual_problems"]),
+    ("never any desire", ["sexual_problems"]),
+    ("no bladder control", ["bladder_problems"]),
+])
+def test_negated_faculty_escalates(parser, reply, asked):
+    assert parser.parse(reply, asked) is None
+
+
+@pytest.mark.parametrize("reply", ["what do you mean?", "hot flashes", "mild and severe", "it varies a lot"])
+def test_ambiguous_replies_escalate(parser, reply):
+    assert parser.parse(reply, ["hot_flashes", "sleep_problems"]) is None
+
+
+def test_exit_phrase(parser):
+    assert parser.parse("stop", ["hot_flashes"])["action_type"] == "emergency_exit"
@@ -0,0 +1,105 @@
+import threading
+
+import pytest
+
+from user_store import UserStore, UserStoreError, WriteBehindWriter
+
+
+class StalledStore:
+    """Stands in for a UserStore whose disk hangs until `release` is set."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.written = []
+
+    def write(self, ops):
+        self.started.set()
+        self.release.wait(5)
+        self.written.extend(ops)
+
+
+class BrokenStore:
+    def write(self, ops):
+        raise OSError("disk full")
+
+
+def turn(i):
+    return {"timestamp": f"t{i:03d}", "user_message": f"question {i}", "bot_response": f"answer {i}"}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = UserStore(str(tmp_path / "users.sqlite3"), hot_limit=5, archive_chunk=3)
+    yield store
+    store.close()
+
+
+def test_writes_for_one_key_coalesce(store):
+    writer = WriteBehindWriter(store, flush_interval=10)
+    for count in range(3):
+        writer.submit(store.user_op("ana", {"email": "ana@example.com", "logins": count}), key=("user", "ana"))
+    assert writer.flush(5)
+    writer.close()
+    assert store.load_users()["ana"]["logins"] == 2
+    stats = writer.get_stats()
+    assert (stats["submitted"], stats["coalesced"], stats["written"]) == (3, 2, 1)
+
+
+def test_full_queue_drops_after_the_submit_timeout():
+    disk = StalledStore()
+    writer = WriteBehindWriter(disk, max_pending=1, flush_interval=10)
+    writer.submit(("op", 1))
+    assert disk.started.wait(1)  # the flusher is stuck writing op 1
+    writer.submit(("op", 2))
+    with pytest.raises(UserStoreError):
+        writer.submit(("op", 3), timeout=0.05)
+    stats = writer.get_stats()
+    assert stats["dropped"] == 1 and stats["backpressure_waits"] >= 1
+    disk.release.set()
+    writer.close()
+    assert disk.written == [("op", 1), ("op", 2)]
+
+
+def test_acknowledged_write_reports_a_dropped_batch():
+    writer = WriteBehindWriter(BrokenStore(), flush_interval=0.01, max_retries=0)
+    assert writer.write({("user", "ana"): ("user", "ana")}, timeout=2) is False
+    writer.submit(("user", "bea"))
+    assert writer.flush(2) is False
+    writer.close()
+
+
+def test_acknowledged_write_times_out_and_is_withdrawn():
+    disk = StalledStore()
+    writer = WriteBehindWriter(disk, flush_interval=0.01)
+    writer.submit(("op", 1))
+    assert disk.started.wait(1)
+    assert writer.write({"late": ("op", 2)}, timeout=0.05) is False
+    assert writer.flush(0.05) is False
+    disk.release.set()
+    writer.close()
+    assert disk.written == [("op", 1)]
+
+
+def test_conversation_pages_span_the_archive(store):
+    for i in range(20):
+        store.write([store.conversation_op("ana", turn(i))])
+    assert store.get_stats()["archived_turns"] > 0
+
+    seen = []
+    page = 0
+    while True:
+        result = store.conversation_page("ana", page, page_size=4)
+        assert result["total"] == 20
+        seen = [record["timestamp"] for record in result["conversations"]] + seen
+        if not result["has_more"]:
+            break
+        page += 1
+    assert seen == [turn(i)["timestamp"] for i in range(20)]
+    assert store.recent_conversations("ana", limit=2) == [turn(18), turn(19)]
+    assert store.conversation_page("ana", 10, page_size=4)["conversations"] == []
+
+
+def test_other_users_history_is_separate(store):
+    store.write([store.conversation_op("ana", turn(1)), store.conversation_op("bea", turn(2))])
+    assert store.conversation_page("bea")["conversations"] == [turn(2)]
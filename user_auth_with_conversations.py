@@ -1,51 +1,193 @@
 """
 Basic user authentication module - For Thalia platform
+
+User data lives in a SQLite store next to `filename` (thalia_users.json ->
+thalia_users.sqlite3): one row per user and per session, plus an append-only
+conversation log, so each write touches only what changed. An existing JSON
+file is imported once on first start.
+
+Account changes (register, login, logout, email) are committed before
+returning, waiting at most USER_WRITE_ACK_TIMEOUT seconds; if the write does
+not land the change is rolled back and reported as failed. Per-turn writes
+(messages, counters, activity) go through a write-behind queue so they stay
+off the response path.
+
+Sessions expire USER_SESSION_TTL seconds after the last activity; a
+background reaper drops expired sessions and the store is compacted on start.
 """
-import json
 import hashlib
+import threading
+import time
 import uuid
 from datetime import datetime
 import os
 
+from user_store import UserStore, UserStoreError, WriteBehindWriter
+
+WRITE_QUEUE_SIZE = int(os.getenv("USER_WRITE_QUEUE_SIZE", "10000"))
+WRITE_FLUSH_INTERVAL = float(os.getenv("USER_WRITE_FLUSH_INTERVAL", "0.5"))
+# Longest a request waits for room in a full write queue before the write is dropped
+WRITE_SUBMIT_TIMEOUT = float(os.getenv("USER_WRITE_SUBMIT_TIMEOUT", "5"))
+# Longest an account change waits for its write to be committed
+WRITE_ACK_TIMEOUT = float(os.getenv("USER_WRITE_ACK_TIMEOUT", "10"))
+SESSION_TTL = float(os.getenv("USER_SESSION_TTL", str(7 * 24 * 3600)))
+SESSION_REAP_INTERVAL = float(os.getenv("USER_SESSION_REAP_INTERVAL", "300"))
+# Latest turns per user kept uncompressed; older ones go to the compressed archive
+CONVERSATION_HOT_LIMIT = int(os.getenv("USER_CONVERSATION_HOT_LIMIT", "100"))
+
 
 class UserManager:
     """User manager"""
     
     def __init__(self, filename="thalia_users.json"):
         self.filename = filename
+        self.db_path = os.path.splitext(filename)[0] + ".sqlite3"
+        self.store = UserStore(self.db_path, hot_limit=CONVERSATION_HOT_LIMIT)
+        self.writer = WriteBehindWriter(self.store, max_pending=WRITE_QUEUE_SIZE,
+                                        flush_interval=WRITE_FLUSH_INTERVAL,
+                                        submit_timeout=WRITE_SUBMIT_TIMEOUT)
         self.users = {}
         self.sessions = {}
+        self.email_index = {}  # normalized email -> username
+        self.session_ttl = SESSION_TTL
+        self.reaped_sessions = 0
         self.load_users()
+
+        self._stop_reaper = threading.Event()
+        self._reaper = threading.Thread(target=self._reap_loop, name="session-reaper", daemon=True)
+        self._reaper.start()
         
     def load_users(self):
-        """Load user data from file"""
+        """Load user data from the store, importing a legacy JSON file if present"""
         try:
-            if os.path.exists(self.filename):
-                with open(self.filename, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.users = data.get('users', {})
-                    self.sessions = data.get('sessions', {})
-                print(f"✅ Loaded {len(self.users)} users from {self.filename}")
-            else:
-                print(f"📝 Creating new user data file: {self.filename}")
-                self.save_users()
+            if self.store.is_empty() and os.path.exists(self.filename):
+                imported = self.store.import_legacy_json(self.filename)
+                print(f"📦 Imported {imported} users from {self.filename} into {self.db_path}")
+            removed = self.store.compact()
+            if removed:
+                print(f"🧹 Removed {removed} expired sessions from {self.db_path}")
+            self.users = self.store.load_users()
+            self.sessions = self.store.load_sessions()
+            self._rebuild_email_index()
+            for session_id, data in self.sessions.items():
+                if 'expires_at' not in data:
+                    # Sessions from before expiry existed: count the TTL from login
+                    data['expires_at'] = self._legacy_expiry(data)
+                    self._queue_session(session_id)
+            print(f"✅ Loaded {len(self.users)} users from {self.db_path}")
         except Exception as e:
             print(f"⚠️ Failed to load user data: {e}")
             self.users = {}
             self.sessions = {}
+            self.email_index = {}
     
     def save_users(self):
-        """Save user data to file"""
+        """Write every user and session to the store (full snapshot)"""
         try:
-            data = {
-                'users': self.users,
-                'sessions': self.sessions,
-                'last_updated': datetime.now().isoformat()
-            }
-            with open(self.filename, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            for username in list(self.users):
+                self._queue_user(username)
+            for session_id in list(self.sessions):
+                self._queue_session(session_id)
+            if not self.writer.flush(WRITE_ACK_TIMEOUT):
+                print("⚠️ Not all user data was saved")
         except Exception as e:
             print(f"⚠️ Failed to save user data: {e}")
+
+    @staticmethod
+    def _normalize_email(email):
+        return (email or '').strip().lower()
+
+    def _rebuild_email_index(self):
+        """Build the email -> username index from loaded users"""
+        self.email_index = {}
+        for username, data in self.users.items():
+            email = self._normalize_email(data.get('email'))
+            if email:
+                # Keep the first account if legacy data has duplicate emails
+                self.email_index.setdefault(email, username)
+
+    def _find_user(self, login):
+        """Resolve a username or email to a username in O(1)"""
+        if login in self.users:
+            return login
+        return self.email_index.get(self._normalize_email(login))
+
+    def _user_write(self, username):
+        return {("user", username): self.store.user_op(username, self.users[username])}
+
+    def _session_write(self, session_id):
+        """Session row write, or its deletion once logged out"""
+        data = self.sessions.get(session_id)
+        if data is not None:
+            return {("session", session_id): self.store.session_op(session_id, data)}
+        return {("session", session_id): self.store.delete_session_op(session_id)}
+
+    def _queue_user(self, username):
+        """Queue a user row write; repeated updates before a flush collapse into one"""
+        self._submit(self._user_write(username))
+
+    def _queue_session(self, session_id):
+        self._submit(self._session_write(session_id))
+
+    def _submit(self, ops):
+        # Row writes are full snapshots, so a dropped one is repaired by the next update
+        for key, op in ops.items():
+            try:
+                self.writer.submit(op, key=key)
+            except UserStoreError as e:
+                print(f"⚠️ User store write skipped: {e}")
+
+    def _persist(self, ops):
+        """Write account changes and wait for the commit; False if they did not land"""
+        try:
+            if self.writer.write(ops, timeout=WRITE_ACK_TIMEOUT):
+                return True
+            print(f"❌ User store write not committed within {WRITE_ACK_TIMEOUT:g}s or dropped")
+        except UserStoreError as e:
+            print(f"❌ User store write failed: {e}")
+        return False
+
+    def flush(self, timeout=None):
+        """Wait for queued writes to reach the store"""
+        return self.writer.flush(timeout)
+
+    def close(self):
+        """Flush queued writes and stop the background writer and reaper"""
+        self._stop_reaper.set()
+        self.writer.close()
+
+    def _legacy_expiry(self, session_data):
+        try:
+            login_time = datetime.fromisoformat(session_data.get('login_time', '')).timestamp()
+        except (TypeError, ValueError):
+            login_time = time.time()
+        return login_time + self.session_ttl
+
+    def _live_session(self, session_id):
+        """Session data if the session exists, is active and has not expired (O(1))"""
+        data = self.sessions.get(session_id)
+        if data and data.get('active', False) and data.get('expires_at', 0) > time.time():
+            return data
+        return None
+
+    def reap_expired_sessions(self):
+        """Drop expired sessions from memory and the store"""
+        now = time.time()
+        expired = [sid for sid, data in list(self.sessions.items()) if data.get('expires_at', 0) <= now]
+        for session_id in expired:
+            self.sessions.pop(session_id, None)
+            self._queue_session(session_id)
+        self.reaped_sessions += len(expired)
+        if expired:
+            print(f"🧹 Reaped {len(expired)} expired sessions")
+        return len(expired)
+
+    def _reap_loop(self):
+        while not self._stop_reaper.wait(SESSION_REAP_INTERVAL):
+            try:
+                self.reap_expired_sessions()
+            except Exception as e:
+                print(f"⚠️ Session reaper error: {e}")
     
     def _hash_password(self, password):
         """Password hashing"""
@@ -72,9 +214,8 @@ class UserManager:
                 return False, "Username already exists"
             
             # Check if email already exists
-            for user_data in self.users.values():
-                if user_data.get('email') == email:
-                    return False, "Email already registered"
+            if self._normalize_email(email) in self.email_index:
+                return False, "Email already registered"
             
             # Create new user
             user_data = {
@@ -88,12 +229,15 @@ class UserManager:
                 'profile': {
                     'preferred_name': username,
                     'settings': {}
-                },
-                'conversations': []
+                }
             }
             
             self.users[username] = user_data
-            self.save_users()
+            self.email_index[self._normalize_email(email)] = username
+            if not self._persist(self._user_write(username)):
+                del self.users[username]
+                del self.email_index[self._normalize_email(email)]
+                return False, "Registration failed: your account could not be saved, please try again"
             
             print(f"✅ New user registration successful: {username}")
             return True, f"User {username} registered successfully!"
@@ -105,19 +249,11 @@ class UserManager:
     def login_user(self, username, password):
         """User login"""
         try:
-            # Check if user exists
-            if username not in self.users:
-                # Also check if logging in with email
-                found_user = None
-                for user, data in self.users.items():
-                    if data.get('email') == username:
-                        found_user = user
-                        break
-                
-                if found_user:
-                    username = found_user
-                else:
-                    return False, "Incorrect username or password", None
+            # Check if user exists (by username or email)
+            found_user = self._find_user(username)
+            if not found_user:
+                return False, "Incorrect username or password", None
+            username = found_user
             
             user_data = self.users[username]
             
@@ -130,14 +266,19 @@ class UserManager:
             session_data = {
                 'username': username,
                 'login_time': datetime.now().isoformat(),
-                'active': True
+                'active': True,
+                'expires_at': time.time() + self.session_ttl
             }
             
             self.sessions[session_id] = session_data
             
             # Update user login time
+            previous_login = user_data['last_login']
             user_data['last_login'] = datetime.now().isoformat()
-            self.save_users()
+            if not self._persist({**self._session_write(session_id), **self._user_write(username)}):
+                del self.sessions[session_id]
+                user_data['last_login'] = previous_login
+                return False, "Login failed: your session could not be saved, please try again", None
             
             print(f"✅ User login successful: {username}")
             return True, f"Welcome back, {user_data['profile']['preferred_name']}!", session_id
@@ -149,10 +290,13 @@ class UserManager:
     def logout_user(self, session_id):
         """User logout"""
         try:
-            if session_id in self.sessions:
-                username = self.sessions[session_id]['username']
-                del self.sessions[session_id]
-                self.save_users()
+            session_data = self.sessions.pop(session_id, None)
+            if session_data is not None:
+                username = session_data['username']
+                if not self._persist(self._session_write(session_id)):
+                    # Keep the session so memory matches the store it could not be removed from
+                    self.sessions[session_id] = session_data
+                    return False, "Logout failed, please try again"
                 print(f"✅ User logout successful: {username}")
                 return True, "Logout successful"
             else:
@@ -162,13 +306,14 @@ class UserManager:
             return False, f"Logout failed: {str(e)}"
     
     def is_logged_in(self, session_id):
-        """Check if session is valid"""
-        return session_id in self.sessions and self.sessions[session_id].get('active', False)
+        """Check if session is valid and not expired"""
+        return self._live_session(session_id) is not None
     
     def get_username(self, session_id):
         """Get username corresponding to session"""
-        if session_id in self.sessions:
-            return self.sessions[session_id]['username']
+        data = self._live_session(session_id)
+        if data:
+            return data['username']
         return None
     
     def get_user_info(self, session_id):
@@ -178,20 +323,48 @@ class UserManager:
             return self.users[username]
         return None
     
+    def update_email(self, session_id, new_email):
+        """Change the logged-in user's email address"""
+        username = self.get_username(session_id)
+        if not username or username not in self.users:
+            return False, "Invalid session"
+        if not new_email or '@' not in new_email:
+            return False, "Please enter a valid email address"
+        normalized = self._normalize_email(new_email)
+        owner = self.email_index.get(normalized)
+        if owner and owner != username:
+            return False, "Email already registered"
+        previous = self.users[username].get('email')
+        old_email = self._normalize_email(previous)
+        if self.email_index.get(old_email) == username:
+            del self.email_index[old_email]
+        self.users[username]['email'] = new_email
+        self.email_index[normalized] = username
+        if not self._persist(self._user_write(username)):
+            self.users[username]['email'] = previous
+            del self.email_index[normalized]
+            if old_email:
+                self.email_index[old_email] = username
+            return False, "Email could not be saved, please try again"
+        return True, "Email updated"
+
     def update_user_activity(self, session_id):
         """Update user activity time"""
-        if session_id in self.sessions:
-            self.sessions[session_id]['last_activity'] = datetime.now().isoformat()
+        data = self._live_session(session_id)
+        if data:
+            data['last_activity'] = datetime.now().isoformat()
+            data['expires_at'] = time.time() + self.session_ttl
+            self._queue_session(session_id)
     
     def increment_conversation_count(self, session_id):
         """Increment conversation count"""
         username = self.get_username(session_id)
         if username and username in self.users:
             self.users[username]['total_conversations'] += 1
-            self.save_users()
+            self._queue_user(username)
     
     def save_message(self, session_id, user_message, bot_response):
-        """Save conversation message"""
+        """Queue a conversation message for the conversation log"""
         try:
             username = self.get_username(session_id)
             if username and username in self.users:
@@ -200,32 +373,46 @@ class UserManager:
                     'user_message': user_message,
                     'bot_response': bot_response
                 }
-                
-                if 'conversations' not in self.users[username]:
-                    self.users[username]['conversations'] = []
-                
-                self.users[username]['conversations'].append(conversation)
-                
-                # Keep only the latest 100 conversations
-                if len(self.users[username]['conversations']) > 100:
-                    self.users[username]['conversations'] = self.users[username]['conversations'][-100:]
-                
-                self.save_users()
+                self.writer.submit(self.store.conversation_op(username, conversation))
                 return True
         except Exception as e:
             print(f"⚠️ Failed to save message: {e}")
             return False
+
+    def get_recent_conversations(self, session_id, limit=100):
+        """Get the user's latest conversations, oldest first"""
+        return self.get_conversation_page(session_id, 0, limit)['conversations']
+
+    def get_conversation_page(self, session_id, page=0, page_size=20):
+        """
+        Get one page of the user's conversation history for the UI.
+
+        Page 0 holds the most recent turns; each page is ordered oldest first.
+        Returns a dict with conversations, page, page_size, total and has_more.
+        """
+        username = self.get_username(session_id)
+        if username and username in self.users:
+            # Show the latest turns if they land in time; a stalled disk only delays the page
+            self.writer.flush(WRITE_ACK_TIMEOUT)
+            return self.store.conversation_page(username, page, page_size)
+        return {'conversations': [], 'page': page, 'page_size': page_size, 'total': 0, 'has_more': False}
     
     def get_user_stats(self):
         """Get user statistics"""
         try:
             total_users = len(self.users)
-            active_sessions = len([s for s in self.sessions.values() if s.get('active', False)])
+            now = time.time()
+            active_sessions = sum(
+                1 for s in list(self.sessions.values())
+                if s.get('active', False) and s.get('expires_at', 0) > now
+            )
             
             return {
                 'total_users': total_users,
-                'active_sessions': active_sessions
+                'active_sessions': active_sessions,
+                'expired_sessions': len(self.sessions) - active_sessions,
+                'reaped_sessions': self.reaped_sessions
             }
         except Exception as e:
             print(f"⚠️ Failed to get statistics: {e}")
-            return {'total_users': 0, 'active_sessions': 0}
\ No newline at end of file
+            return {'total_users': 0, 'active_sessions': 0, 'expired_sessions': 0, 'reaped_sessions': 0}
@@ -0,0 +1,516 @@
+"""
+User Store - SQLite persistence for UserManager
+
+Profiles and login sessions are stored one row each, so updating a user
+rewrites that row only; chat turns go to an append-only conversations table.
+Writes are group-committed: concurrent callers queue their operations and
+whichever caller holds the commit lock applies everyone's pending operations in
+a single transaction, so many turns share one fsync. SQLite's journal makes
+each commit atomic, so a crash never leaves a half-written store.
+
+Reads go through a separate connection, each in its own transaction: under
+WAL that is a snapshot of committed data, so a reader never sees the writer's
+half-applied batch and a history page never straddles an archive move.
+
+Each user's latest turns (hot_limit of them) stay as plain rows for quick
+reads; older turns are moved in chunks into a zlib-compressed archive table
+and are only decompressed when an older history page is requested.
+
+WriteBehindWriter sits in front of the store for writes that do not need to
+be durable before the caller continues (chat turns, counters, activity).
+"""
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+Op = Tuple[Any, ...]
+
+
+class UserStoreError(RuntimeError):
+    """A group commit containing the caller's operations failed."""
+
+
+class UserStore:
+    """Profiles, sessions and conversation log in one SQLite file."""
+
+    def __init__(self, path: str, hot_limit: int = 100, archive_chunk: int = 50):
+        self.path = path
+        self.hot_limit = hot_limit
+        self.archive_chunk = max(1, archive_chunk)
+        self.archived_turns = 0
+        self.commits = 0
+        self.ops_committed = 0
+        self._pending: List[Op] = []
+        self._enqueued = 0
+        self._committed = 0
+        self._failed = (0, 0)
+        self._pending_lock = threading.Lock()
+        self._commit_lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                username TEXT PRIMARY KEY,
+                email TEXT,
+                data TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                username TEXT NOT NULL,
+                data TEXT NOT NULL,
+                expires_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS conversations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                user_message TEXT NOT NULL,
+                bot_response TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_conversations_username ON conversations (username, id);
+            CREATE TABLE IF NOT EXISTS conversation_archive (
+                username TEXT NOT NULL,
+                first_id INTEGER NOT NULL,
+                last_id INTEGER NOT NULL,
+                turns INTEGER NOT NULL,
+                data BLOB NOT NULL,
+                PRIMARY KEY (username, last_id)
+            );
+            """
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(sessions)")}
+        if "expires_at" not in columns:
+            self._conn.execute("ALTER TABLE sessions ADD COLUMN expires_at REAL")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at)")
+        self._conn.commit()
+        self._reader = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._read_lock = threading.Lock()
+
+    # ---- operations ----
+
+    @staticmethod
+    def user_op(username: str, data: Dict[str, Any]) -> Op:
+        return ("user", username, data.get("email"), json.dumps(data, ensure_ascii=False))
+
+    @staticmethod
+    def session_op(session_id: str, data: Dict[str, Any]) -> Op:
+        return ("session", session_id, data["username"], json.dumps(data, ensure_ascii=False),
+                data.get("expires_at"))
+
+    @staticmethod
+    def delete_session_op(session_id: str) -> Op:
+        return ("delete_session", session_id)
+
+    @staticmethod
+    def conversation_op(username: str, record: Dict[str, str]) -> Op:
+        return ("conversation", username, record["timestamp"], record["user_message"], record["bot_response"])
+
+    def write(self, ops: Iterable[Op]):
+        """Durably apply ops; returns once they are committed (possibly by another thread)."""
+        ops = list(ops)
+        if not ops:
+            return
+        with self._pending_lock:
+            self._pending.extend(ops)
+            self._enqueued += 1
+            ticket = self._enqueued
+        with self._commit_lock:
+            if self._failed[0] <= ticket <= self._failed[1]:
+                raise UserStoreError("Group commit failed")
+            if self._committed >= ticket:
+                return
+            with self._pending_lock:
+                batch, self._pending = self._pending, []
+                last = self._enqueued
+            try:
+                self._apply(batch)
+            except Exception:
+                # Everyone whose ops were in this batch gets the error
+                self._failed = (self._committed + 1, last)
+                self._committed = last
+                raise
+            self._committed = last
+
+    def _apply(self, batch: List[Op]):
+        with self._conn:
+            talkers = set()
+            for op in batch:
+                kind = op[0]
+                if kind == "user":
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO users (username, email, data) VALUES (?, ?, ?)", op[1:]
+                    )
+                elif kind == "session":
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO sessions (session_id, username, data, expires_at) "
+                        "VALUES (?, ?, ?, ?)", op[1:]
+                    )
+                elif kind == "delete_session":
+                    self._conn.execute("DELETE FROM sessions WHERE session_id = ?", op[1:])
+                elif kind == "conversation":
+                    self._conn.execute(
+                        "INSERT INTO conversations (username, created_at, user_message, bot_response) "
+                        "VALUES (?, ?, ?, ?)", op[1:]
+                    )
+                    talkers.add(op[1])
+                else:
+                    raise ValueError(f"Unknown store operation: {kind}")
+            for username in talkers:
+                self._archive_overflow(username)
+        self.commits += 1
+        self.ops_committed += len(batch)
+
+    def _archive_overflow(self, username: str):
+        """Move a user's oldest hot turns into compressed archive chunks (same transaction)."""
+        hot = self._conn.execute("SELECT COUNT(*) FROM conversations WHERE username = ?", (username,)).fetchone()[0]
+        # Archive whole chunks only once the hot tier is a full chunk over its limit
+        while hot >= self.hot_limit + self.archive_chunk:
+            rows = self._conn.execute(
+                "SELECT id, created_at, user_message, bot_response FROM conversations "
+                "WHERE username = ? ORDER BY id LIMIT ?",
+                (username, self.archive_chunk),
+            ).fetchall()
+            payload = json.dumps([row[1:] for row in rows], ensure_ascii=False, separators=(",", ":"))
+            self._conn.execute(
+                "INSERT INTO conversation_archive (username, first_id, last_id, turns, data) VALUES (?, ?, ?, ?, ?)",
+                (username, rows[0][0], rows[-1][0], len(rows), zlib.compress(payload.encode("utf-8"))),
+            )
+            self._conn.execute(
+                "DELETE FROM conversations WHERE username = ? AND id <= ?", (username, rows[-1][0])
+            )
+            hot -= len(rows)
+            self.archived_turns += len(rows)
+
+    # ---- reads ----
+
+    @contextmanager
+    def _snapshot(self):
+        """Read connection inside one transaction; every query in it sees the same committed state."""
+        with self._read_lock:
+            self._reader.execute("BEGIN")
+            try:
+                yield self._reader
+            finally:
+                self._reader.execute("COMMIT")
+
+    def load_users(self) -> Dict[str, Dict[str, Any]]:
+        with self._snapshot() as conn:
+            rows = conn.execute("SELECT username, data FROM users").fetchall()
+        return {username: json.loads(data) for username, data in rows}
+
+    def load_sessions(self, now: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """Sessions that have not expired by `now` (rows without an expiry are included)."""
+        now = time.time() if now is None else now
+        with self._snapshot() as conn:
+            rows = conn.execute(
+                "SELECT session_id, data FROM sessions WHERE expires_at IS NULL OR expires_at > ?", (now,)
+            ).fetchall()
+        return {session_id: json.loads(data) for session_id, data in rows}
+
+    def compact(self, now: Optional[float] = None, vacuum_threshold: int = 1000) -> int:
+        """
+        Delete expired sessions and shrink the database file. The file is
+        vacuumed only when enough rows were removed to make it worthwhile.
+
+        Returns:
+            Number of sessions deleted
+        """
+        now = time.time() if now is None else now
+        with self._commit_lock:
+            with self._conn:
+                deleted = self._conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,)).rowcount
+            if deleted >= vacuum_threshold:
+                self._conn.execute("VACUUM")
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return deleted
+
+    def recent_conversations(self, username: str, limit: int = 100) -> List[Dict[str, str]]:
+        """Latest `limit` turns for a user, oldest first."""
+        return self.conversation_page(username, 0, limit)["conversations"]
+
+    def conversation_page(self, username: str, page: int = 0, page_size: int = 20) -> Dict[str, Any]:
+        """
+        One page of a user's history, counting back from the newest turn
+        (page 0 is the most recent). Turns within the page are oldest first.
+        Archive chunks are decompressed only if the page reaches into them.
+        """
+        page = max(0, page)
+        page_size = max(1, page_size)
+        offset = page * page_size
+        with self._snapshot() as conn:
+            hot_total = conn.execute(
+                "SELECT COUNT(*) FROM conversations WHERE username = ?", (username,)
+            ).fetchone()[0]
+            chunks = conn.execute(
+                "SELECT last_id, turns FROM conversation_archive WHERE username = ? ORDER BY last_id DESC", (username,)
+            ).fetchall()
+            total = hot_total + sum(turns for _, turns in chunks)
+
+            newest_first: List[Tuple[str, str, str]] = []
+            if offset < hot_total:
+                newest_first = conn.execute(
+                    "SELECT created_at, user_message, bot_response FROM conversations "
+                    "WHERE username = ? ORDER BY id DESC LIMIT ? OFFSET ?",
+                    (username, page_size, offset),
+                ).fetchall()
+            skip = max(0, offset - hot_total)
+            for last_id, turns in chunks:
+                needed = page_size - len(newest_first)
+                if needed <= 0:
+                    break
+                if skip >= turns:
+                    skip -= turns
+                    continue
+                blob = conn.execute(
+                    "SELECT data FROM conversation_archive WHERE username = ? AND last_id = ?", (username, last_id)
+                ).fetchone()[0]
+                chunk = json.loads(zlib.decompress(blob).decode("utf-8"))
+                chunk.reverse()
+                newest_first.extend(chunk[skip:skip + needed])
+                skip = 0
+
+        return {
+            "conversations": [
+                {"timestamp": ts, "user_message": question, "bot_response": answer}
+                for ts, question, answer in reversed(newest_first)
+            ],
+            "page": page,
+            "page_size": page_size,
+            "total": total,
+            "has_more": offset + page_size < total,
+        }
+
+    def is_empty(self) -> bool:
+        with self._snapshot() as conn:
+            return conn.execute("SELECT 1 FROM users LIMIT 1").fetchone() is None
+
+    # ---- migration ----
+
+    def import_legacy_json(self, filename: str) -> int:
+        """
+        One-time import of the old thalia_users.json layout. The file is renamed
+        to *.migrated afterwards so it is not imported twice.
+        """
+        with open(filename, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        ops: List[Op] = []
+        for username, user_data in data.get("users", {}).items():
+            conversations = user_data.pop("conversations", [])
+            ops.append(self.user_op(username, user_data))
+            for record in conversations:
+                ops.append(self.conversation_op(username, {
+                    "timestamp": record.get("timestamp", ""),
+                    "user_message": record.get("user_message", ""),
+                    "bot_response": record.get("bot_response", ""),
+                }))
+        for session_id, session_data in data.get("sessions", {}).items():
+            if "username" in session_data:
+                ops.append(self.session_op(session_id, session_data))
+        self.write(ops)
+        os.replace(filename, filename + ".migrated")
+        return len(data.get("users", {}))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "commits": self.commits,
+            "ops_committed": self.ops_committed,
+            "ops_per_commit": self.ops_committed / self.commits if self.commits else 0.0,
+            "archived_turns": self.archived_turns,
+        }
+
+    def close(self):
+        with self._commit_lock:
+            self._conn.close()
+        with self._read_lock:
+            self._reader.close()
+
+
+class WriteBehindWriter:
+    """
+    Background writer for a UserStore.
+
+    submit() only queues the op; a flusher thread commits everything pending
+    every flush_interval seconds as one group. Ops submitted with a key replace
+    a pending op with the same key, so repeated counter or activity updates for
+    one user collapse into a single row write. When max_pending ops are queued,
+    submit() blocks until the flusher catches up, for at most submit_timeout
+    seconds; after that the op is dropped (counted in stats) and UserStoreError
+    raised, so a stalled disk cannot hang callers. write() is the acknowledged
+    variant for changes the caller must not report before they are committed.
+    Pending ops are flushed on close() and at interpreter exit.
+    """
+
+    def __init__(self, store: UserStore, max_pending: int = 10000, flush_interval: float = 0.5,
+                 max_retries: int = 3, submit_timeout: Optional[float] = 5.0):
+        self.store = store
+        self.max_pending = max(1, max_pending)
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.submit_timeout = submit_timeout
+        self.stats = {"submitted": 0, "coalesced": 0, "written": 0, "flushes": 0,
+                      "dropped": 0, "backpressure_waits": 0}
+        self._pending: "OrderedDict[Hashable, Op]" = OrderedDict()
+        self._in_flight = 0
+        self._seq = 0
+        # Batches are numbered as the flusher takes them; failed ones are remembered for waiters
+        self._batches = 0
+        self._done = 0
+        self._failed_batches: deque = deque(maxlen=1024)
+        self._closed = False
+        self._flush_requested = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="user-store-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, op: Op, key: Optional[Hashable] = None, timeout: Optional[float] = None):
+        """
+        Queue an op; ops sharing a key are coalesced to the latest one. Waits at
+        most timeout seconds (default submit_timeout) for room in a full queue.
+        """
+        timeout = self.submit_timeout if timeout is None else timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            if self._closed:
+                raise UserStoreError("Writer is closed")
+            self.stats["submitted"] += 1
+            if key is not None and key in self._pending:
+                del self._pending[key]
+                self.stats["coalesced"] += 1
+            else:
+                while len(self._pending) >= self.max_pending:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        self.stats["dropped"] += 1
+                        raise UserStoreError(f"Write queue still full after {timeout:.1f}s; op dropped")
+                    self.stats["backpressure_waits"] += 1
+                    self._cond.notify_all()
+                    self._cond.wait(remaining)
+            if key is None:
+                self._seq += 1
+                key = ("_seq", self._seq)
+            self._pending[key] = op
+            if len(self._pending) >= self.max_pending:
+                self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                # Let ops accumulate for one interval unless the queue is full or a flush is requested
+                deadline = time.monotonic() + self.flush_interval
+                while (not self._closed and not self._flush_requested
+                       and len(self._pending) < self.max_pending):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                self._flush_requested = False
+                if not self._pending:
+                    if self._closed:
+                        return
+                    continue
+                batch = list(self._pending.values())
+                self._pending.clear()
+                self._in_flight = len(batch)
+                self._batches += 1
+                number = self._batches
+                self._cond.notify_all()
+            written = self._write(batch)
+            with self._cond:
+                if not written:
+                    self._failed_batches.append(number)
+                self._done = number
+                self._in_flight = 0
+                self._cond.notify_all()
+
+    def _write(self, batch: List[Op]) -> bool:
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.store.write(batch)
+                self.stats["written"] += len(batch)
+                self.stats["flushes"] += 1
+                return True
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self.stats["dropped"] += len(batch)
+                    print(f"❌ Dropping {len(batch)} user store writes after {attempt + 1} attempts: {e}")
+                    return False
+                print(f"⚠️ User store write failed ({e}); retrying")
+                time.sleep(0.1 * 2 ** attempt)
+
+    def _wait_for(self, number: int, deadline: Optional[float]) -> bool:
+        """Wait (holding _cond) until batch `number` is done; False on timeout."""
+        while self._done < number:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            self._flush_requested = True
+            self._cond.notify_all()
+            self._cond.wait(remaining)
+        return True
+
+    def write(self, ops: Dict[Hashable, Op], timeout: Optional[float] = None) -> bool:
+        """
+        Queue keyed ops and wait until they are committed. Returns False if the
+        batch holding them was dropped or not written within timeout seconds;
+        ops still queued at the timeout are withdrawn so they cannot land later.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            # A submit that waits for room lets the flusher take earlier ops in an earlier batch
+            first = self._batches + 1
+            try:
+                for key, op in ops.items():
+                    self.submit(op, key=key, timeout=timeout)
+            except UserStoreError:
+                self._withdraw(ops)
+                raise
+            # Nothing else is taken while we hold the lock, so the rest go out with the next batch
+            last = self._batches + 1
+            if not self._wait_for(last, deadline):
+                self._withdraw(ops)
+                return False
+            return not any(first <= number <= last for number in self._failed_batches)
+
+    def _withdraw(self, ops: Dict[Hashable, Op]):
+        for key, op in ops.items():
+            if self._pending.get(key) is op:
+                del self._pending[key]
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until everything submitted so far is written. Returns False on
+        timeout or if any of those writes was dropped.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            first = self._done + 1
+            last = self._batches + (1 if self._pending else 0)
+            if not self._wait_for(last, deadline):
+                return False
+            return not any(number >= first for number in self._failed_batches)
+
+    def close(self):
+        """Flush pending writes and stop the flusher thread."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {**self.stats, "pending": len(self._pending)}